@@ -0,0 +1,273 @@
+"""
+Times the tools that work on the database against synthetic databases(see synthetic_mdb.py) of several sizes. The
+results are written as JSON so they can be compared across builds to catch performance regressions.
+
+Every benchmark runs on a fresh copy of the synthetic database, so benchmarks that modify the database do not affect
+each other and every repetition starts from the same state. Only the call to the tool is timed.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import closing
+
+import sqlite_utils
+
+import ds_decoder
+import header_mod
+import log_parser
+import mod_sql
+import msg_def_overrides
+import remap_symbols
+import synthetic_mdb
+
+"""
+Bump this whenever the layout of the results changes, so tools that track results across builds can tell.
+"""
+RESULTS_FORMAT_VERSION = 1
+
+DEFAULT_FIELD_COUNTS = [1000, 10000, 100000]
+
+
+def get_app_names(db_handle: sqlite3.Connection) -> list:
+    return [name.upper() for name, in db_handle.execute('SELECT name FROM modules ORDER BY id')]
+
+
+def get_message_symbols(db_handle: sqlite3.Connection) -> list:
+    return [name for name, in db_handle.execute('SELECT symbols.name FROM telemetry JOIN symbols ON '
+                                                'symbols.id = telemetry.symbol ORDER BY telemetry.id')]
+
+
+def get_remaps(db_handle: sqlite3.Connection) -> dict:
+    """
+    :return: A remap of the message id typedef of every app to uint16.
+    """
+    return {f'{app}_MsgId_t': 'uint16' for app in get_app_names(db_handle)}
+
+
+def get_def_overrides(db_handle: sqlite3.Connection) -> dict:
+    """
+    :return: An override configuration that turns the first string of every telemetry message into a "string" and its
+    first uint8 into an enumeration.
+    """
+    overrides = []
+    for symbol_name in get_message_symbols(db_handle):
+        overrides.append({'type': 'string', 'parent': symbol_name, 'member': 'Name7'})
+        overrides.append({'type': 'enumeration', 'parent': symbol_name, 'member': 'Value1',
+                          'enumerations': {'OFF': 0, 'ON': 1}})
+
+    return {'modules': {'synthetic': {'elf_files': [synthetic_mdb.ELF_NAME], 'msg_def_overrides': overrides}}}
+
+
+def get_sql_entries(db_handle: sqlite3.Connection) -> dict:
+    """
+    :return: A mod_sql configuration with one new telemetry message of ten fields per app.
+    """
+    sql_entries = {'symbols': [], 'fields': [], 'telemetry': []}
+    for app_index, app in enumerate(get_app_names(db_handle)):
+        symbol_name = f'{app}_ManualTlm_t'
+        sql_entries['symbols'].append({'name': symbol_name, 'elf': synthetic_mdb.ELF_NAME, 'byte_size': 40})
+        for field_index in range(10):
+            sql_entries['fields'].append({'symbol': symbol_name, 'name': f'Value{field_index}',
+                                          'byte_offset': field_index * 4, 'type': 'uint32', 'multiplicity': 0,
+                                          'little_endian': 1, 'bit_size': 0, 'bit_offset': 0})
+        sql_entries['telemetry'].append({'name': f'{app}_MANUAL_TLM', 'message_id': 0x0FFF - app_index,
+                                         'macro': f'{app}_MANUAL_TLM_MID', 'symbol': symbol_name,
+                                         'module': app.lower()})
+
+    return sql_entries
+
+
+def get_header_definitions() -> dict:
+    """
+    :return: A header_mod configuration like config/header_mod_config.yaml for the CCSDS headers of the synthetic
+    database.
+    """
+    def get_header(size: int, header_symbol: str, secondary_header: str):
+        return {'size': size,
+                'header_symbol': header_symbol,
+                'symbols': [{'name': header_symbol, 'elf': synthetic_mdb.ELF_NAME, 'byte_size': size}],
+                'fields': [{'symbol': header_symbol, 'name': 'PriHdr', 'byte_offset': 0, 'type': 'CCSDS_PriHdr_t',
+                            'multiplicity': 0, 'little_endian': 1, 'bit_size': 0, 'bit_offset': 0},
+                           {'symbol': header_symbol, 'name': 'SecHdr', 'byte_offset': 6, 'type': secondary_header,
+                            'multiplicity': 0, 'little_endian': 1, 'bit_size': 0, 'bit_offset': 0}]}
+
+    return {'telemetry_header': get_header(synthetic_mdb.TELEMETRY_HEADER_SIZE, 'CCSDS_TlmPkt_t',
+                                           'CCSDS_TlmSecHdr_t'),
+            'command_header': get_header(synthetic_mdb.COMMAND_HEADER_SIZE, 'CCSDS_CmdPkt_t', 'CCSDS_CmdSecHdr_t')}
+
+
+def benchmark_remap_symbols(database_path: str, work_dir: str):
+    with closing(sqlite3.connect(database_path)) as db_handle:
+        remaps = get_remaps(db_handle)
+    return lambda: remap_symbols.remap_symbols(database_path, remaps)
+
+
+def benchmark_msg_def_overrides(database_path: str, work_dir: str):
+    with closing(sqlite3.connect(database_path)) as db_handle:
+        def_overrides = get_def_overrides(db_handle)
+    return lambda: msg_def_overrides.process_def_overrides(def_overrides, sqlite_utils.Database(database_path))
+
+
+def benchmark_mod_sql(database_path: str, work_dir: str):
+    with closing(sqlite3.connect(database_path)) as db_handle:
+        sql_entries = get_sql_entries(db_handle)
+    return lambda: mod_sql.write_dict_to_database(sql_entries, sqlite_utils.Database(database_path))
+
+
+def benchmark_header_mod(database_path: str, work_dir: str):
+    header_definitions = get_header_definitions()
+    return lambda: header_mod.header_mod(sqlite_utils.Database(database_path), header_definitions)
+
+
+def benchmark_log_parser(database_path: str, work_dir: str):
+    ds_path = os.path.join(work_dir, 'ds.bin')
+    with closing(sqlite3.connect(database_path)) as db_handle:
+        packet_count = 10 * len(get_message_symbols(db_handle))
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, packet_count)
+
+    def run():
+        # log_parser writes its csv files to the working directory.
+        csv_dir = tempfile.mkdtemp(dir=work_dir)
+        cwd = os.getcwd()
+        os.chdir(csv_dir)
+        try:
+            log_parser.parse_file(ds_path, database_path, structures, log_parser.TimeFormat.CFE_SB_TIME_32_16_SUBS,
+                                  log_parser.LengthSource.STREAM)
+        finally:
+            os.chdir(cwd)
+
+    return run
+
+
+def benchmark_ds_decoder(database_path: str, work_dir: str):
+    ds_path = os.path.join(work_dir, 'ds.bin')
+    with closing(sqlite3.connect(database_path)) as db_handle:
+        packet_count = 10 * len(get_message_symbols(db_handle))
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, packet_count)
+
+    return lambda: ds_decoder.decode_file(ds_path, database_path, structures, log_parser.LengthSource.STREAM)
+
+
+def benchmark_ds_decoder_files(database_path: str, work_dir: str):
+    with closing(sqlite3.connect(database_path)) as db_handle:
+        packet_count = 10 * len(get_message_symbols(db_handle))
+    # The same packets as benchmark_ds_decoder, in four files.
+    ds_paths = [os.path.join(work_dir, f'ds{seed}.bin') for seed in range(4)]
+    for seed, ds_path in enumerate(ds_paths):
+        structures = synthetic_mdb.generate_ds_file(database_path, ds_path, packet_count // len(ds_paths), seed)
+
+    return lambda: ds_decoder.decode_files(ds_paths, database_path, structures, log_parser.LengthSource.STREAM)
+
+
+"""
+Every benchmark takes the path to a copy of the synthetic database and a scratch directory. It returns the callable that
+is timed; anything done before that is setup and is not timed.
+"""
+BENCHMARKS = {
+    'remap_symbols': benchmark_remap_symbols,
+    'msg_def_overrides': benchmark_msg_def_overrides,
+    'mod_sql': benchmark_mod_sql,
+    'header_mod': benchmark_header_mod,
+    'log_parser': benchmark_log_parser,
+    'ds_decoder': benchmark_ds_decoder,
+    'ds_decoder_files': benchmark_ds_decoder_files,
+}
+
+
+def run_benchmark(name: str, base_database_path: str, repeat: int) -> list:
+    """
+    :return: The wall time of every repetition of the benchmark called name, in seconds.
+    """
+    wall_times = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='squeezer_benchmark_') as work_dir:
+            database_path = os.path.join(work_dir, 'db.sqlite')
+            shutil.copyfile(base_database_path, database_path)
+
+            benchmark = BENCHMARKS[name](database_path, work_dir)
+
+            start = time.perf_counter()
+            benchmark()
+            wall_times.append(time.perf_counter() - start)
+
+    return wall_times
+
+
+def run_benchmarks(field_counts: list, benchmarks: list = None, repeat: int = 3) -> dict:
+    """
+    :param field_counts: The sizes of the synthetic databases to run every benchmark against.
+    :param benchmarks: The names of the benchmarks to run(see BENCHMARKS). All of them if None.
+    :param repeat: How many times every benchmark runs on every database. The fastest run is reported as wall_time_s.
+    :return: The results, with a versioned layout.
+    """
+    if benchmarks is None:
+        benchmarks = list(BENCHMARKS.keys())
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='squeezer_benchmark_') as base_dir:
+        for field_count in field_counts:
+            base_database_path = os.path.join(base_dir, f'{field_count}.sqlite')
+            counts = synthetic_mdb.generate_database(base_database_path, field_count)
+
+            for name in benchmarks:
+                logging.info(f'Running "{name}" on {counts["fields"]} fields...')
+                wall_times = run_benchmark(name, base_database_path, repeat)
+                results.append({'benchmark': name,
+                                'fields': counts['fields'],
+                                'symbols': counts['symbols'],
+                                'wall_time_s': min(wall_times),
+                                'wall_times_s': wall_times})
+
+    return {'format_version': RESULTS_FORMAT_VERSION,
+            'python_version': platform.python_version(),
+            'sqlite_version': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'results': results}
+
+
+def parse_cli() -> argparse.Namespace:
+    """
+    Parses cli arguments.
+    :return: The namespace that has all of the arguments that have been parsed.
+    """
+    parser = argparse.ArgumentParser(description='Times the tools that work on the database against synthetic '
+                                                 'databases.')
+
+    parser.add_argument('--fields', type=int, nargs='+', default=DEFAULT_FIELD_COUNTS,
+                        help='The number of fields of every synthetic database to run the benchmarks against.')
+
+    parser.add_argument('--benchmarks', type=str, nargs='+', default=None, choices=list(BENCHMARKS.keys()),
+                        help='The benchmarks to run. All of them by default.')
+
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='How many times every benchmark runs on every database.')
+
+    parser.add_argument('--output_file', type=str, default=None,
+                        help='The JSON file to write the results to. They are written to stdout by default.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cli()
+
+    results = run_benchmarks(args.fields, args.benchmarks, args.repeat)
+
+    if args.output_file:
+        with open(args.output_file, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+            output_file.write('\n')
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
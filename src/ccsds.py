@@ -0,0 +1,77 @@
+"""
+What log_parser.py, layout_cache.py and the ds decoders share about ccsds packets and the way their payloads are
+unpacked. It has no dependencies on any of them, so all of them can import it.
+"""
+
+"""
+The sizes of the ccsds headers: the primary header alone, and the primary header along with the secondary header of
+telemetry and of commands.
+"""
+PRIMARY_HEADER_SIZE = 6
+TELEMETRY_HEADER_SIZE = 12
+COMMAND_HEADER_SIZE = 8
+
+"""
+A mapping between intrinsic types in the database such as int, char, short, etc
+and the format strings specified on [1]. This mapping does NOT include strings. String handling does not rely on
+this mapping.
+[1]:https://docs.python.org/3/library/struct.html?highlight=struct#format-strings
+"""
+symbol_to_struct_format_map = \
+    {
+        'int': 'i',
+        'int8': 'b',  # Maps to the same thing as 'signed char' type
+        'char': 'c',
+        'int16': 'h',
+        'int32': 'i',
+        'enum': 'i',
+        'int64': 'l',
+        'uint8': 'B',
+        'uint16': 'H',
+        'uint32': 'I',
+        'uint64': 'Q',
+        'short': 'h',
+        'unsigned short': 'H',
+        'long': 'l',
+        'unsigned long': 'L',
+        'long long': 'q',
+        'unsigned long long': 'Q',
+        'double': 'd',
+        'bool': '?',
+        "boolean": '?',
+        'float': 'f',
+        'osalbool': 'B',
+        '_padding8': 'c',
+        '_padding16': '2c',
+        '_padding24': '3c',
+        '_padding32': '4c',  # NOTE: I think it might be best to generate these padding types from a function
+    }
+
+
+def is_secondary_header_present(stream_id: int):
+    """
+    Checks if the secondary header is present. How this is checked is documented by 'ccsds.h'
+    on the airliner codebase at 'airliner/core/cfe/fsw/src/inc/ccsds.h'.
+    :param stream_id:
+    :return:
+    """
+    return stream_id >> 11 & 1 == 1
+
+
+def is_command(stream_id: int) -> bool:
+    """
+    Checks if the packets with stream_id are commands rather than telemetry; see log_parser.get_packet_type.
+    :param stream_id:
+    :return:
+    """
+    return stream_id >> 12 & 1 == 1
+
+
+def get_header_size(stream_id: int) -> int:
+    """
+    :param stream_id:
+    :return: The size of the ccsds headers of the packets with stream_id.
+    """
+    if not is_secondary_header_present(stream_id):
+        return PRIMARY_HEADER_SIZE
+    return COMMAND_HEADER_SIZE if is_command(stream_id) else TELEMETRY_HEADER_SIZE
@@ -0,0 +1,650 @@
+"""
+Decodes the binary files written by the ds application(see log_parser.py) with NumPy instead of unpacking one packet
+at a time. The file is scanned once to find where every packet starts and which message it is. Then every message is
+decoded with a single vectorized gather of all of its packets, using a NumPy structured dtype built from its layout(see
+layout_cache.py), the same one log_parser.py unpacks it with. Nested structures are flattened into their fields, once
+for every element of arrays of structures, and arrays of intrinsic types are subarray fields.
+
+The result of decoding a message is one array per field, which are called columns here. Fields of nested structures
+are named after their path, such as "Vector0.X" or "Vectors[1].X".
+"""
+import argparse
+import glob
+import logging
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from struct import Struct
+
+import numpy as np
+import yaml
+
+import ccsds
+import ds_index
+import ds_sinks
+import layout_cache
+import log_parser
+from log_parser import LengthSource, PacketType, TimeFormat
+
+"""
+The intrinsic types that are decoded as floating point numbers and booleans. Every other intrinsic type is decoded as
+an integer of its size; see get_intrinsic_format.
+"""
+FLOAT_TYPES = {'float', 'double', 'long double'}
+BOOL_TYPES = {'bool', 'boolean', '_Bool'}
+
+"""
+At most this many bytes of packets are gathered at a time, which bounds the size of the index arrays of the gather.
+"""
+GATHER_CHUNK_SIZE = 8 * 1024 * 1024
+
+"""
+decode_files splits files into tasks of at most this many packets by default, so the packets of one large file are
+decoded by several processes.
+"""
+DEFAULT_PACKETS_PER_TASK = 500000
+
+PRIMARY_HEADER = Struct('!HHH')
+COMMAND_SECONDARY_HEADER = Struct('!H')
+PRIMARY_HEADER_SIZE = ccsds.PRIMARY_HEADER_SIZE
+TELEMETRY_HEADER_SIZE = ccsds.TELEMETRY_HEADER_SIZE
+COMMAND_HEADER_SIZE = ccsds.COMMAND_HEADER_SIZE
+
+
+def get_intrinsic_format(type_name: str, byte_size: int, little_endian: int) -> str:
+    """
+    :param type_name: The name of a symbol that has no fields and is not an enumeration, such as uint16 or float.
+    :param byte_size:
+    :param little_endian:
+    :return: The NumPy type string of type_name. Types of unusual sizes, such as padding, are decoded as raw bytes.
+    """
+    byte_order = '<' if little_endian else '>'
+
+    if type_name in FLOAT_TYPES and byte_size in (4, 8):
+        return f'{byte_order}f{byte_size}'
+    if type_name in BOOL_TYPES and byte_size == 1:
+        return '?'
+    if type_name == 'char' and byte_size == 1:
+        return 'S1'
+    if type_name.startswith('_padding') or byte_size not in (1, 2, 4, 8):
+        return f'V{byte_size}'
+    if type_name.startswith('u') or type_name == 'osalbool':
+        return f'{byte_order}u{byte_size}'
+    return f'{byte_order}i{byte_size}'
+
+
+def get_payload_dtype(layout: dict) -> np.dtype:
+    """
+    :param layout: A layout compiled by layout_cache.compile_layouts.
+    :return: The dtype of the fields of the message that come after its header, one per leaf of the layout and named
+    after its path. Offsets are from the start of the packet, and the dtype ends where its last field ends. Padding and
+    fields whose type has no size are left out.
+    """
+    names = []
+    formats = []
+    offsets = []
+    for name, offset, type_name, byte_size, multiplicity, little_endian, enumeration in zip(
+            layout['field_names'], layout['field_offsets'], layout['field_types'], layout['field_sizes'],
+            layout['field_multiplicities'], layout['field_little_endians'], layout['field_enumerations']):
+        multiplicity = multiplicity or 0
+        if type_name.startswith('_padding') or byte_size == 0:
+            continue
+
+        if type_name == 'char' and multiplicity > 0 and not enumeration:
+            # Arrays of char are strings, as they are for log_parser.
+            field_format = np.dtype(f'S{multiplicity}')
+        else:
+            field_format = np.dtype(get_intrinsic_format('enum' if enumeration else type_name, byte_size,
+                                                         little_endian))
+            if multiplicity > 0:
+                field_format = np.dtype((field_format, (multiplicity,)))
+
+        names.append(name)
+        formats.append(field_format)
+        offsets.append(offset)
+
+    end = max([offset + field_format.itemsize for offset, field_format in zip(offsets, formats)], default=0)
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': end})
+
+
+class MessageLayout:
+    def __init__(self, key, macro: str, symbol_name: str, header_size: int, byte_size: int, dtype: np.dtype):
+        """
+        :param key: The message id for telemetry, and (message id, command code) for commands.
+        :param macro: The macro of the message, which log_parser names its csv files after.
+        :param symbol_name:
+        :param header_size: The size of the ccsds headers of the message.
+        :param byte_size: The size of the symbol of the message.
+        :param dtype: See get_payload_dtype.
+        """
+        self.key = key
+        self.macro = macro
+        self.symbol_name = symbol_name
+        self.header_size = header_size
+        self.byte_size = byte_size
+        self.dtype = dtype
+
+
+class LayoutTable:
+    def __init__(self, layouts: dict):
+        """
+        The layouts of the telemetry and command messages in the database, whose dtypes are built the first time they
+        are needed.
+        :param layouts: See layout_cache.compile_layouts.
+        """
+        self.telemetry = {layout['message_id']: layout for layout in layouts['telemetry']}
+        self.commands = {(layout['message_id'], layout['command_code']): layout for layout in layouts['commands']}
+        self.symbol_sizes = layouts['symbol_sizes']
+        self.__layouts = {}
+
+    def get_layout(self, key):
+        """
+        :param key: See MessageLayout.
+        :return: The layout of the message key. None if it is not in the database.
+        """
+        if key not in self.__layouts:
+            layout = self.commands.get(key) if isinstance(key, tuple) else self.telemetry.get(key)
+            if layout is None:
+                return None
+            self.__layouts[key] = MessageLayout(key, layout['macro'], layout['symbol_name'], layout['header_size'],
+                                                layout['byte_size'], get_payload_dtype(layout))
+        return self.__layouts[key]
+
+    def compile_all(self):
+        """
+        Builds the layout of every message in the database, so a copy of the table sent to another process never has
+        to build one again.
+        :return: This table.
+        """
+        for key in list(self.telemetry.keys()) + list(self.commands.keys()):
+            self.get_layout(key)
+        return self
+
+
+def get_stream_id(key) -> int:
+    """
+    :param key: See MessageLayout.
+    """
+    return key[0] if isinstance(key, tuple) else key
+
+
+def scan_packets(buffer, start: int, length_source: LengthSource, layouts: LayoutTable):
+    """
+    Finds where every packet in buffer starts and which message it is.
+    :param buffer: The contents of a ds file, such as a mmap.
+    :param start: Where the first packet starts; the size of the file headers.
+    :param length_source: Where the length of every packet comes from. With LengthSource.STREAM, packets of messages
+    that are not in the database are skipped; with LengthSource.DATABASE, they end the scan since their length is
+    unknown.
+    :param layouts:
+    :return: A tuple of the layouts of the messages in the order they first appear, and a list with the offsets of the
+    packets of every message, in the same order.
+    """
+    message_indices = {}
+    message_layouts = []
+    message_offsets = []
+    unknown_keys = set()
+
+    unpack_primary_header = PRIMARY_HEADER.unpack_from
+    unpack_command_header = COMMAND_SECONDARY_HEADER.unpack_from
+    stream_length = length_source == LengthSource.STREAM
+
+    end = len(buffer)
+    offset = start
+    while offset + PRIMARY_HEADER_SIZE <= end:
+        stream_id, _, length = unpack_primary_header(buffer, offset)
+
+        # These are log_parser.get_packet_type, is_secondary_header_present and get_command_code, inlined since this
+        # loop runs once per packet.
+        if not stream_id >> 12 & 1:
+            key = stream_id
+        elif stream_id >> 11 & 1:
+            if offset + PRIMARY_HEADER_SIZE + COMMAND_SECONDARY_HEADER.size > end:
+                logging.warning(f'The command at {offset} ends before its command code. Aborting scan.')
+                break
+            command, = unpack_command_header(buffer, offset + PRIMARY_HEADER_SIZE)
+            key = (stream_id, command >> 1 & 0x7F)
+        else:
+            key = None
+
+        index = message_indices.get(key)
+        if index is None:
+            layout = layouts.get_layout(key) if key is not None else None
+            if layout is None:
+                if key not in unknown_keys:
+                    logging.warning(f'Message {key} was not found in the database.')
+                    unknown_keys.add(key)
+                if not stream_length:
+                    logging.warning('The length of the message is unknown. Aborting scan.')
+                    break
+                offset += length + 7
+                continue
+
+            index = len(message_layouts)
+            message_indices[key] = index
+            message_layouts.append(layout)
+            message_offsets.append([])
+
+        message_offsets[index].append(offset)
+
+        if stream_length:
+            offset += length + 7
+        else:
+            offset += max(message_layouts[index].byte_size, message_layouts[index].header_size)
+
+    return message_layouts, [np.array(offsets, dtype=np.int64) for offsets in message_offsets]
+
+
+def group_packets(index: ds_index.PacketIndex, layouts: LayoutTable):
+    """
+    Groups the packets in index by message, the same way scan_packets does for a buffer with LengthSource.STREAM.
+    Packets of messages that are not in the database are skipped.
+    :param index:
+    :param layouts:
+    :return: See scan_packets.
+    """
+    message_layouts = []
+    message_offsets = []
+    for stream_id, command_code, positions in index.get_groups():
+        if command_code != ds_index.NO_COMMAND_CODE:
+            key = (stream_id, command_code)
+        elif log_parser.get_packet_type(stream_id) == PacketType.TELEMETRY:
+            key = stream_id
+        else:
+            key = None
+
+        layout = layouts.get_layout(key) if key is not None else None
+        if layout is None:
+            logging.warning(f'Message {key} was not found in the database.')
+            continue
+
+        message_layouts.append(layout)
+        message_offsets.append(index.offsets[positions])
+
+    return message_layouts, message_offsets
+
+
+def gather(data: np.ndarray, offsets: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """
+    Decodes the records of type dtype that start at offsets in data, all of them at once.
+    :param data: A uint8 array.
+    :param offsets:
+    :param dtype:
+    :return: An array of dtype with one record per offset.
+    """
+    records = np.empty(len(offsets), dtype=dtype)
+    if dtype.itemsize == 0 or len(offsets) == 0:
+        return records
+
+    byte_range = np.arange(dtype.itemsize, dtype=np.int64)
+    chunk_size = max(GATHER_CHUNK_SIZE // dtype.itemsize, 1)
+    for chunk_start in range(0, len(offsets), chunk_size):
+        chunk = offsets[chunk_start:chunk_start + chunk_size]
+        records[chunk_start:chunk_start + len(chunk)] = data[chunk[:, None] + byte_range].view(dtype)[:, 0]
+
+    return records
+
+
+def get_columns(records: np.ndarray) -> dict:
+    """
+    :param records: An array of a dtype built by get_payload_dtype.
+    :return: One array per field of records, keyed by its name, which is its path in the message.
+    """
+    return {name: records[name] for name in records.dtype.names}
+
+
+class DecodedMessage:
+    def __init__(self, layout: MessageLayout, offsets: np.ndarray, times, columns: dict, subseconds=None,
+                 file_indices=None):
+        """
+        :param layout:
+        :param offsets: Where every packet of the message starts in the file.
+        :param times: The seconds of the time of every packet, for telemetry with a secondary header. None otherwise.
+        :param columns: See get_columns.
+        :param subseconds: The subseconds of the time of every packet, whenever there are times.
+        :param file_indices: For messages decoded from several files(see decode_files), the position of the file of
+        every packet in the list of files. None otherwise.
+        """
+        self.layout = layout
+        self.offsets = offsets
+        self.times = times
+        self.columns = columns
+        self.subseconds = subseconds
+        self.file_indices = file_indices
+
+
+def decode_records(buffer, start: int, layouts: LayoutTable, length_source: LengthSource,
+                   time_format: TimeFormat = TimeFormat.CFE_SB_TIME_32_16_SUBS, index: ds_index.PacketIndex = None,
+                   message_ids: list = None) -> list:
+    """
+    Decodes every packet in buffer into records of the dtype of its message.
+    :param buffer: See scan_packets.
+    :param start: See scan_packets.
+    :param layouts:
+    :param length_source: See scan_packets.
+    :param time_format: Only CFE_SB_TIME_32_16_SUBS is supported, as it is for log_parser.
+    :param index: The index of buffer(see ds_index.py). If it is not None, the packets are found through it instead of
+    scanning buffer.
+    :param message_ids: The stream ids of the messages to decode. All of them if None.
+    :return: A (layout, offsets, times, subseconds, records) tuple for every message, in the order they first appear in
+    buffer. See DecodedMessage.
+    """
+    if time_format != TimeFormat.CFE_SB_TIME_32_16_SUBS:
+        raise ValueError(f'The time format {time_format} is not supported.')
+
+    if index is not None:
+        if message_ids is not None:
+            index = index.filter(message_ids=message_ids)
+        message_layouts, message_offsets = group_packets(index, layouts)
+    else:
+        message_layouts, message_offsets = scan_packets(buffer, start, length_source, layouts)
+        if message_ids is not None:
+            selected = [get_stream_id(layout.key) in message_ids for layout in message_layouts]
+            message_layouts = [layout for layout, is_selected in zip(message_layouts, selected) if is_selected]
+            message_offsets = [offsets for offsets, is_selected in zip(message_offsets, selected) if is_selected]
+
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    try:
+        messages = []
+        for layout, offsets in zip(message_layouts, message_offsets):
+            # A packet that runs past the end of the file cannot be decoded.
+            complete = offsets + layout.dtype.itemsize <= len(data)
+            if not complete.all():
+                logging.warning(f'{np.count_nonzero(~complete)} packets of {layout.macro} are incomplete. They have '
+                                f'been ignored.')
+                offsets = offsets[complete]
+
+            times = None
+            subseconds = None
+            if not isinstance(layout.key, tuple) and layout.header_size == TELEMETRY_HEADER_SIZE:
+                times = gather(data, offsets + PRIMARY_HEADER_SIZE, np.dtype('=u4'))
+                subseconds = gather(data, offsets + PRIMARY_HEADER_SIZE + 4, np.dtype('=u2'))
+
+            messages.append((layout, offsets, times, subseconds, gather(data, offsets, layout.dtype)))
+    finally:
+        # The buffer cannot be closed while the array refers to it.
+        del data
+
+    return messages
+
+
+def decode_buffer(buffer, start: int, layouts: LayoutTable, length_source: LengthSource,
+                  time_format: TimeFormat = TimeFormat.CFE_SB_TIME_32_16_SUBS, index: ds_index.PacketIndex = None,
+                  message_ids: list = None) -> list:
+    """
+    Decodes every packet in buffer. See decode_records.
+    :return: A DecodedMessage for every message, in the order they first appear in buffer.
+    """
+    return [DecodedMessage(layout, offsets, times, get_columns(records), subseconds)
+            for layout, offsets, times, subseconds, records in
+            decode_records(buffer, start, layouts, length_source, time_format, index, message_ids)]
+
+
+def get_file_header_size(layouts: LayoutTable, structures: list) -> int:
+    """
+    :param layouts:
+    :param structures: The names of the structures at the start of the file; see log_parser.get_structure_names.
+    :return: The size of the file headers.
+    """
+    return sum(layouts.symbol_sizes[structure] for structure in structures)
+
+
+def decode_file(file_path: str, sqlite_path: str, structures: list, length_source: LengthSource,
+                time_format: TimeFormat = TimeFormat.CFE_SB_TIME_32_16_SUBS, use_index: bool = False,
+                message_ids: list = None, index_dir: str = None) -> list:
+    """
+    Decodes every packet in the ds file at file_path. See decode_buffer.
+    :param file_path:
+    :param sqlite_path:
+    :param structures: See get_file_header_size.
+    :param length_source:
+    :param time_format:
+    :param use_index: Find the packets through the sidecar index of the file(see ds_index.get_index), which is built
+    if there is no valid one. Indexes follow the length of the packets in the file, so this cannot be used with
+    LengthSource.DATABASE.
+    :param message_ids: See decode_buffer.
+    :param index_dir: See ds_index.get_index_path.
+    :return: See decode_buffer.
+    """
+    if use_index and length_source != LengthSource.STREAM:
+        raise ValueError('An index can only be used with the length of the packets in the file.')
+
+    layouts = LayoutTable(layout_cache.get_layouts(sqlite_path))
+    file_header_size = get_file_header_size(layouts, structures)
+
+    if os.path.getsize(file_path) <= file_header_size:
+        return []
+
+    index = ds_index.get_index(file_path, file_header_size, index_dir=index_dir) if use_index else None
+
+    with open(file_path, 'rb') as ds_file, mmap.mmap(ds_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return decode_buffer(buffer, file_header_size, layouts, length_source, time_format, index, message_ids)
+
+
+"""
+The layout table of the worker processes of decode_files; see init_worker.
+"""
+_worker_layouts = None
+
+
+def init_worker(layouts: LayoutTable):
+    """
+    Runs once in every worker process of decode_files, so the layout table is sent to every worker once instead of
+    with every task.
+    """
+    global _worker_layouts
+    _worker_layouts = layouts
+
+
+def index_task(file_path: str, start: int, index_dir: str) -> ds_index.PacketIndex:
+    """
+    :return: The index of the file at file_path; see ds_index.get_index.
+    """
+    if os.path.getsize(file_path) <= start:
+        return ds_index.build_index(b'', 0)
+    return ds_index.get_index(file_path, start, index_dir=index_dir)
+
+
+def decode_task(file_path: str, start: int, length_source: LengthSource, time_format: TimeFormat,
+                index: ds_index.PacketIndex, message_ids: list) -> list:
+    """
+    Decodes part of a file in a worker process of decode_files.
+    :param file_path:
+    :param start: The size of the file headers.
+    :param length_source:
+    :param time_format:
+    :param index: The part of the index of the file with the packets to decode. The whole file is scanned if None.
+    :param message_ids:
+    :return: See decode_records. Messages are identified by their key rather than their layout, and records are not
+    split into columns, since both make sending the result back to decode_files much slower.
+    """
+    if os.path.getsize(file_path) <= start:
+        return []
+
+    with open(file_path, 'rb') as ds_file, mmap.mmap(ds_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return [(layout.key, offsets, times, subseconds, records) for layout, offsets, times, subseconds, records in
+                decode_records(buffer, start, _worker_layouts, length_source, time_format, index, message_ids)]
+
+
+def merge_messages(results: list, layouts: LayoutTable) -> list:
+    """
+    Merges the messages decoded from several files, or several parts of one file.
+    :param results: A (file index, messages) tuple for every part, in the order of the files and of the parts of every
+    file. The messages are those returned by decode_task.
+    :param layouts:
+    :return: One DecodedMessage per message, in the order they first appear in results. Packets with times are
+    ordered by time; packets that have the same time, or have none, stay in the order of the files and of the packets
+    in every file. This order does not depend on how the files were split into parts.
+    """
+    parts = {}
+    for file_index, messages in results:
+        for key, offsets, times, subseconds, records in messages:
+            parts.setdefault(key, []).append((file_index, offsets, times, subseconds, records))
+
+    merged_messages = []
+    for key, key_parts in parts.items():
+        offsets = np.concatenate([part[1] for part in key_parts])
+        file_indices = np.concatenate([np.full(len(part[1]), part[0], dtype=np.int64) for part in key_parts])
+        layout = layouts.get_layout(key)
+        # Filled in place; np.concatenate promotes the structured dtypes of the records field by field, which is slow.
+        records = np.empty(len(offsets), dtype=layout.dtype)
+        position = 0
+        for part in key_parts:
+            records[position:position + len(part[4])] = part[4]
+            position += len(part[4])
+
+        times = None
+        subseconds = None
+        if key_parts[0][2] is not None:
+            times = np.concatenate([part[2] for part in key_parts])
+            subseconds = np.concatenate([part[3] for part in key_parts])
+            order = np.lexsort((offsets, file_indices, subseconds, times))
+            offsets = offsets[order]
+            file_indices = file_indices[order]
+            times = times[order]
+            subseconds = subseconds[order]
+            records = records[order]
+
+        merged_messages.append(DecodedMessage(layout, offsets, times, get_columns(records), subseconds, file_indices))
+
+    return merged_messages
+
+
+def decode_files(file_paths: list, sqlite_path: str, structures: list, length_source: LengthSource,
+                 time_format: TimeFormat = TimeFormat.CFE_SB_TIME_32_16_SUBS, message_ids: list = None,
+                 processes: int = None, packets_per_task: int = DEFAULT_PACKETS_PER_TASK,
+                 index_dir: str = None) -> list:
+    """
+    Decodes every packet in several ds files with a pool of processes. The layout table is built once, up front, and is
+    shared by every worker.
+    With LengthSource.STREAM every file is indexed first(see ds_index.get_index), and the packets of every file are
+    split into tasks of at most packets_per_task packets. Tasks get their part of the index from decode_files rather
+    than from the sidecar, so files whose index cannot be saved are decoded all the same. With LengthSource.DATABASE
+    every file is one task.
+    :param file_paths:
+    :param sqlite_path:
+    :param structures: See get_file_header_size. Every file must start with the same structures.
+    :param length_source:
+    :param time_format:
+    :param message_ids: See decode_buffer.
+    :param processes: The number of worker processes. One per cpu if None.
+    :param packets_per_task:
+    :param index_dir: See ds_index.get_index_path.
+    :return: See merge_messages. The file_indices of every message are positions in file_paths.
+    """
+    layouts = LayoutTable(layout_cache.get_layouts(sqlite_path)).compile_all()
+    file_header_size = get_file_header_size(layouts, structures)
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker, initargs=(layouts,)) as pool:
+        tasks = []
+        if length_source == LengthSource.STREAM:
+            indexes = pool.map(index_task, file_paths, [file_header_size] * len(file_paths),
+                               [index_dir] * len(file_paths))
+            for file_index, index in enumerate(indexes):
+                for first in range(0, len(index), packets_per_task):
+                    tasks.append((file_index, index.select(slice(first, first + packets_per_task))))
+        else:
+            tasks = [(file_index, None) for file_index in range(len(file_paths))]
+
+        decodes = [pool.submit(decode_task, file_paths[file_index], file_header_size, length_source, time_format,
+                               index, message_ids)
+                   for file_index, index in tasks]
+
+        return merge_messages([(file_index, decode.result()) for (file_index, _), decode in zip(tasks, decodes)],
+                              layouts)
+
+
+def get_input_files(input_dir: str, pattern: str = '*') -> list:
+    """
+    :return: The files in input_dir whose names match pattern, sorted by name. Index sidecars(see ds_index.py) are
+    never included.
+    """
+    file_paths = []
+    for file_path in sorted(glob.glob(os.path.join(input_dir, pattern))):
+        if os.path.isfile(file_path) and not file_path.endswith(ds_index.INDEX_FILE_SUFFIX):
+            file_paths.append(file_path)
+    return file_paths
+
+
+def write_messages(messages: list, output_dir: str, output_format: str = 'npz') -> list:
+    """
+    Writes every message to a file named after its macro in output_dir; see ds_sinks.py. The times of the packets, if
+    there are any, are written as "time" and "subseconds".
+    :param messages:
+    :param output_dir:
+    :param output_format: One of ds_sinks.SINKS.
+    :return: The paths of the files that were written.
+    """
+    return ds_sinks.get_sink(output_format, output_dir).write(messages)
+
+
+def read_yaml(yaml_file: str) -> dict:
+    yaml_data = yaml.load(open(yaml_file, 'r'),
+                          Loader=yaml.FullLoader)
+    return yaml_data
+
+
+def parse_cli() -> argparse.Namespace:
+    """
+    Parses cli arguments.
+    :return: The namespace that has all of the arguments that have been parsed.
+    """
+    parser = argparse.ArgumentParser(description='Decodes a ds file into one table per message.')
+    parser.add_argument('--structures_yaml', type=str, required=True,
+                        help='The file path to the YAML file which contains the names of the structures that come '
+                             'before the telemetry data.')
+    parser.add_argument('--sqlite_path', type=str, required=True,
+                        help='The file path to the sqlite database')
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('--input_file', type=str,
+                             help='The file path to the file that contains the telemetry/command data.')
+    input_group.add_argument('--input_dir', type=str,
+                             help='Decode every file in this directory that matches --glob with a pool of processes. '
+                                  'The packets of every message are merged across files in time order.')
+    parser.add_argument('--glob', type=str, default='*',
+                        help='The pattern of the names of the files in --input_dir to decode.')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='The number of processes that decode --input_dir. One per cpu by default.')
+    parser.add_argument('--packets_per_task', type=int, default=DEFAULT_PACKETS_PER_TASK,
+                        help='Files in --input_dir are split into tasks of at most this many packets.')
+    parser.add_argument('--output_dir', type=str, default='.',
+                        help='The directory the tables are written to.')
+    parser.add_argument('--output_format', type=str, choices=list(ds_sinks.SINKS.keys()),
+                        default=ds_sinks.get_default_format(),
+                        help='The format of the tables. parquet and feather need pyarrow. parquet by default if '
+                             'pyarrow is installed, npz otherwise.')
+    parser.add_argument('--message_length_source', type=int, choices=[1, 2], default=2,
+                        help='Which source should the parser use as the source of truth for the length of a message. '
+                             'Use 1 for database. 2 for the length inside the input file.')
+    parser.add_argument('--index', action='store_true',
+                        help='Find the packets through the index of the input file, which is built next to it if it '
+                             'does not have a valid one yet. Only works with --message_length_source 2. Files in '
+                             '--input_dir are always indexed with --message_length_source 2.')
+    parser.add_argument('--index_dir', type=str, default=None,
+                        help='The directory indexes are kept in. Next to the input files by default.')
+    parser.add_argument('--message_ids', type=lambda value: int(value, 0), nargs='+', default=None,
+                        help='The message ids to decode, such as 0x0880. All of them by default.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cli()
+
+    structures = log_parser.get_structure_names(read_yaml(args.structures_yaml))
+    length_source = LengthSource(args.message_length_source)
+    if args.input_dir:
+        messages = decode_files(get_input_files(args.input_dir, args.glob), args.sqlite_path, structures, length_source,
+                                message_ids=args.message_ids, processes=args.processes,
+                                packets_per_task=args.packets_per_task, index_dir=args.index_dir)
+    else:
+        messages = decode_file(args.input_file, args.sqlite_path, structures, length_source, use_index=args.index,
+                               message_ids=args.message_ids, index_dir=args.index_dir)
+    write_messages(messages, args.output_dir, args.output_format)
+
+    for message in messages:
+        logging.info(f'{message.layout.macro}: {len(message.offsets)} packets')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+Indexes the packets of the binary files written by the ds application(see log_parser.py). Building an index reads only
+the ccsds headers of every packet; it records where every packet starts, its stream id, command code, length and time
+in compact typed arrays.
+
+The index is saved as a sidecar file next to the log, or in an index directory, and is reused as long as the size and
+modification time of the log do not change, so decoding, filtering and counting the packets of a log only scans it once.
+Logs are often archived in read-only directories; when the sidecar cannot be written the index is still built and used,
+only not saved.
+"""
+import argparse
+import logging
+import mmap
+import os
+from struct import Struct
+
+import numpy as np
+import sqlite_utils
+import yaml
+
+import log_parser
+
+"""
+Bump this whenever the layout of index files changes. Index files of another version are rebuilt.
+"""
+INDEX_FORMAT_VERSION = 1
+
+INDEX_FILE_SUFFIX = '.index.npz'
+
+PRIMARY_HEADER = Struct('!HHH')
+COMMAND_SECONDARY_HEADER = Struct('!H')
+TIME = Struct('=I')
+PRIMARY_HEADER_SIZE = 6
+
+"""
+The command code of packets that have none, such as telemetry.
+"""
+NO_COMMAND_CODE = -1
+
+
+class PacketIndex:
+    def __init__(self, offsets: np.ndarray, stream_ids: np.ndarray, command_codes: np.ndarray, lengths: np.ndarray,
+                 times: np.ndarray):
+        """
+        One entry per packet, in the order of the packets in the log.
+        :param offsets: Where every packet starts in the log.
+        :param stream_ids: The stream id in the primary header of every packet.
+        :param command_codes: The command code of every command packet. NO_COMMAND_CODE for every other packet.
+        :param lengths: The length in the primary header of every packet.
+        :param times: The seconds of the time of every telemetry packet with a secondary header. 0 for every other
+        packet.
+        """
+        self.offsets = offsets
+        self.stream_ids = stream_ids
+        self.command_codes = command_codes
+        self.lengths = lengths
+        self.times = times
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def select(self, mask: np.ndarray):
+        """
+        :param mask: A boolean array, or an array of positions.
+        :return: A PacketIndex with the packets of mask.
+        """
+        return PacketIndex(self.offsets[mask], self.stream_ids[mask], self.command_codes[mask], self.lengths[mask],
+                           self.times[mask])
+
+    def filter(self, message_ids: list = None, command_codes: list = None, start_time: int = None,
+               end_time: int = None):
+        """
+        :param message_ids: The stream ids of the packets to keep. All of them if None.
+        :param command_codes: The command codes of the command packets to keep. All of them if None. This only filters
+        command packets; packets without a command code, such as telemetry, are kept.
+        :param start_time: Keep only packets whose time is at least start_time.
+        :param end_time: Keep only packets whose time is less than end_time.
+        :return: A PacketIndex with the packets that pass every filter that is not None.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if message_ids is not None:
+            mask &= np.isin(self.stream_ids, message_ids)
+        if command_codes is not None:
+            mask &= (self.command_codes == NO_COMMAND_CODE) | np.isin(self.command_codes, command_codes)
+        if start_time is not None:
+            mask &= self.times >= start_time
+        if end_time is not None:
+            mask &= self.times < end_time
+        return self.select(mask)
+
+    def get_keys(self) -> np.ndarray:
+        """
+        :return: A key of every packet that is unique to its stream id and command code.
+        """
+        return self.stream_ids.astype(np.int64) << 16 | (self.command_codes.astype(np.int64) & 0xFFFF)
+
+    def get_groups(self) -> list:
+        """
+        :return: A (stream id, command code, positions) tuple for every message, where positions are the positions of
+        its packets in the index. Messages are in the order they first appear in the log, and positions are in order.
+        """
+        if len(self) == 0:
+            return []
+
+        _, first_positions, inverse, counts = np.unique(self.get_keys(), return_index=True, return_inverse=True,
+                                                        return_counts=True)
+        inverse = inverse.reshape(-1)
+        positions = np.split(np.argsort(inverse, kind='stable'), np.cumsum(counts)[:-1])
+
+        groups = []
+        for group in np.argsort(first_positions):
+            first_position = first_positions[group]
+            groups.append((int(self.stream_ids[first_position]), int(self.command_codes[first_position]),
+                           positions[group]))
+        return groups
+
+    def get_counts(self) -> dict:
+        """
+        :return: The number of packets of every message, keyed by (stream id, command code). The command code is None
+        for packets that are not commands.
+        """
+        return {(stream_id, None if command_code == NO_COMMAND_CODE else command_code): len(positions)
+                for stream_id, command_code, positions in self.get_groups()}
+
+
+def build_index(buffer, start: int) -> PacketIndex:
+    """
+    Reads the headers of every packet in buffer, using the length in their primary header to find the next one.
+    :param buffer: The contents of a ds file, such as a mmap.
+    :param start: Where the first packet starts; the size of the file headers.
+    :return:
+    """
+    offsets = []
+    stream_ids = []
+    command_codes = []
+    lengths = []
+    times = []
+
+    unpack_primary_header = PRIMARY_HEADER.unpack_from
+    unpack_command_header = COMMAND_SECONDARY_HEADER.unpack_from
+    unpack_time = TIME.unpack_from
+
+    end = len(buffer)
+    offset = start
+    while offset + PRIMARY_HEADER_SIZE <= end:
+        stream_id, _, length = unpack_primary_header(buffer, offset)
+
+        command_code = NO_COMMAND_CODE
+        time = 0
+        # These are log_parser.get_packet_type, is_secondary_header_present and get_command_code, inlined since this
+        # loop runs once per packet.
+        if stream_id >> 11 & 1:
+            if stream_id >> 12 & 1:
+                if offset + PRIMARY_HEADER_SIZE + COMMAND_SECONDARY_HEADER.size <= end:
+                    command, = unpack_command_header(buffer, offset + PRIMARY_HEADER_SIZE)
+                    command_code = command >> 1 & 0x7F
+            elif offset + PRIMARY_HEADER_SIZE + TIME.size <= end:
+                time, = unpack_time(buffer, offset + PRIMARY_HEADER_SIZE)
+
+        offsets.append(offset)
+        stream_ids.append(stream_id)
+        command_codes.append(command_code)
+        lengths.append(length)
+        times.append(time)
+
+        offset += length + 7
+
+    return PacketIndex(np.array(offsets, dtype=np.int64), np.array(stream_ids, dtype=np.uint16),
+                       np.array(command_codes, dtype=np.int16), np.array(lengths, dtype=np.uint16),
+                       np.array(times, dtype=np.uint32))
+
+
+def get_index_path(file_path: str, index_dir: str = None) -> str:
+    """
+    :param file_path: The log.
+    :param index_dir: The directory the index is kept in. Next to the log if None.
+    :return: The path of the sidecar index of the log at file_path.
+    """
+    if index_dir is None:
+        return file_path + INDEX_FILE_SUFFIX
+    return os.path.join(index_dir, os.path.basename(file_path) + INDEX_FILE_SUFFIX)
+
+
+def get_file_signature(file_path: str) -> np.ndarray:
+    """
+    :return: What must not change in the log for its index to be reused: its size and its modification time.
+    """
+    file_stat = os.stat(file_path)
+    return np.array([file_stat.st_size, file_stat.st_mtime_ns], dtype=np.int64)
+
+
+def save_index(index: PacketIndex, file_path: str, start: int, index_dir: str = None):
+    """
+    Saves index as the sidecar of the log at file_path.
+    :param index:
+    :param file_path: The log index was built from.
+    :param start: See build_index.
+    :param index_dir: See get_index_path.
+    :return:
+    """
+    index_path = get_index_path(file_path, index_dir)
+    if index_dir is not None:
+        os.makedirs(index_dir, exist_ok=True)
+
+    # Written under another name first, so a reader never sees a partially written index.
+    temp_path = index_path + '.tmp.npz'
+    try:
+        np.savez(temp_path, format_version=INDEX_FORMAT_VERSION, signature=get_file_signature(file_path), start=start,
+                 offsets=index.offsets, stream_ids=index.stream_ids, command_codes=index.command_codes,
+                 lengths=index.lengths, times=index.times)
+        os.replace(temp_path, index_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_index(file_path: str, start: int, index_dir: str = None):
+    """
+    :param file_path: The log.
+    :param start: See build_index.
+    :param index_dir: See get_index_path.
+    :return: The sidecar index of the log at file_path. None if there is none, or it does not match the log as it is
+    now.
+    """
+    index_path = get_index_path(file_path, index_dir)
+    if not os.path.isfile(index_path):
+        return None
+
+    try:
+        with np.load(index_path) as index_file:
+            if int(index_file['format_version']) != INDEX_FORMAT_VERSION or int(index_file['start']) != start or \
+                    not np.array_equal(index_file['signature'], get_file_signature(file_path)):
+                return None
+
+            return PacketIndex(index_file['offsets'], index_file['stream_ids'], index_file['command_codes'],
+                               index_file['lengths'], index_file['times'])
+    except (OSError, ValueError, KeyError):
+        logging.warning(f'"{index_path}" is not a valid index. It will be rebuilt.')
+        return None
+
+
+def get_index(file_path: str, start: int, rebuild: bool = False, index_dir: str = None) -> PacketIndex:
+    """
+    :param file_path: The log.
+    :param start: See build_index.
+    :param rebuild: Build the index even if there is a valid sidecar.
+    :param index_dir: See get_index_path.
+    :return: The index of the log at file_path. It is loaded from its sidecar if there is a valid one; otherwise it is
+    built and saved as the sidecar, if the sidecar can be written.
+    """
+    if not rebuild:
+        index = load_index(file_path, start, index_dir)
+        if index is not None:
+            return index
+
+    if os.path.getsize(file_path) <= start:
+        index = build_index(b'', 0)
+    else:
+        with open(file_path, 'rb') as ds_file, mmap.mmap(ds_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            index = build_index(buffer, start)
+
+    try:
+        save_index(index, file_path, start, index_dir)
+    except OSError as error:
+        logging.warning(f'The index of "{file_path}" could not be saved: {error}')
+
+    return index
+
+
+def get_file_header_size(db_handle: sqlite_utils.Database, structures: list) -> int:
+    """
+    :param db_handle:
+    :param structures: The names of the structures at the start of the file; see log_parser.get_structure_names.
+    :return: The size of the file headers.
+    """
+    file_header_size = 0
+    for structure in structures:
+        file_header_size += list(db_handle['symbols'].rows_where('name=?', [structure]))[0]['byte_size']
+    return file_header_size
+
+
+def read_yaml(yaml_file: str) -> dict:
+    yaml_data = yaml.load(open(yaml_file, 'r'),
+                          Loader=yaml.FullLoader)
+    return yaml_data
+
+
+def parse_cli() -> argparse.Namespace:
+    """
+    Parses cli arguments.
+    :return: The namespace that has all of the arguments that have been parsed.
+    """
+    parser = argparse.ArgumentParser(description='Indexes the packets of a ds file and prints how many packets every '
+                                                 'message has.')
+    parser.add_argument('--structures_yaml', type=str, required=True,
+                        help='The file path to the YAML file which contains the names of the structures that come '
+                             'before the telemetry data.')
+    parser.add_argument('--sqlite_path', type=str, required=True,
+                        help='The file path to the sqlite database')
+    parser.add_argument('--input_file', type=str, required=True,
+                        help='The file path to the file that contains the telemetry/command data.')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Build the index even if the input file has a valid one.')
+    parser.add_argument('--index_dir', type=str, default=None,
+                        help='The directory indexes are kept in. Next to the input file by default.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cli()
+
+    structures = log_parser.get_structure_names(read_yaml(args.structures_yaml))
+    start = get_file_header_size(sqlite_utils.Database(args.sqlite_path), structures)
+    index = get_index(args.input_file, start, args.rebuild, args.index_dir)
+
+    for (stream_id, command_code), count in index.get_counts().items():
+        message = hex(stream_id) if command_code is None else f'{hex(stream_id)} CC {command_code}'
+        print(f'{message}: {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Writes messages decoded by ds_decoder.py as one columnar table per message, instead of the csv files log_parser.py
+writes. Columns keep the types ds_decoder gave them from the fields in the database, so nothing is formatted as text on
+write or parsed again on load.
+
+Tables are written as Apache Parquet or Arrow IPC(Feather) files when pyarrow is installed, and as NumPy npz files
+otherwise. Feather files are written uncompressed so they can be memory-mapped, and both Arrow formats can load only
+some of their columns:
+    pyarrow.feather.read_table('APP_HK_TLM_MID.feather', columns=['time', 'Value1'], memory_map=True)
+npz files load every column only when it is accessed.
+"""
+import abc
+import os
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    # pyarrow is optional; without it messages can only be written as npz files.
+    pyarrow = None
+
+
+def get_table_name(message) -> str:
+    """
+    :param message: A ds_decoder.DecodedMessage.
+    :return: The name of the table of message: its macro, along with its command code for commands. These are the names
+    log_parser gives its csv files.
+    """
+    table_name = message.layout.macro
+    if isinstance(message.layout.key, tuple):
+        table_name += '_CC_' + str(message.layout.key[1])
+    return table_name
+
+
+def get_columns(message) -> dict:
+    """
+    :param message: A ds_decoder.DecodedMessage.
+    :return: The columns of message, along with the times of its packets as "time" and "subseconds" if it has any.
+    """
+    columns = dict(message.columns)
+    if message.times is not None:
+        columns['time'] = message.times
+        if message.subseconds is not None:
+            columns['subseconds'] = message.subseconds
+    return columns
+
+
+def get_arrow_array(column: np.ndarray):
+    """
+    :param column: A column of a decoded message.
+    :return: The Arrow array of column. Strings and raw bytes are fixed size binaries, arrays are fixed size lists and
+    numbers are converted to the native byte order, which is the only one Arrow supports.
+    """
+    if column.ndim > 1:
+        values = get_arrow_array(column.reshape(-1))
+        return pyarrow.FixedSizeListArray.from_arrays(values, int(np.prod(column.shape[1:])))
+
+    if column.dtype.kind in ('S', 'V'):
+        data = np.ascontiguousarray(column).tobytes()
+        return pyarrow.FixedSizeBinaryArray.from_buffers(pyarrow.binary(column.dtype.itemsize), len(column),
+                                                         [None, pyarrow.py_buffer(data)])
+
+    if not column.dtype.isnative:
+        column = column.astype(column.dtype.newbyteorder('='))
+    return pyarrow.array(column)
+
+
+def get_arrow_table(message):
+    """
+    :param message: A ds_decoder.DecodedMessage.
+    :return: A pyarrow.Table with the columns of message(see get_columns). Its metadata has the macro and the symbol of
+    the message.
+    """
+    columns = get_columns(message)
+    table = pyarrow.table({name: get_arrow_array(column) for name, column in columns.items()})
+    return table.replace_schema_metadata({'macro': message.layout.macro, 'symbol': message.layout.symbol_name})
+
+
+class MessageSink(abc.ABC):
+    """
+    Writes every message to its own file in output_dir, named after its table(see get_table_name). Subclasses write
+    the files of one format.
+    """
+    extension = ''
+
+    def __init__(self, output_dir: str):
+        """
+        :param output_dir: Created if it does not exist.
+        """
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def get_path(self, message) -> str:
+        return os.path.join(self.output_dir, get_table_name(message) + self.extension)
+
+    @abc.abstractmethod
+    def write_message(self, message):
+        """
+        Writes message to get_path(message).
+        :param message: A ds_decoder.DecodedMessage.
+        """
+
+    def write(self, messages: list) -> list:
+        """
+        :param messages: ds_decoder.DecodedMessage objects.
+        :return: The paths of the files that were written, in the order of messages.
+        """
+        paths = []
+        for message in messages:
+            self.write_message(message)
+            paths.append(self.get_path(message))
+        return paths
+
+
+class NpzSink(MessageSink):
+    extension = '.npz'
+
+    def write_message(self, message):
+        np.savez(self.get_path(message), **get_columns(message))
+
+
+class ParquetSink(MessageSink):
+    extension = '.parquet'
+
+    def __init__(self, output_dir: str, compression: str = 'snappy'):
+        super().__init__(output_dir)
+        self.compression = compression
+
+    def write_message(self, message):
+        pyarrow.parquet.write_table(get_arrow_table(message), self.get_path(message), compression=self.compression)
+
+
+class FeatherSink(MessageSink):
+    extension = '.feather'
+
+    def write_message(self, message):
+        # Compressed files cannot be memory-mapped.
+        pyarrow.feather.write_feather(get_arrow_table(message), self.get_path(message), compression='uncompressed')
+
+
+"""
+The sinks by the name of their format, and whether they need pyarrow.
+"""
+SINKS = {
+    'parquet': (ParquetSink, True),
+    'feather': (FeatherSink, True),
+    'npz': (NpzSink, False),
+}
+
+
+def get_default_format() -> str:
+    """
+    :return: parquet if pyarrow is installed, npz otherwise.
+    """
+    return 'parquet' if pyarrow is not None else 'npz'
+
+
+def get_sink(output_format: str, output_dir: str) -> MessageSink:
+    """
+    :param output_format: One of SINKS.
+    :param output_dir:
+    :return: The sink that writes output_format to output_dir.
+    """
+    if output_format not in SINKS:
+        raise ValueError(f'Unknown output format "{output_format}". Use one of {", ".join(SINKS.keys())}.')
+
+    sink, needs_pyarrow = SINKS[output_format]
+    if needs_pyarrow and pyarrow is None:
+        raise ValueError(f'The {output_format} format needs pyarrow, which is not installed. Install it, or use the '
+                         f'npz format.')
+
+    return sink(output_dir)
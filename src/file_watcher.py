@@ -0,0 +1,96 @@
+"""
+Watches a set of files for changes by polling their modification time and size. Polling is used instead of inotify and
+friends because it works the same on every platform and on network mounts, and the number of files squeezer watches(the
+elf files and the configuration) is small enough for polling to be cheap.
+"""
+import logging
+import os
+import time
+
+
+def get_file_stat(file_path: str):
+    """
+    :param file_path:
+    :return: A (mtime_ns, size) tuple for the file at file_path. None if the file does not exist.
+    """
+    try:
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+    return file_stat.st_mtime_ns, file_stat.st_size
+
+
+class FileWatcher:
+    def __init__(self, paths: list, poll_interval: float = 1.0, settle_time: float = 1.0):
+        """
+        :param paths: The files to watch. They do not need to exist.
+        :param poll_interval: How often, in seconds, the files are checked for changes.
+        :param settle_time: How long, in seconds, the files must go without changing before a change is reported. Build
+        systems usually write a file in several steps; this avoids reporting a half-written file.
+        """
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.__stats = {}
+        self.set_paths(paths)
+
+    def set_paths(self, paths: list):
+        """
+        Changes the files being watched. Files that were already being watched keep their last seen state, so a change
+        that happened while calling this is not lost.
+        :param paths:
+        :return:
+        """
+        self.__stats = {path: self.__stats[path] if path in self.__stats else get_file_stat(path) for path in paths}
+
+    def get_paths(self) -> list:
+        return list(self.__stats.keys())
+
+    def mark_seen(self, path: str, file_stat=None):
+        """
+        Records a state of path as seen; use this after writing to a watched file so that the write is not reported as
+        a change.
+        :param path:
+        :param file_stat: The state the write left the file in, as returned by get_file_stat right after the write. Any
+        change made to the file after that is still reported. The current state of the file if None.
+        :return:
+        """
+        if path in self.__stats:
+            self.__stats[path] = get_file_stat(path) if file_stat is None else file_stat
+
+    def poll(self) -> set:
+        """
+        :return: The paths that changed(including those that were created or removed) since they were last seen.
+        """
+        changed_paths = set()
+
+        for path, last_stat in self.__stats.items():
+            current_stat = get_file_stat(path)
+            if current_stat != last_stat:
+                self.__stats[path] = current_stat
+                changed_paths.add(path)
+
+        return changed_paths
+
+    def wait(self) -> set:
+        """
+        Blocks until at least one of the files changes and then until none of them has changed for settle_time.
+        :return: Every path that changed while waiting.
+        """
+        changed_paths = set()
+
+        while not changed_paths:
+            time.sleep(self.poll_interval)
+            changed_paths = self.poll()
+
+        settle_start = time.monotonic()
+        while time.monotonic() - settle_start < self.settle_time:
+            time.sleep(min(self.poll_interval, self.settle_time))
+            new_changes = self.poll()
+            if new_changes:
+                changed_paths |= new_changes
+                settle_start = time.monotonic()
+
+        logging.info(f'Detected changes on {sorted(changed_paths)}.')
+
+        return changed_paths
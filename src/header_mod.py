@@ -9,64 +9,50 @@ import mod_sql
 import logging
 
 
-def remove_telemetry_symbol_headers(db_handle: sqlite_utils.Database, telemetry_symbol: int, header_size: int):
+def get_symbols_without_header(db_handle: sqlite_utils.Database, message_table: str, header_size: int) -> list:
     """
-    Removes field of symbol with id of telemetry_symbol that has a byte_offset less than header_size.
-    This function also commits the delete transactions so there is no need to commit by the caller.
-    :param telemetry_symbol:
     :param db_handle:
+    :param message_table: Either "telemetry" or "commands".
     :param header_size:
-    :return:
+    :return: The ids of the symbols of the messages in message_table that have no field with a byte_offset less than
+    header_size.
     """
-    db_handle['fields'].delete_where('byte_offset < ? and symbol=?', [header_size, telemetry_symbol])
-
-    db_handle.conn.commit()
+    return [symbol for symbol, in db_handle.execute(f'SELECT DISTINCT symbol FROM {message_table} WHERE NOT EXISTS '
+                                                    f'(SELECT 1 FROM fields WHERE fields.symbol = {message_table}.symbol '
+                                                    f'AND fields.byte_offset < ?) ORDER BY symbol', [header_size])]
 
 
-def remove_commands_symbol_headers(db_handle: sqlite_utils.Database, command_symbol: int, header_size: int):
+def replace_symbol_headers(db_handle: sqlite_utils.Database, message_table: str, header_size: int,
+                           header_symbol_id: int, little_endian: int):
     """
-    Removes field of symbol with id of command_symbol that has a byte_offset less than header_size.
-    This function also commits the delete transactions so there is no need to commit by the caller.
-    :param command_symbol:
+    Replaces the fields with a byte_offset less than header_size of the symbols of every message in message_table with
+    a single field of type header_symbol_id. The new field takes the name of the first field it replaces. Symbols that
+    have no such fields are left as they are.
+    This runs a fixed number of statements however many messages there are. The caller is responsible for committing.
     :param db_handle:
+    :param message_table: Either "telemetry" or "commands".
     :param header_size:
+    :param header_symbol_id:
+    :param little_endian:
     :return:
     """
-    db_handle['fields'].delete_where('byte_offset < ? and symbol=?', [header_size, command_symbol])
-
-    db_handle.conn.commit()
-
-
-def add_telemetry_symbol_header(db_handle: sqlite_utils.Database, header_symbol_id: str,
-                                telemetry_symbol_id: int,
-                                header_field_name: str, little_endian: int):
-    field_record = dict()
-    field_record['symbol'] = telemetry_symbol_id
-    field_record['name'] = header_field_name
-    field_record['byte_offset'] = 0
-    field_record['type'] = header_symbol_id
-    field_record['multiplicity'] = 0
-    field_record['little_endian'] = little_endian
-    field_record['bit_size'] = 0
-    field_record['bit_offset'] = 0
-
-    db_handle['fields'].insert(field_record, ignore=True)
-
+    db_handle.execute('DROP TABLE IF EXISTS temp.header_fields')
+    # The first field of every symbol is the one with the smallest id. This is not a window function, which needs
+    # SQLite 3.25 or newer.
+    db_handle.execute(f'CREATE TEMP TABLE header_fields AS '
+                      f'SELECT symbol, name FROM fields WHERE id IN '
+                      f'(SELECT MIN(id) FROM fields WHERE byte_offset < ? AND symbol IN '
+                      f'(SELECT symbol FROM {message_table}) GROUP BY symbol)', [header_size])
 
-def add_commands_symbol_header(db_handle: sqlite_utils.Database, header_symbol_id: int, command_symbol_id: int,
-                               header_field_name: str, little_endian: int):
-    field_record = dict()
+    db_handle.execute('DELETE FROM fields WHERE byte_offset < ? AND symbol IN (SELECT symbol FROM temp.header_fields)',
+                      [header_size])
 
-    field_record['symbol'] = command_symbol_id
-    field_record['name'] = header_field_name
-    field_record['byte_offset'] = 0
-    field_record['type'] = header_symbol_id
-    field_record['multiplicity'] = 0
-    field_record['little_endian'] = little_endian
-    field_record['bit_size'] = 0
-    field_record['bit_offset'] = 0
+    db_handle.execute('INSERT OR IGNORE INTO fields'
+                      '(symbol, name, byte_offset, type, multiplicity, little_endian, bit_size, bit_offset) '
+                      'SELECT symbol, name, 0, ?, 0, ?, 0, 0 FROM temp.header_fields',
+                      [header_symbol_id, little_endian])
 
-    db_handle['fields'].insert(field_record, ignore=True)
+    db_handle.execute('DROP TABLE temp.header_fields')
 
 
 def read_yaml(yaml_file: str) -> dict:
@@ -126,43 +112,15 @@ def header_mod(db_handle: sqlite_utils.Database, headers_yaml: dict):
 
     command_header_symbol_id = header_commands_symbol_record['id']
 
-    # Cache stores to avoid redundant database lookups
-    telemetry_symbols_processed = set()
-    command_symbols_processed = set()
-
-    for telemetry_record in db_handle['telemetry'].rows:
-        if telemetry_record['symbol'] not in telemetry_symbols_processed:
-            telemetry_symbols_processed.add(telemetry_record['symbol'])
-            symbol_fields = list(db_handle['fields'].rows_where('symbol=?', [telemetry_record['symbol']]))
-
-            field_name = list(filter(lambda field_record: field_record['byte_offset'] < telemetry_symbol_size,
-                                     symbol_fields))
-
-            # It is possible to have symbols that just don't have a header. In that case, we ignore them.
-            if len(field_name) > 0:
-                remove_telemetry_symbol_headers(db_handle, telemetry_record['symbol'],
-                                                headers_yaml['telemetry_header']['size'])
-                add_telemetry_symbol_header(db_handle, telemetry_header_symbol_id, telemetry_record['symbol'],
-                                            field_name[0]['name'], telemetry_little_endian)
-
-            else:
-                logging.warning(f'The symbol {telemetry_record["symbol"]} does not have a header. It has been ignored.')
-
-    for command_record in db_handle['commands'].rows:
-        if command_record['symbol'] not in command_symbols_processed:
-            command_symbols_processed.add(command_record['symbol'])
-
-            symbol_fields = list(db_handle['fields'].rows_where('symbol=?', [command_record['symbol']]))
-
-            field_name = list(filter(lambda field_record: field_record['byte_offset'] < telemetry_symbol_size,
-                                     symbol_fields))
+    # It is possible to have symbols that just don't have a header. In that case, we ignore them.
+    for symbol in get_symbols_without_header(db_handle, 'telemetry', telemetry_symbol_size):
+        logging.warning(f'The symbol {symbol} does not have a header. It has been ignored.')
 
-            # It is possible to have symbols that just don't have a header. In that case, we ignore them.
-            if len(field_name) > 0:
-                remove_commands_symbol_headers(db_handle, command_record['symbol'],
-                                               commands_header_size)
-                add_commands_symbol_header(db_handle, command_header_symbol_id, command_record['symbol'],
-                                           field_name[0]['name'], commands_little_endian)
+    with db_handle.conn:
+        replace_symbol_headers(db_handle, 'telemetry', telemetry_symbol_size, telemetry_header_symbol_id,
+                               telemetry_little_endian)
+        replace_symbol_headers(db_handle, 'commands', commands_header_size, command_header_symbol_id,
+                               commands_little_endian)
 
 
 def main():
@@ -0,0 +1,143 @@
+"""
+A persistent, content-addressed cache of juicer output. Every entry is a shard database(see shard_merger.py) that
+juicer wrote for a single ELF file. Entries are keyed by the hash of the ELF file along with the version of juicer and
+the mode it was run on. That way an ELF that has not changed since the last run does not have to be parsed again.
+The cache is bounded in size; the least recently used entries are evicted first.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+CACHE_ENTRY_SUFFIX = '.sqlite'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str, file_hash=None):
+    """
+    Feeds the contents of the file at file_path into file_hash.
+    :param file_path:
+    :param file_hash: A hashlib object. If None, a new sha256 hash is used.
+    :return: The hashlib object that was fed.
+    """
+    if file_hash is None:
+        file_hash = hashlib.sha256()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+
+    return file_hash
+
+
+def get_juicer_version(juicer_path: str) -> str:
+    """
+    juicer does not report a version, so the hash of its executable is used instead. This way a rebuilt juicer with
+    any change at all invalidates every entry it wrote.
+    :param juicer_path:
+    :return:
+    """
+    return hash_file(juicer_path).hexdigest()
+
+
+class JuicerCache:
+    def __init__(self, cache_dir: str, max_size: int, juicer_version: str):
+        """
+        :param cache_dir: The directory where the entries are stored. It is created if it does not exist.
+        :param max_size: The maximum size of the cache in bytes.
+        :param juicer_version: See get_juicer_version.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.juicer_version = juicer_version
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_key(self, elf_path: str, mode: str) -> str:
+        key_hash = hashlib.sha256()
+        key_hash.update(self.juicer_version.encode())
+        key_hash.update(mode.encode())
+        # juicer writes the path of the ELF into the elfs table, so it is part of what juicer outputs.
+        key_hash.update(os.path.realpath(elf_path).encode())
+        return hash_file(elf_path, key_hash).hexdigest()
+
+    def __get_entry_path(self, key: str) -> Path:
+        return self.cache_dir / (key + CACHE_ENTRY_SUFFIX)
+
+    def get(self, key: str, destination_path: str) -> bool:
+        """
+        Copies the entry with key to destination_path.
+        :param key: See get_key.
+        :param destination_path:
+        :return: True if the entry exists and was copied, False otherwise.
+        """
+        entry_path = self.__get_entry_path(key)
+        try:
+            shutil.copyfile(entry_path, destination_path)
+        except FileNotFoundError:
+            return False
+
+        # The modification time tracks the last use of the entry; this is what eviction is based on.
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Another process evicted the entry after we copied it. Our copy is still good.
+            pass
+
+        return True
+
+    def put(self, key: str, shard_path: str):
+        """
+        Stores a copy of the shard at shard_path under key, then evicts entries if the cache is over its size limit.
+        The copy is written to a temporary file first and then renamed, so other processes sharing the cache never
+        see a partially written entry.
+        :param key: See get_key.
+        :param shard_path:
+        :return:
+        """
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(file_descriptor)
+        try:
+            shutil.copyfile(shard_path, temp_path)
+            os.replace(temp_path, self.__get_entry_path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        self.evict()
+
+    def get_entries(self) -> list:
+        """
+        :return: A list of (path, size, last_used) tuples for every entry, with the least recently used entry first.
+        """
+        entries = []
+        for entry_path in self.cache_dir.glob('*' + CACHE_ENTRY_SUFFIX):
+            try:
+                entry_stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry_path, entry_stat.st_size, entry_stat.st_mtime))
+
+        entries.sort(key=lambda entry: entry[2])
+
+        return entries
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in max_size.
+        :return:
+        """
+        entries = self.get_entries()
+        cache_size = sum(entry[1] for entry in entries)
+
+        for entry_path, entry_size, _ in entries:
+            if cache_size <= self.max_size:
+                break
+            logging.info(f'Evicting "{entry_path}" from the juicer cache.')
+            try:
+                entry_path.unlink()
+            except FileNotFoundError:
+                pass
+            cache_size -= entry_size
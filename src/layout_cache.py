@@ -0,0 +1,272 @@
+"""
+A persisted cache of the layouts log_parser.py and ds_decoder.py decode messages with. A layout is everything they need
+to know about a telemetry or command message: the struct format string of its payload, the labels of its csv columns,
+its macro and symbol, along with the path, offset, type and byte order of every field and whether it is an
+enumeration. This is the only place layouts are defined; ds_decoder builds its dtypes from these.
+
+The layouts of every message are compiled in one pass over the database: a single recursive query flattens every
+message into its leaf fields, with their offsets from the start of the message and their dotted paths. They are saved
+as a JSON sidecar next to the database, keyed by its size and modification time, so parsing more logs against the same
+database does not run any SQL, nor read the database at all. Databases that may be rewritten without their size or
+modification time changing can be fingerprinted by a hash of their contents instead, at the cost of reading all of them.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import sqlite_utils
+
+import ccsds
+import juicer_cache
+
+"""
+Bump this whenever the layout of cache files, or the way layouts are compiled, changes. Cache files of another version
+are rebuilt.
+"""
+LAYOUT_CACHE_FORMAT_VERSION = 4
+
+LAYOUT_CACHE_SUFFIX = '.layouts.json'
+
+
+def get_database_fingerprint(sqlite_path: str, hash_contents: bool = False) -> str:
+    """
+    :param sqlite_path:
+    :param hash_contents: Fingerprint the database by a hash of its contents instead of its size and modification time.
+    :return: What must not change in the database at sqlite_path, along with the format of the cache, for its layouts
+    to be reused.
+    """
+    if not hash_contents:
+        database_stat = os.stat(sqlite_path)
+        return f'{LAYOUT_CACHE_FORMAT_VERSION}:{database_stat.st_size}:{database_stat.st_mtime_ns}'
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(str(LAYOUT_CACHE_FORMAT_VERSION).encode())
+    return juicer_cache.hash_file(sqlite_path, fingerprint).hexdigest()
+
+
+"""
+Nested structures deeper than this are not flattened; this only guards against symbols that contain themselves.
+"""
+MAX_LAYOUT_DEPTH = 32
+
+"""
+Flattens every telemetry and command symbol into its leaf fields in one recursive query. Fields whose type is a
+structure are replaced by the fields of the structure, once for every element when they are arrays of structures.
+Enumerations are leaves, even if they have fields. Every leaf comes with its offset from the start of the message, its
+path, such as "Vectors[1].X", its type, size and byte order, and the offset and byte order of the field of the message
+it is part of. Leaves are in
+the order of their offsets at every level, with ties in the order fields were inserted in.
+"""
+LAYOUT_QUERY = """
+WITH RECURSIVE
+    elements(element) AS (
+        SELECT 0
+        UNION ALL
+        SELECT element + 1 FROM elements
+        WHERE element + 1 < (SELECT MAX(multiplicity) FROM fields WHERE type IN (SELECT symbol FROM fields))),
+    roots(symbol) AS (SELECT symbol FROM telemetry UNION SELECT symbol FROM commands),
+    layout(root, depth, top_offset, top_little_endian, sort_key, path, name, byte_offset, type, multiplicity,
+           little_endian, enumeration) AS (
+        SELECT fields.symbol, 0, fields.byte_offset, fields.little_endian,
+               printf('%010d%010d', fields.byte_offset, fields.id), fields.name, fields.name, fields.byte_offset,
+               fields.type, fields.multiplicity, fields.little_endian,
+               EXISTS (SELECT 1 FROM enumerations WHERE enumerations.symbol = fields.type)
+        FROM fields JOIN roots ON roots.symbol = fields.symbol
+        UNION ALL
+        SELECT layout.root, layout.depth + 1, layout.top_offset, layout.top_little_endian,
+               layout.sort_key || printf('%010d%010d%010d', elements.element, fields.byte_offset, fields.id),
+               layout.path || CASE WHEN layout.multiplicity > 0 THEN '[' || elements.element || ']' ELSE '' END ||
+               '.' || fields.name,
+               fields.name, layout.byte_offset + elements.element * symbols.byte_size + fields.byte_offset,
+               fields.type, fields.multiplicity, fields.little_endian,
+               EXISTS (SELECT 1 FROM enumerations WHERE enumerations.symbol = fields.type)
+        FROM layout
+        JOIN symbols ON symbols.id = layout.type
+        JOIN fields ON fields.symbol = layout.type
+        JOIN elements ON elements.element < MAX(layout.multiplicity, 1)
+        WHERE NOT layout.enumeration AND layout.depth < ?)
+SELECT layout.root, layout.top_offset, layout.top_little_endian, layout.path, layout.name, layout.byte_offset,
+       symbols.name, symbols.byte_size, layout.multiplicity, layout.little_endian, layout.enumeration
+FROM layout
+JOIN symbols ON symbols.id = layout.type
+WHERE layout.enumeration OR NOT EXISTS (SELECT 1 FROM fields WHERE fields.symbol = layout.type)
+ORDER BY layout.root, layout.sort_key
+"""
+
+
+def get_leaves(db_handle: sqlite_utils.Database) -> dict:
+    """
+    :return: The leaf fields of every telemetry and command symbol(see LAYOUT_QUERY), keyed by symbol id.
+    """
+    leaves = {}
+    for root, top_offset, top_little_endian, path, name, byte_offset, type_name, type_size, multiplicity, \
+            little_endian, enumeration in db_handle.execute(LAYOUT_QUERY, [MAX_LAYOUT_DEPTH]):
+        leaves.setdefault(root, []).append({'top_offset': top_offset, 'top_little_endian': top_little_endian,
+                                            'path': path, 'name': name, 'byte_offset': byte_offset,
+                                            'type_name': type_name, 'type_size': type_size,
+                                            'multiplicity': multiplicity, 'little_endian': little_endian,
+                                            'enumeration': bool(enumeration)})
+    return leaves
+
+
+def get_struct_format_string(leaves: list) -> str:
+    """
+    :param leaves: The leaves of the payload of a message.
+    :return: See log_parser.get_struct_format_string. Arrays of structures are unpacked once for every element.
+    """
+    if not leaves:
+        return ''
+
+    format_string = '<' if leaves[0]['top_little_endian'] == 1 else '>'
+    for leaf in leaves:
+        type_name = 'enum' if leaf['enumeration'] else leaf['type_name']
+        # Structures without fields, and types log_parser does not know, are left out, as they are by log_parser.
+        if type_name not in ccsds.symbol_to_struct_format_map:
+            continue
+
+        if leaf['multiplicity'] == 0:
+            format_string += ccsds.symbol_to_struct_format_map[type_name]
+        elif type_name == 'char':
+            format_string += str(leaf['multiplicity']) + 's'
+        else:
+            format_string += str(leaf['multiplicity']) + ccsds.symbol_to_struct_format_map[type_name]
+
+    return format_string
+
+
+def get_field_labels(leaves: list) -> list:
+    """
+    :param leaves: The leaves of the payload of a message.
+    :return: See log_parser.get_field_names_from_struct. Arrays of structures have labels for every element.
+    """
+    return [leaf['name'] for leaf in leaves if leaf['type_name'] in ccsds.symbol_to_struct_format_map]
+
+
+def compile_layout(leaves: list, symbol_id: int, symbol_name: str, byte_size: int, header_size: int,
+                   macro: str) -> dict:
+    """
+    :param leaves: The leaves of the symbol of the message; see get_leaves.
+    :param symbol_id:
+    :param symbol_name:
+    :param byte_size: The size of the symbol.
+    :param header_size: The fields of the message that start before this are its ccsds headers, which are left out.
+    :param macro:
+    :return:
+    """
+    leaves = [leaf for leaf in leaves if leaf['top_offset'] >= header_size]
+    return {'symbol_id': symbol_id,
+            'symbol_name': symbol_name,
+            'byte_size': byte_size,
+            'macro': macro,
+            'header_size': header_size,
+            'struct_string': get_struct_format_string(leaves),
+            'symbol_field_labels': get_field_labels(leaves),
+            'field_names': [leaf['path'] for leaf in leaves],
+            'field_offsets': [leaf['byte_offset'] for leaf in leaves],
+            'field_types': [leaf['type_name'] for leaf in leaves],
+            'field_sizes': [leaf['type_size'] for leaf in leaves],
+            'field_multiplicities': [leaf['multiplicity'] for leaf in leaves],
+            'field_little_endians': [leaf['little_endian'] for leaf in leaves],
+            'field_enumerations': [leaf['enumeration'] for leaf in leaves]}
+
+
+def compile_layouts(db_handle: sqlite_utils.Database) -> dict:
+    """
+    Compiles the layout of every telemetry and command message in the database, the way log_parser.parse_file and
+    ds_decoder decode them.
+    :param db_handle:
+    :return: A dict with a list of layouts for 'telemetry' and 'commands', and the size of every symbol by name under
+    'symbol_sizes'. Telemetry layouts have a 'message_id' and command layouts have a 'message_id' and a 'command_code'.
+    When there are several messages with the same key, only the first one is compiled since it is the one log_parser
+    finds.
+    """
+    leaves = get_leaves(db_handle)
+
+    symbols = {}
+    symbol_sizes = {}
+    for symbol_id, name, byte_size in db_handle.execute('SELECT id, name, byte_size FROM symbols ORDER BY rowid'):
+        symbols[symbol_id] = (name, byte_size)
+        # log_parser looks symbols up by name and takes the first one.
+        symbol_sizes.setdefault(name, byte_size)
+
+    telemetry = {}
+    for message_id, symbol_id, macro in db_handle.execute('SELECT message_id, symbol, macro FROM telemetry '
+                                                          'ORDER BY rowid'):
+        if message_id in telemetry:
+            continue
+        telemetry[message_id] = dict(compile_layout(leaves.get(symbol_id, []), symbol_id, *symbols[symbol_id],
+                                                    ccsds.get_header_size(message_id), macro),
+                                     message_id=message_id)
+
+    commands = {}
+    for message_id, command_code, symbol_id, macro in db_handle.execute('SELECT message_id, command_code, symbol, '
+                                                                        'macro FROM commands ORDER BY rowid'):
+        if (message_id, command_code) in commands:
+            continue
+        commands[(message_id, command_code)] = dict(compile_layout(leaves.get(symbol_id, []), symbol_id,
+                                                                   *symbols[symbol_id],
+                                                                   ccsds.get_header_size(message_id), macro),
+                                                    message_id=message_id, command_code=command_code)
+
+    return {'telemetry': list(telemetry.values()), 'commands': list(commands.values()), 'symbol_sizes': symbol_sizes}
+
+
+def get_cache_path(sqlite_path: str) -> str:
+    return sqlite_path + LAYOUT_CACHE_SUFFIX
+
+
+def save_layouts(layouts: dict, sqlite_path: str, fingerprint: str):
+    """
+    Saves layouts as the sidecar of the database at sqlite_path. The cache is written under another name first, so a
+    reader never sees a partially written cache.
+    """
+    cache_path = get_cache_path(sqlite_path)
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w') as cache_file:
+        json.dump({'format_version': LAYOUT_CACHE_FORMAT_VERSION, 'fingerprint': fingerprint, 'layouts': layouts},
+                  cache_file)
+    os.replace(temp_path, cache_path)
+
+
+def load_layouts(sqlite_path: str, fingerprint: str):
+    """
+    :return: The layouts in the sidecar of the database at sqlite_path. None if there is none, or it was compiled from
+    a database with another fingerprint.
+    """
+    cache_path = get_cache_path(sqlite_path)
+    if not os.path.isfile(cache_path):
+        return None
+
+    try:
+        with open(cache_path, 'r') as cache_file:
+            cache = json.load(cache_file)
+        if cache['format_version'] != LAYOUT_CACHE_FORMAT_VERSION or cache['fingerprint'] != fingerprint:
+            return None
+        return cache['layouts']
+    except (OSError, ValueError, KeyError, TypeError):
+        logging.warning(f'"{cache_path}" is not a valid layout cache. It will be rebuilt.')
+        return None
+
+
+def get_layouts(sqlite_path: str, rebuild: bool = False, hash_contents: bool = False) -> dict:
+    """
+    :param sqlite_path:
+    :param rebuild: Compile the layouts even if there is a valid cache.
+    :param hash_contents: See get_database_fingerprint.
+    :return: See compile_layouts. The layouts are loaded from the cache of the database if it has a valid one;
+    otherwise they are compiled and the cache is written.
+    """
+    fingerprint = get_database_fingerprint(sqlite_path, hash_contents)
+    if not rebuild:
+        layouts = load_layouts(sqlite_path, fingerprint)
+        if layouts is not None:
+            return layouts
+
+    layouts = compile_layouts(sqlite_utils.Database(sqlite_path))
+    try:
+        save_layouts(layouts, sqlite_path, fingerprint)
+    except OSError as error:
+        logging.warning(f'The layout cache of "{sqlite_path}" could not be written: {error}')
+
+    return layouts
@@ -4,56 +4,32 @@ application which is part of airliner. You can check it out at [1].
 [1]:https://github.com/WindhoverLabs/airliner/tree/develop/apps/ds/fsw/src
 """
 import argparse
+import mmap
 import sqlite_utils
 import yaml
-from struct import unpack, calcsize
+from struct import Struct, unpack_from, calcsize
 import csv
+from collections import OrderedDict
 from enum import Enum
 from pathlib import Path
 import os
 import logging
 
-
-class LengthSource(int, Enum):
-    DATABASE = 1
-    STREAM = 2
+import layout_cache
+# These used to live here; they are imported back so log_parser.symbol_to_struct_format_map and
+# log_parser.is_secondary_header_present keep working.
+from ccsds import symbol_to_struct_format_map, is_secondary_header_present
 
 
 """
-A mapping between intrinsic types in the database such as int, char, short, etc
-and the format strings specified on [1]. This mapping does NOT include strings. String handling does not rely on
-this mapping.
-[1]:https://docs.python.org/3/library/struct.html?highlight=struct#format-strings
+The number of csv files parse_file keeps open at the same time by default; see CsvWriterPool.
 """
-symbol_to_struct_format_map = \
-    {
-        'int': 'i',
-        'int8': 'b',  # Maps to the same thing as 'signed char' type
-        'char': 'c',
-        'int16': 'h',
-        'int32': 'i',
-        'enum': 'i',
-        'int64': 'l',
-        'uint8': 'B',
-        'uint16': 'H',
-        'uint32': 'I',
-        'uint64': 'Q',
-        'short': 'h',
-        'unsigned short': 'H',
-        'long': 'l',
-        'unsigned long': 'L',
-        'long long': 'q',
-        'unsigned long long': 'Q',
-        'double': 'd',
-        'bool': '?',
-        "boolean": '?',
-        'float': 'f',
-        'osalbool': 'B',
-        '_padding8': 'c',
-        '_padding16': '2c',
-        '_padding24': '3c',
-        '_padding32': '4c',  # NOTE: I think it might be best to generate these padding types from a function
-    }
+DEFAULT_MAX_OPEN_FILES = 64
+
+
+class LengthSource(int, Enum):
+    DATABASE = 1
+    STREAM = 2
 
 
 def is_enum(symbol_id: int, db_handle: sqlite_utils.Database):
@@ -95,7 +71,9 @@ def get_struct_format_string(symbol_id: int, header_size: int, db_handle: sqlite
 
         if type_name not in symbol_to_struct_format_map:
             child_symbol_id = list(db_handle['symbols'].rows_where('name=?', [type_name]))[0]['id']
-            format_string += get_struct_format_string(child_symbol_id, header_size, db_handle, depth + 1)
+            # Arrays of structures are unpacked once for every element, as they are by layout_cache.LAYOUT_QUERY.
+            format_string += get_struct_format_string(child_symbol_id, header_size, db_handle, depth + 1) * \
+                max(field['multiplicity'] or 0, 1)
 
         else:
             if field['multiplicity'] == 0:
@@ -138,20 +116,10 @@ def read_yaml(yaml_file: str) -> dict:
     return yaml_data
 
 
-def is_secondary_header_present(stream_id: int):
-    """
-    Checks if the secondary header is present. How this is checked is documented by 'ccsds.h'
-    on the airliner codebase at 'airliner/core/cfe/fsw/src/inc/ccsds.h'.
-    :param stream_id:
-    :return:
-    """
-    return stream_id >> 11 & 1 == 1
-
-
-def get_time(time_format: TimeFormat, bits: bin):
+def get_time(time_format: TimeFormat, bits: bin, offset: int = 0):
     # FIXME: Add support for other time formats
     if time_format == TimeFormat.CFE_SB_TIME_32_16_SUBS:
-        seconds, = unpack('I', bits[:4])
+        seconds, = unpack_from('I', bits, offset)
 
     return str(seconds)
 
@@ -233,39 +201,108 @@ def get_field_names_from_struct(symbol_id: int, header_size: int, db_handle: sql
             field_labels.append(record['name'])
         else:
             children_fields = get_field_names_from_struct(record['type'], header_size, db_handle, depth + 1)
-            field_labels += children_fields
+            field_labels += children_fields * max(record['multiplicity'] or 0, 1)
 
     return field_labels
 
 
-def write_telemetry_row_to_csv(message_macro: str, message_id: int, symbol_name: str, fields: list, filed_values: tuple,
-                               time_in_seconds: int):
-    file_name = message_macro + '.csv'
-    my_file = Path(file_name)
-    does_file_exist = (my_file.exists() and my_file.is_file())
+class CsvWriterPool:
+    def __init__(self, max_open_files: int = DEFAULT_MAX_OPEN_FILES):
+        """
+        Keeps the csv files rows are written to open, so a file is not opened and closed for every row. When
+        max_open_files files are open, the one that was written to least recently is closed to make room; it is opened
+        again if another row is written to it.
+        :param max_open_files:
+        """
+        self.max_open_files = max(max_open_files, 1)
+        self.__files = OrderedDict()
+        self.__seen = set()
+
+    def write_row(self, file_name: str, header: list, row: list):
+        """
+        Appends row to the csv file file_name. If the file did not exist before this pool first wrote to it, header is
+        written first.
+        :param file_name:
+        :param header:
+        :param row:
+        :return:
+        """
+        writer = self.__files.get(file_name)
+        if writer is None:
+            writer = self.__open(file_name, header)
+        else:
+            self.__files.move_to_end(file_name)
 
-    with open(file_name, 'a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
+        writer[1].writerow(row)
 
-        if does_file_exist is False:
-            writer.writerow(['message_id', 'time in seconds', 'symbol_name'] + fields)
+    def __open(self, file_name: str, header: list):
+        needs_header = False
+        if file_name not in self.__seen:
+            my_file = Path(file_name)
+            needs_header = not (my_file.exists() and my_file.is_file())
+            self.__seen.add(file_name)
 
-        writer.writerow([message_id, time_in_seconds, symbol_name] + list(filed_values))
+        while len(self.__files) >= self.max_open_files:
+            _, (csv_file, _) = self.__files.popitem(last=False)
+            csv_file.close()
 
+        csv_file = open(file_name, 'a', newline='')
+        writer = (csv_file, csv.writer(csv_file))
+        self.__files[file_name] = writer
 
-def write_command_row_to_csv(message_macro: str, command_code: int, message_id: int, symbol_name: str, fields: list,
-                             filed_values: tuple):
-    file_name = message_macro + '_CC_' + str(command_code) + '.csv'
-    my_file = Path(file_name)
-    does_file_exist = (my_file.exists() and my_file.is_file())
+        if needs_header:
+            writer[1].writerow(header)
 
-    with open(file_name, 'a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
+        return writer
 
-        if does_file_exist is False:
-            writer.writerow(['message_id', 'symbol_name'] + fields)
+    def get_open_files(self) -> list:
+        """
+        :return: The names of the files that are open, from the least to the most recently written to.
+        """
+        return list(self.__files.keys())
 
-        writer.writerow([message_id, symbol_name] + list(filed_values))
+    def close(self):
+        for csv_file, _ in self.__files.values():
+            csv_file.close()
+        self.__files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def write_telemetry_row_to_csv(message_macro: str, message_id: int, symbol_name: str, fields: list, filed_values: tuple,
+                               time_in_seconds: int, writers: CsvWriterPool = None):
+    """
+    :param writers: The pool the file is written through. If None, the file is opened and closed again.
+    """
+    file_name = message_macro + '.csv'
+    header = ['message_id', 'time in seconds', 'symbol_name'] + fields
+    row = [message_id, time_in_seconds, symbol_name] + list(filed_values)
+
+    if writers is None:
+        with CsvWriterPool(1) as writers:
+            writers.write_row(file_name, header, row)
+    else:
+        writers.write_row(file_name, header, row)
+
+
+def write_command_row_to_csv(message_macro: str, command_code: int, message_id: int, symbol_name: str, fields: list,
+                             filed_values: tuple, writers: CsvWriterPool = None):
+    """
+    :param writers: The pool the file is written through. If None, the file is opened and closed again.
+    """
+    file_name = message_macro + '_CC_' + str(command_code) + '.csv'
+    header = ['message_id', 'symbol_name'] + fields
+    row = [message_id, symbol_name] + list(filed_values)
+
+    if writers is None:
+        with CsvWriterPool(1) as writers:
+            writers.write_row(file_name, header, row)
+    else:
+        writers.write_row(file_name, header, row)
 
 
 def get_symbol_name(symbol_id: int, db_handle: sqlite_utils.Database):
@@ -322,10 +359,47 @@ def get_command_code(command_header: int):
 
 # FIXME: Cleanup code
 
+def get_symbol_maps(layouts: dict):
+    """
+    :param layouts: See layout_cache.compile_layouts.
+    :return: The telemetry and command symbol maps of parse_file, with an entry for every message in layouts.
+    """
+    telemetry_symbol_map = {}
+    for layout in layouts['telemetry']:
+        telemetry_symbol_map[layout['message_id']] = {'symvol_id': layout['symbol_id'],
+                                                      'struct_string': layout['struct_string'],
+                                                      'struct': Struct(layout['struct_string']),
+                                                      'symbol_field_labels': layout['symbol_field_labels'],
+                                                      'struct_size': calcsize(layout['struct_string']),
+                                                      'symbol_name': layout['symbol_name'],
+                                                      'message_macro': layout['macro']}
+
+    commands_symbol_map = {}
+    for layout in layouts['commands']:
+        commands_symbol_map[(layout['message_id'], layout['command_code'])] = \
+            {'symvol_id': layout['symbol_id'],
+             'struct_string': layout['struct_string'],
+             'struct': Struct(layout['struct_string']),
+             'symbol_field_labels': layout['symbol_field_labels'],
+             'struct_size': calcsize(layout['struct_string']),
+             'symbol_name': layout['symbol_name'],
+             'command_macro': layout['macro'],
+             'command_code': layout['command_code']}
+
+    return telemetry_symbol_map, commands_symbol_map
+
+
 def parse_file(file_path: str, sqlite_path: str, structures: [str], time_format: TimeFormat,
-               length_source: LengthSource):
+               length_source: LengthSource, max_open_files: int = DEFAULT_MAX_OPEN_FILES,
+               use_layout_cache: bool = True, hash_database: bool = False):
     """
     Parses the file at file_path, extracts all data from it and outputs it into a csv.
+    :param max_open_files: The number of csv files that are kept open at the same time; see CsvWriterPool.
+    :param use_layout_cache: Take the layouts of the messages from the layout cache of the database(see
+    layout_cache.py), which is written if it does not have a valid one yet, instead of querying the database for every
+    new message.
+    :param hash_database: Key the layout cache on a hash of the contents of the database instead of its size and
+    modification time; see layout_cache.get_database_fingerprint.
     :param length_source:
     :param file_path:
     :param sqlite_path:
@@ -335,139 +409,146 @@ def parse_file(file_path: str, sqlite_path: str, structures: [str], time_format:
     """
     db = sqlite_utils.Database(sqlite_path)
     file_size = os.path.getsize(file_path)
-    f = open(file_path, "rb")
-    bytes_buffer = f.read()
+
+    # These map work like a cache for our symbols so we don't have to have redundant queries that slow down our code
+    telemetry_symbol_map = {}
+    commands_symbol_map = {}
 
     file_header_size = 0
-    for structure in structures:
-        file_header_size += list(db['symbols'].rows_where('name=?', [structure]))[0]['byte_size']
+    if use_layout_cache:
+        layouts = layout_cache.get_layouts(sqlite_path, hash_contents=hash_database)
+        telemetry_symbol_map, commands_symbol_map = get_symbol_maps(layouts)
+        for structure in structures:
+            file_header_size += layouts['symbol_sizes'][structure]
+    else:
+        for structure in structures:
+            file_header_size += list(db['symbols'].rows_where('name=?', [structure]))[0]['byte_size']
 
-    message_data = bytes_buffer[file_header_size:]
+    # An empty file cannot be mapped.
+    if file_size <= file_header_size:
+        return
 
     current_message_index = 0
-    number_of_messages = len(message_data)
 
     struct_string = None
     struct_size = 0
     symbol_id = None
 
-    # These map work like a cache for our symbols so we don't have to have redundant queries that slow down our code
-    telemetry_symbol_map = {}
-    commands_symbol_map = {}
-
     symbol_field_labels = None
     time_in_seconds = 0
 
     ccsds_header_length = 0
 
-    while current_message_index < file_size - file_header_size:
-        # We assume that the primary header is always a ccsds primary header
-        primary_header = message_data[current_message_index: current_message_index + 6]
-        stream_id, sequence, length = unpack('!HHH', primary_header)
-
-        if get_packet_type(stream_id) == PacketType.TELEMETRY:
-            if message_id_exists(db, stream_id) is False:
-                logging.warning(f'Message id {stream_id} was not found in the database.'
-                                f'Aborting parser.')
-                return
-            ccsds_header_length = 6
-            if is_secondary_header_present(stream_id):
-                secondary_header = message_data[current_message_index + 6: current_message_index + 12]
-                ccsds_header_length = 12
-                time_in_seconds = get_time(time_format, secondary_header)
-
-            # Keep track of previous message ids to optimize; otherwise the script could take minutes to finish
-            if not (stream_id in telemetry_symbol_map):
-                symbol_id = get_symbol_id_from_message_id(stream_id, db)
-                symbol_name = get_symbol_name(symbol_id, db)
-                struct_string = get_struct_format_string(symbol_id, ccsds_header_length, db)
-                symbol_field_labels = get_field_names_from_struct(symbol_id, ccsds_header_length, db)
-                struct_size = calcsize(struct_string)
-                message_macro = get_telemetry_message_macro(stream_id, db)
-
-                # NOTE: Please note that symbol and struct are synonyms in this context; they mean the same thing.
-                telemetry_symbol_map.update({stream_id:
-                                                 {'symvol_id': symbol_id,
-                                                  'struct_string': struct_string,
-                                                  'symbol_field_labels': symbol_field_labels,
-                                                  'struct_size': struct_size,
-                                                  'symbol_name': symbol_name,
-                                                  'message_macro': message_macro}
-                                             })
-            # current_message_index += ccsds_header_length
-
-            write_telemetry_row_to_csv(telemetry_symbol_map[stream_id]['message_macro'], stream_id,
-                                       telemetry_symbol_map[stream_id]['symbol_name'],
-                                       telemetry_symbol_map[stream_id]['symbol_field_labels'],
-                                       unpack(telemetry_symbol_map[stream_id]['struct_string'],
-                                              message_data[
-                                              current_message_index + ccsds_header_length:current_message_index + ccsds_header_length +
-                                                                                          telemetry_symbol_map[
-                                                                                              stream_id][
-                                                                                              'struct_size']]),
-                                       time_in_seconds)
-
-            if length_source == LengthSource.STREAM:
-                current_message_index += length + 7
-
-            elif length_source == LengthSource.DATABASE:
-                current_message_index += ccsds_header_length + telemetry_symbol_map[stream_id]['struct_size']
-
-        elif get_packet_type(stream_id) == PacketType.COMMAND:
-            ccsds_header_length = 6
-            if is_secondary_header_present(stream_id):
-                command_secondary_header = message_data[current_message_index + 6: current_message_index + 8]
-                ccsds_header_length = 8
-                command, = unpack('!H', command_secondary_header)
-                command_code = get_command_code(command)
-
-                if message_id_and_command_code_exists(db, stream_id, command_code) is False:
-                    logging.warning(f'Message id {stream_id} with command_code {command_code} was not found in the '
-                                    f'database. '
+    # The file is mapped instead of read, so only the pages that are being parsed need to be in memory and files bigger
+    # than memory can be parsed. Messages are unpacked in place at their offset in the file instead of being sliced out.
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as bytes_buffer, \
+            CsvWriterPool(max_open_files) as writers:
+        while current_message_index < file_size - file_header_size:
+            message_offset = file_header_size + current_message_index
+
+            # We assume that the primary header is always a ccsds primary header
+            stream_id, sequence, length = unpack_from('!HHH', bytes_buffer, message_offset)
+
+            if get_packet_type(stream_id) == PacketType.TELEMETRY:
+                # With the layout cache, every message in the database is in the map already.
+                if (use_layout_cache and stream_id not in telemetry_symbol_map) or \
+                        (not use_layout_cache and message_id_exists(db, stream_id) is False):
+                    logging.warning(f'Message id {stream_id} was not found in the database.'
                                     f'Aborting parser.')
                     return
-
-                if not ((stream_id, command_code) in commands_symbol_map):
-                    symbol_id = get_symbol_id_from_message_id_and_command_code(stream_id, command_code, db)
+                ccsds_header_length = 6
+                if is_secondary_header_present(stream_id):
+                    ccsds_header_length = 12
+                    time_in_seconds = get_time(time_format, bytes_buffer, message_offset + 6)
+
+                # Keep track of previous message ids to optimize; otherwise the script could take minutes to finish
+                if not (stream_id in telemetry_symbol_map):
+                    symbol_id = get_symbol_id_from_message_id(stream_id, db)
                     symbol_name = get_symbol_name(symbol_id, db)
                     struct_string = get_struct_format_string(symbol_id, ccsds_header_length, db)
                     symbol_field_labels = get_field_names_from_struct(symbol_id, ccsds_header_length, db)
                     struct_size = calcsize(struct_string)
-                    command_macro = get_command_macro(stream_id, command_code, db)
+                    message_macro = get_telemetry_message_macro(stream_id, db)
 
                     # NOTE: Please note that symbol and struct are synonyms in this context; they mean the same thing.
-                    commands_symbol_map.update({(stream_id, command_code):
-                                                    {'symvol_id': symbol_id,
-                                                     'struct_string': struct_string,
-                                                     'symbol_field_labels': symbol_field_labels,
-                                                     'struct_size': struct_size,
-                                                     'symbol_name': symbol_name,
-                                                     'command_macro': command_macro,
-                                                     'command_code': command_code}
-                                                })
-
+                    telemetry_symbol_map.update({stream_id:
+                                                     {'symvol_id': symbol_id,
+                                                      'struct_string': struct_string,
+                                                      'struct': Struct(struct_string),
+                                                      'symbol_field_labels': symbol_field_labels,
+                                                      'struct_size': struct_size,
+                                                      'symbol_name': symbol_name,
+                                                      'message_macro': message_macro}
+                                                 })
                 # current_message_index += ccsds_header_length
 
-            write_command_row_to_csv(commands_symbol_map[(stream_id, command_code)]['command_macro'], command_code,
-                                     stream_id,
-                                     commands_symbol_map[(stream_id, command_code)]['symbol_name'],
-                                     commands_symbol_map[(stream_id, command_code)]['symbol_field_labels'],
-                                     unpack(commands_symbol_map[(stream_id, command_code)]['struct_string'],
-                                            message_data[
-                                            current_message_index + ccsds_header_length:current_message_index + ccsds_header_length +
-                                                                                        commands_symbol_map[
-                                                                                            (stream_id, command_code)][
-                                                                                            'struct_size']]))
-            if length_source == LengthSource.STREAM:
-                current_message_index += length + 7
-
-            elif length_source == LengthSource.DATABASE:
-                current_message_index += ccsds_header_length + commands_symbol_map[(stream_id, command_code)][
-                    'struct_size']
-        else:
-            logging.warning(f"Unknown packet type."
-                            f"Aborting parser.")
-            return
+                write_telemetry_row_to_csv(telemetry_symbol_map[stream_id]['message_macro'], stream_id,
+                                           telemetry_symbol_map[stream_id]['symbol_name'],
+                                           telemetry_symbol_map[stream_id]['symbol_field_labels'],
+                                           telemetry_symbol_map[stream_id]['struct'].unpack_from(
+                                               bytes_buffer, message_offset + ccsds_header_length),
+                                           time_in_seconds, writers)
+
+                if length_source == LengthSource.STREAM:
+                    current_message_index += length + 7
+
+                elif length_source == LengthSource.DATABASE:
+                    current_message_index += ccsds_header_length + telemetry_symbol_map[stream_id]['struct_size']
+
+            elif get_packet_type(stream_id) == PacketType.COMMAND:
+                ccsds_header_length = 6
+                if is_secondary_header_present(stream_id):
+                    ccsds_header_length = 8
+                    command, = unpack_from('!H', bytes_buffer, message_offset + 6)
+                    command_code = get_command_code(command)
+
+                    if (use_layout_cache and (stream_id, command_code) not in commands_symbol_map) or \
+                            (not use_layout_cache and
+                             message_id_and_command_code_exists(db, stream_id, command_code) is False):
+                        logging.warning(f'Message id {stream_id} with command_code {command_code} was not found in the '
+                                        f'database. '
+                                        f'Aborting parser.')
+                        return
+
+                    if not ((stream_id, command_code) in commands_symbol_map):
+                        symbol_id = get_symbol_id_from_message_id_and_command_code(stream_id, command_code, db)
+                        symbol_name = get_symbol_name(symbol_id, db)
+                        struct_string = get_struct_format_string(symbol_id, ccsds_header_length, db)
+                        symbol_field_labels = get_field_names_from_struct(symbol_id, ccsds_header_length, db)
+                        struct_size = calcsize(struct_string)
+                        command_macro = get_command_macro(stream_id, command_code, db)
+
+                        # NOTE: Please note that symbol and struct are synonyms in this context; they mean the same thing.
+                        commands_symbol_map.update({(stream_id, command_code):
+                                                        {'symvol_id': symbol_id,
+                                                         'struct_string': struct_string,
+                                                         'struct': Struct(struct_string),
+                                                         'symbol_field_labels': symbol_field_labels,
+                                                         'struct_size': struct_size,
+                                                         'symbol_name': symbol_name,
+                                                         'command_macro': command_macro,
+                                                         'command_code': command_code}
+                                                    })
+
+                    # current_message_index += ccsds_header_length
+
+                write_command_row_to_csv(commands_symbol_map[(stream_id, command_code)]['command_macro'], command_code,
+                                         stream_id,
+                                         commands_symbol_map[(stream_id, command_code)]['symbol_name'],
+                                         commands_symbol_map[(stream_id, command_code)]['symbol_field_labels'],
+                                         commands_symbol_map[(stream_id, command_code)]['struct'].unpack_from(
+                                             bytes_buffer, message_offset + ccsds_header_length),
+                                         writers)
+                if length_source == LengthSource.STREAM:
+                    current_message_index += length + 7
+
+                elif length_source == LengthSource.DATABASE:
+                    current_message_index += ccsds_header_length + commands_symbol_map[(stream_id, command_code)][
+                        'struct_size']
+            else:
+                logging.warning(f"Unknown packet type."
+                                f"Aborting parser.")
+                return
 
 
 str_to_time_enum = \
@@ -504,6 +585,17 @@ def parse_cli() -> argparse.Namespace:
                              'This length is used as an offset to move to the next message in the stream.'
                              'Use 1 for database. 2 for the length inside the input file.')
 
+    parser.add_argument('--max_open_files', type=int, default=DEFAULT_MAX_OPEN_FILES,
+                        help='The number of csv files that are kept open at the same time.')
+
+    parser.add_argument('--no_layout_cache', action='store_true',
+                        help='Query the database for the layout of every message instead of using the layout cache '
+                             'that is kept next to the database.')
+
+    parser.add_argument('--hash_database', action='store_true',
+                        help='Key the layout cache on a hash of the contents of the database instead of its size and '
+                             'modification time.')
+
     return parser.parse_args()
 
 
@@ -512,7 +604,8 @@ def main():
 
     yaml_structs = read_yaml(args.structures_yaml)
     parse_file(args.input_file, args.sqlite_path, get_structure_names(yaml_structs), str_to_time_enum[args.time_format],
-               LengthSource(args.message_length_source))
+               LengthSource(args.message_length_source), args.max_open_files, not args.no_layout_cache,
+               args.hash_database)
 
 
 if __name__ == '__main__':
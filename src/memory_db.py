@@ -0,0 +1,79 @@
+"""
+Helpers to build a database in memory and write it to disk in one go. Loading the database into ":memory:" lets every
+stage run against a single connection without paying for a sync to disk on every commit. When the database is written
+back to disk, it is written to a temporary file next to the output first and then renamed over the output, so readers
+never see a half-written database.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+
+
+def copy_database(source: sqlite3.Connection, destination: sqlite3.Connection):
+    """
+    Copies the entire contents of source into destination with the SQLite backup API.
+    :param source:
+    :param destination:
+    :return:
+    """
+    if hasattr(source, 'backup'):
+        source.backup(destination)
+    else:
+        # The backup API is only available on python 3.7 and newer.
+        destination.executescript('\n'.join(source.iterdump()))
+
+
+def load_into_memory(database_path: str) -> sqlite3.Connection:
+    """
+    :param database_path: The path to the database on disk.
+    :return: A connection to an in-memory copy of the database at database_path.
+    """
+    logging.info(f'Loading "{database_path}" into memory...')
+    db_handle = sqlite3.connect(':memory:')
+    disk_handle = sqlite3.connect(database_path)
+    try:
+        copy_database(disk_handle, db_handle)
+    finally:
+        disk_handle.close()
+
+    return db_handle
+
+
+def write_to_temp_file(db_handle: sqlite3.Connection, output_path: str) -> str:
+    """
+    Writes the database behind db_handle to a temporary file in the same directory as output_path. Use os.replace to
+    move the temporary file over output_path once it is ready to be seen by readers.
+    :param db_handle:
+    :param output_path:
+    :return: The path to the temporary file.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=output_dir, prefix=os.path.basename(output_path) + '.',
+                                                  suffix='.tmp')
+    os.close(file_descriptor)
+
+    try:
+        db_handle.commit()
+        disk_handle = sqlite3.connect(temp_path)
+        try:
+            copy_database(db_handle, disk_handle)
+        finally:
+            disk_handle.close()
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return temp_path
+
+
+def write_atomically(db_handle: sqlite3.Connection, output_path: str):
+    """
+    Writes the database behind db_handle to output_path. Readers of output_path see either the old file or the new
+    one, never anything in between.
+    :param db_handle:
+    :param output_path:
+    :return:
+    """
+    os.replace(write_to_temp_file(db_handle, output_path), output_path)
+    logging.info(f'Database has been written to "{output_path}".')
@@ -1,3 +1,5 @@
+import itertools
+import json
 import sqlite3
 
 import sqlite_utils
@@ -6,6 +8,11 @@ import sys
 import logging
 import yaml
 
+"""
+The number of rows that are inserted together when the records are streamed; see write_records_to_database.
+"""
+DEFAULT_BATCH_SIZE = 10000
+
 
 def parse_cli() -> argparse.Namespace:
     """
@@ -20,6 +27,13 @@ def parse_cli() -> argparse.Namespace:
     parser.add_argument('--sqlite_path', type=str, required=True,
                         help=' The path to the sqlite database.')
 
+    parser.add_argument('--stream', action='store_true',
+                        help='Read the yaml file one record at a time instead of all at once. Files that end in '
+                             '.jsonl are always read this way.')
+
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='The number of records that are written together when streaming.')
+
     return parser.parse_args()
 
 
@@ -29,78 +43,225 @@ def read_yaml(yaml_file: str) -> dict:
     return yaml_data
 
 
+def iter_yaml_records(yaml_file: str):
+    """
+    Reads yaml_file one record at a time with the event-based parser, so the whole file is never in memory. The file has
+    the same layout as the one read_yaml reads: a mapping of table names to sequences of records.
+    :param yaml_file:
+    :return: A generator of (table, record) tuples, in the order they appear in yaml_file.
+    """
+    with open(yaml_file, 'r') as stream:
+        loader = yaml.FullLoader(stream)
+        try:
+            loader.get_event()  # StreamStartEvent
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()  # DocumentStartEvent
+            if not loader.check_event(yaml.MappingStartEvent):
+                raise ValueError(f'"{yaml_file}" must be a mapping of table names to sequences of records.')
+            loader.get_event()
+
+            while not loader.check_event(yaml.MappingEndEvent):
+                table = loader.construct_document(loader.compose_node(None, None))
+                if loader.check_event(yaml.SequenceStartEvent):
+                    loader.get_event()
+                    while not loader.check_event(yaml.SequenceEndEvent):
+                        yield table, loader.construct_document(loader.compose_node(None, None))
+                    loader.get_event()
+                elif loader.construct_document(loader.compose_node(None, None)) is not None:
+                    raise ValueError(f'The table "{table}" in "{yaml_file}" must be a sequence of records.')
+        finally:
+            loader.dispose()
+
+
+def iter_jsonl_records(jsonl_file: str):
+    """
+    Reads a JSON Lines file one record at a time. Every line has the form {"table": "symbols", "row": {...}}; blank lines
+    are skipped.
+    :param jsonl_file:
+    :return: A generator of (table, record) tuples, in the order they appear in jsonl_file.
+    """
+    with open(jsonl_file, 'r') as stream:
+        for line in stream:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry['table'], entry['row']
+
+
+def iter_dict_records(data_dict: dict):
+    for table in data_dict:
+        for record in data_dict[table] or []:
+            yield table, record
+
+
+"""
+The columns of every table that refer to a record of another table by its name, and the table they refer to.
+"""
+FOREIGN_KEYS = {
+    'elfs': {},
+    'symbols': {'elf': 'elfs'},
+    'fields': {'symbol': 'symbols', 'type': 'symbols'},
+    'telemetry': {'symbol': 'symbols', 'module': 'modules'},
+    'commands': {'symbol': 'symbols', 'module': 'modules'},
+    'enumerations': {'symbol': 'symbols'},
+    'events': {'module': 'modules'},
+    'configurations': {'module': 'modules'},
+    'performance': {'module': 'modules'},
+}
+
+
+class NameIndex:
+    def __init__(self, db_handle: sqlite_utils.Database):
+        """
+        The ids of the records of the tables foreign keys refer to, keyed by their names. The ids of a table are loaded
+        the first time they are needed and kept up to date as records are inserted into it; see update.
+        :param db_handle:
+        """
+        self.db_handle = db_handle
+        self.ids = {}
+
+    def get_ids(self, table: str) -> dict:
+        if table not in self.ids:
+            self.ids[table] = {}
+            if self.db_handle[table].exists():
+                self.ids[table] = {name: record_id for record_id, name in
+                                   self.db_handle.execute(f'SELECT id, name FROM {table}')}
+        return self.ids[table]
+
+    def update(self, table: str):
+        """
+        Adds the records that were inserted into table since its ids were loaded.
+        """
+        if table not in self.ids:
+            return
+        ids = self.ids[table]
+        last_id = max(ids.values(), default=0)
+        ids.update({name: record_id for record_id, name in
+                    self.db_handle.execute(f'SELECT id, name FROM {table} WHERE id > ?', [last_id])})
+
+
+def resolve_rows(table: str, rows: list, names: NameIndex, unresolved: list) -> list:
+    """
+    Replaces the names foreign keys refer to with their ids.
+    :param table:
+    :param rows: The rows of table as they are in the yaml file. They are not modified.
+    :param names:
+    :param unresolved: Every name that does not exist is appended to this list.
+    :return: The rows of table whose foreign keys were all resolved.
+    """
+    resolved_rows = []
+    for row in rows:
+        resolved_row = dict(row)
+        for column, foreign_table in FOREIGN_KEYS[table].items():
+            record_id = names.get_ids(foreign_table).get(row.get(column))
+            if record_id is None:
+                unresolved.append(f'{table}.{column}: "{row.get(column)}" does not exist in {foreign_table}')
+                resolved_row = None
+                break
+            resolved_row[column] = record_id
+
+        if resolved_row is not None:
+            resolved_rows.append(resolved_row)
+
+    return resolved_rows
+
+
+def insert_rows(db_handle: sqlite_utils.Database, table: str, rows: list):
+    """
+    Inserts rows into table, skipping those that already exist. Rows that have the same columns are inserted together.
+    """
+    if not rows:
+        return
+
+    if not db_handle[table].exists():
+        db_handle[table].create({column: type(value) for column, value in rows[0].items()})
+
+    rows_by_columns = {}
+    for row in rows:
+        rows_by_columns.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+
+    for columns, values in rows_by_columns.items():
+        column_names = ', '.join(f'[{column}]' for column in columns)
+        placeholders = ', '.join('?' * len(columns))
+        db_handle.conn.executemany(f'INSERT OR IGNORE INTO [{table}] ({column_names}) VALUES ({placeholders})', values)
+
+
+def write_records_to_database(records, db_handle: sqlite_utils.Database, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Writes records to database following the schema specified on [1].
+    Consecutive records of the same table are inserted together, batch_size at a time, and all of them are written in
+    one transaction. Records are written in the order they come, so a record can refer to records that come before it.
+    If any name a foreign key refers to does not exist, nothing is written and a ValueError that lists all of them is
+    raised.
+    :param records: An iterable of (table, record) tuples. It is consumed one batch at a time.
+    :param db_handle:
+    :param batch_size:
+    :return:
+    [1]:https://github.com/WindhoverLabs/juicer/tree/develop
+    """
+    names = NameIndex(db_handle)
+    unresolved = []
+    unsupported_tables = set()
+
+    with db_handle.conn:
+        for table, table_records in itertools.groupby(records, key=lambda record: record[0]):
+            if table not in FOREIGN_KEYS:
+                if table not in unsupported_tables:
+                    logging.warning(f'The table "{table}" is not supported. Its records will not be written.')
+                    unsupported_tables.add(table)
+                continue
+
+            while True:
+                batch = [record for _, record in itertools.islice(table_records, batch_size)]
+                if not batch:
+                    break
+                rows = resolve_rows(table, batch, names, unresolved)
+                insert_rows(db_handle, table, rows)
+                names.update(table)
+
+        if unresolved:
+            raise ValueError('Some of the records refer to names that do not exist:\n' + '\n'.join(unresolved))
+
+
 def write_dict_to_database(data_dict: dict, db_handle: sqlite_utils.Database):
     """
-    Writes data_dict to database following the schema specified on [1].
+    Writes data_dict to database following the schema specified on [1]. See write_records_to_database.
+    Tables are written in the order they appear in data_dict, so a table can refer to records that an earlier table
+    adds.
     :return:
     [1]:https://github.com/WindhoverLabs/juicer/tree/develop
     """
-    for table in data_dict:
-        for data in data_dict[table]:
-            if table == 'symbols':
-                elf_key = list(db_handle['elfs'].rows_where("name =?", [data['elf']]))[0]['id']
-                data['elf'] = elf_key
-                db_handle['symbols'].insert(data, ignore=True)
-
-            elif table == 'fields':
-                type_key = list(db_handle['symbols'].rows_where("name =?", [data['type']]))[0]['id']
-                symbol_key = list(db_handle['symbols'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['type'] = type_key
-                data['symbol'] = symbol_key
-                db_handle['fields'].insert(data, ignore=True)
-
-            elif table == 'telemetry':
-                module_key = list(db_handle['modules'].rows_where("name =?", [data['module']]))[0]['id']
-                symbol_key = list(db_handle['symbols'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['module'] = module_key
-                data['symbol'] = symbol_key
-                db_handle['telemetry'].insert(data, ignore=True)
-
-            elif table == 'commands':
-                module_key = list(db_handle['modules'].rows_where("name =?", [data['module']]))[0]['id']
-                symbol_key = list(db_handle['symbols'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['module'] = module_key
-                data['symbol'] = symbol_key
-                db_handle['commands'].insert(data, ignore=True)
-
-            elif table == 'elfs':
-                db_handle['elfs'].insert(data, ignore=True)
-
-            elif table == 'enumerations':
-                symbol_key = list(db_handle['symbols'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['symbol'] = symbol_key
-                db_handle['enumerations'].insert(data, ignore=True)
-
-            elif table == 'events':
-                module_key = list(db_handle['modules'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['module'] = module_key
-                db_handle['events'].insert(data, ignore=True)
-
-            elif table == 'configurations':
-                module_key = list(db_handle['modules'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['module'] = module_key
-                db_handle['configurations'].insert(data, ignore=True)
-
-            elif table == 'performance':
-                module_key = list(db_handle['modules'].rows_where("name =?", [data['symbol']]))[0]['id']
-                data['module'] = module_key
-                db_handle['performance'].insert(data, ignore=True)
-
-
-def mod_sql(sqlite_path: str, yaml_path: str):
+    write_records_to_database(iter_dict_records(data_dict), db_handle, batch_size=sys.maxsize)
+
+
+def mod_sql(sqlite_path: str, yaml_path: str, stream: bool = False, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Writes the records in yaml_path to the database at sqlite_path.
+    :param sqlite_path:
+    :param yaml_path: A yaml file, or a JSON Lines file if it ends in .jsonl(see iter_jsonl_records).
+    :param stream: Read yaml_path one record at a time and write the records in batches of batch_size, so memory use
+    does not depend on the size of yaml_path. JSON Lines files are always streamed.
+    :param batch_size:
+    :return:
+    """
     db = sqlite_utils.Database(sqlite_path)
 
-    yaml_dict = read_yaml(yaml_path)
+    if yaml_path.endswith('.jsonl'):
+        write_records_to_database(iter_jsonl_records(yaml_path), db, batch_size)
+    elif stream:
+        write_records_to_database(iter_yaml_records(yaml_path), db, batch_size)
+    else:
+        yaml_dict = read_yaml(yaml_path)
 
-    write_dict_to_database(yaml_dict, db)
+        write_dict_to_database(yaml_dict, db)
 
 
 def main():
     logging.getLogger().setLevel(logging.DEBUG)
 
-    args = parse_cli(sys.argv)
+    args = parse_cli()
 
-    mod_sql(args.sqlite_path, args.yaml_path)
+    mod_sql(args.sqlite_path, args.yaml_path, args.stream, args.batch_size)
 
     logging.info('DONE.')
 
@@ -5,230 +5,340 @@ for enumerations that are represented as MACROS in code.
 """
 
 import argparse
+import hashlib
+import json
 import logging
 from typing import Union
-from random import randint
 import yaml
 import sqlite_utils
 import os.path
 
 
-def generate_random_name(name_length: int):
-    """
-    Generates a random string that has name_length amount of characters in it.
-    :param name_length:
-    :return: Randomly generated string.
-    The characters generated are chosen randomly between 65 and 90 ASCII characters; meaning upper case letters A-Z.
-    """
-    str_characters = []
-    for name_character in range(name_length):
-        # Add a random character to our list
-        str_characters.append(chr(randint(65, 90)))
-    return "".join(str_characters)
+"""
+The prefix of the names of the types that enumeration overrides add.
+"""
+ENUMERATION_TYPE_PREFIX = 'ENUM_'
 
 
-def symbol_exists(symbol_name: str, db_handle: sqlite_utils.Database):
+def get_enumeration_type_name(byte_size: int, enum_map: dict) -> str:
+    """
+    :param byte_size:
+    :param enum_map: A dictionary of the form {ENUM_NAME:VALUE}.
+    :return: The name of the type of an enumeration of byte_size bytes with the names and values in enum_map. It is
+    derived from a hash of both, so identical enumerations share a type and the name is the same on every build.
+    """
+    enum_hash = hashlib.sha256(json.dumps([byte_size, sorted(enum_map.items())]).encode())
+    return ENUMERATION_TYPE_PREFIX + enum_hash.hexdigest()[:16].upper()
+
+
+class DatabaseIndex:
+    def __init__(self, db_handle: sqlite_utils.Database, parent_symbols: list = None):
+        """
+        An in-memory index of the records overrides look up. Neither the symbols table nor the fields table is indexed
+        by name, so looking records up through the index instead of the database saves a table scan per lookup. The
+        index must be kept up to date as overrides add symbols and change fields; see add_symbol and set_field.
+
+        The index also collects the changes overrides make instead of writing them one at a time; apply writes all of
+        them in one transaction. Symbols that have not been written yet have negative ids.
+        :param db_handle:
+        :param parent_symbols: The names of the symbols whose fields are indexed. Every field is indexed if None.
+        """
+        self.db_handle = db_handle
+        self.elf_ids = {record['name']: record['id'] for record in db_handle['elfs'].rows}
+        self.symbols = {}
+        self.symbols_by_id = {}
+        self.fields = {}
+
+        self.new_symbols = []
+        self.new_enumerations = []
+        self.field_types = {}
+        self.original_field_types = {}
+
+        for symbol_record in db_handle['symbols'].rows:
+            self.add_symbol(symbol_record)
+
+        parent_ids = None
+        if parent_symbols is not None:
+            parent_ids = {self.symbols[name]['id'] for name in parent_symbols if name in self.symbols}
+
+        # One scan of the fields table, however many parents there are.
+        for field_record in db_handle['fields'].rows:
+            if parent_ids is None or field_record['symbol'] in parent_ids:
+                self.set_field(field_record)
+
+    def add_symbol(self, symbol_record: dict):
+        self.symbols[symbol_record['name']] = symbol_record
+        self.symbols_by_id[symbol_record['id']] = symbol_record
+
+    def set_field(self, field_record: dict):
+        self.fields[(field_record['symbol'], field_record['name'])] = field_record
+
+    def get_symbol(self, symbol_name: str) -> Union[dict, None]:
+        return self.symbols.get(symbol_name)
+
+    def get_field(self, symbol_name: str, field_name: str) -> Union[dict, None]:
+        symbol_record = self.get_symbol(symbol_name)
+        if symbol_record is None:
+            return None
+        return self.fields.get((symbol_record['id'], field_name))
+
+    def insert_symbol(self, symbol_record: dict):
+        """
+        Adds symbol_record to the index with a provisional id and queues it to be written by apply.
+        :param symbol_record: A symbol record without an id.
+        """
+        symbol_record['id'] = -(len(self.new_symbols) + 1)
+        self.new_symbols.append(symbol_record)
+        self.add_symbol(symbol_record)
+
+    def insert_enumeration(self, symbol_id: int, enum_map: dict):
+        """
+        Queues the enumeration records of enum_map, which belong to the symbol symbol_id, to be written by apply.
+        """
+        self.new_enumerations.append((symbol_id, enum_map))
+
+    def update_field_type(self, field_record: dict, type_id: int):
+        """
+        Changes the type of field_record to type_id in the index and queues the change to be written by apply.
+        """
+        self.original_field_types.setdefault(field_record['id'], field_record['type'])
+        field_record['type'] = type_id
+        self.field_types[field_record['id']] = type_id
+        self.set_field(field_record)
+
+    def has_changes(self) -> bool:
+        return bool(self.new_symbols or self.new_enumerations or self.field_types)
+
+    def describe(self) -> list:
+        """
+        :return: A line that describes every change that apply would write.
+        """
+        fields_by_id = {field_record['id']: field_record for field_record in self.fields.values()}
+        changes = []
+
+        for symbol_record in self.new_symbols:
+            changes.append(f'Add symbol "{symbol_record["name"]}"(byte_size={symbol_record["byte_size"]})')
+
+        for symbol_id, enum_map in self.new_enumerations:
+            changes.append(f'Add enumeration {dict(enum_map)} to symbol "{self.symbols_by_id[symbol_id]["name"]}"')
+
+        for field_id, type_id in self.field_types.items():
+            field_record = fields_by_id[field_id]
+            parent_name = self.symbols_by_id[field_record['symbol']]['name']
+            old_type = self.symbols_by_id.get(self.original_field_types[field_id], {}).get('name')
+            changes.append(f'Change type of "{parent_name}.{field_record["name"]}" from "{old_type}" to '
+                           f'"{self.symbols_by_id[type_id]["name"]}"')
+
+        return changes
+
+    def apply(self):
+        """
+        Writes every queued change to the database in one transaction; if any write fails, none of them are kept.
+        Fields are changed in place, so their ids do not change.
+        """
+        if not self.has_changes():
+            return
+
+        conn = self.db_handle.conn
+        symbol_ids = {}
+        with conn:
+            for symbol_record in self.new_symbols:
+                cursor = conn.execute('INSERT INTO symbols(elf, name, byte_size) VALUES (?, ?, ?)',
+                                      (symbol_record['elf'], symbol_record['name'], symbol_record['byte_size']))
+                symbol_ids[symbol_record['id']] = cursor.lastrowid
+
+            for symbol_id, enum_map in self.new_enumerations:
+                symbol_id = symbol_ids.get(symbol_id, symbol_id)
+                conn.executemany('INSERT INTO enumerations(symbol, value, name) VALUES (?, ?, ?)',
+                                 [(symbol_id, value, name) for name, value in enum_map.items()])
+
+            conn.executemany('UPDATE fields SET type = ? WHERE id = ?',
+                             [(symbol_ids.get(type_id, type_id), field_id)
+                              for field_id, type_id in self.field_types.items()])
+
+        # Replace the provisional ids now that the symbols have been written.
+        for symbol_record in self.new_symbols:
+            del self.symbols_by_id[symbol_record['id']]
+            symbol_record['id'] = symbol_ids[symbol_record['id']]
+            self.symbols_by_id[symbol_record['id']] = symbol_record
+        for field_record in self.fields.values():
+            field_record['type'] = symbol_ids.get(field_record['type'], field_record['type'])
+
+        self.new_symbols = []
+        self.new_enumerations = []
+        self.field_types = {}
+        self.original_field_types = {}
+
+
+def symbol_exists(symbol_name: str, index: DatabaseIndex):
     """
     Checks if the symbol record with name symbol_name exists in the database.
     :param symbol_name:
-    :param db_handle:
+    :param index:
     :return: True if symbol exists, False otherwise.
     """
-    does_symbol_exists = True
-    symbol_record = list(db_handle['symbols'].rows_where('name=?', [symbol_name]))
-
-    if len(symbol_record) == 0:
-        does_symbol_exists = False
+    return index.get_symbol(symbol_name) is not None
 
-    return does_symbol_exists
 
-def field_exists(symbol_name: str, field_name: str, db_handle: sqlite_utils.Database):
+def field_exists(symbol_name: str, field_name: str, index: DatabaseIndex):
     """
-    Checks if the symbol record with name symbol_name exists in the database.
+    Checks if the field record with name field_name that is part of the symbol symbol_name exists in the database.
     :param symbol_name:
-    :param db_handle:
-    :return: True if symbol exists, False otherwise.
+    :param field_name:
+    :param index:
+    :return: True if field exists, False otherwise.
     """
-    does_field_exists = False
-    symbol_record = list(db_handle['symbols'].rows_where('name=?', [symbol_name]))
-    if len(symbol_record) == 0:
-        does_field_exists = False
-        return does_field_exists
-
-    field_record = list(db_handle['fields'].rows_where('symbol=? and name=?', [symbol_record[0]['id'], field_name]))
-
-    if len(field_record) == 0:
-        does_field_exists = False
-
-    return does_field_exists
-
+    return index.get_field(symbol_name, field_name) is not None
 
 
 def add_type_to_database(type_name: str, elf_name: str, byte_size: int,
-                         db_handle: sqlite_utils.Database) -> Union[dict, None]:
+                         index: DatabaseIndex) -> Union[dict, None]:
     """
     Adds a new type with the name of type_name size of byte_size and mapped to the elf with name of elf_name. It is
     assumed that the type does NOT exist in the database.
     :param type_name: The nam of the new type.
     :param elf_name: The name of the elf file in the database.
     :param byte_size: The size of the new type. Must be a number greater than zero.
-    :param db_handle: The database handle which will be used to write record to database.
+    :param index: The index of the database which will be used to write record to database.
     :return: None if the elf record with name of elf_name does not exist. Otherwise a dict is returned representing
-    the new symbol record that was written to the database.
+    the new symbol record that will be written to the database by index.apply.
     """
     new_type_record = {}
-    elf_key = list(db_handle['elfs'].rows_where('name=?', [os.path.realpath(elf_name)]))
-    if len(elf_key) < 1:
+    elf_key = index.elf_ids.get(os.path.realpath(elf_name))
+    if elf_key is None:
         logging.error(f"The elf record with name of {elf_name} was not found on the database")
         return None
-    new_type_record['elf'] = elf_key[0]['id']
+    new_type_record['elf'] = elf_key
     new_type_record['name'] = type_name
     new_type_record['byte_size'] = byte_size
 
-    last_row_id = db_handle['symbols'].insert(new_type_record).last_rowid
-
-    new_type_record['id'] = last_row_id
+    index.insert_symbol(new_type_record)
 
     return new_type_record
 
 
-def add_random_type_to_database(elf_name: str, byte_size: int, db_handle: sqlite_utils.Database) -> Union[dict, None]:
+def add_enumeration_type_to_database(elf_name: str, byte_size: int, enum_map: dict,
+                                     index: DatabaseIndex) -> Union[dict, None]:
     """
-    Adds a new type to the symbols table with a random name.
-    This function ensures that the new type does not exist in the database.
+    Adds the type of the enumeration enum_map to the symbols table along with its enumeration records, unless an
+    identical enumeration was added before(see get_enumeration_type_name); that type is reused then.
     :param elf_name:
     :param byte_size:
-    :param db_handle:
-    :return: Returns the new symbol record that was added to the database. If the elf record with name of elf_name
-    does not exist, then None is returned.
+    :param enum_map: A dictionary of the form {ENUM_NAME:VALUE}.
+    :param index:
+    :return: Returns the symbol record of the type. If the elf record with name of elf_name does not exist, then None is
+    returned.
     """
-    new_type_record = {}
-    elf_key = list(db_handle['elfs'].rows_where('name=?', [os.path.realpath(elf_name)]))
-    if len(elf_key) < 1:
-        logging.error(f"The elf record with name of {elf_name} was not found on the database.")
-        return None
-
-    new_type_record['elf'] = elf_key[0]['id']
-    random_type_name = generate_random_name(5)
-    while symbol_exists(random_type_name, db_handle):
-        random_type_name = generate_random_name(5)
+    type_name = get_enumeration_type_name(byte_size, enum_map)
+    if symbol_exists(type_name, index):
+        return index.get_symbol(type_name)
 
-    new_type_record['name'] = random_type_name
-    new_type_record['byte_size'] = byte_size
-
-    last_row_id = db_handle['symbols'].insert(new_type_record).last_rowid
+    new_type_record = add_type_to_database(type_name, elf_name, byte_size, index)
+    if new_type_record is None:
+        return None
 
-    new_type_record['id'] = last_row_id
+    if add_enumeration_to_data_base(type_name, enum_map, index) is None:
+        return None
 
     return new_type_record
 
 
-def add_enumeration_to_data_base(symbol_name: str, enum_map: dict, db_handle: sqlite_utils.Database) -> Union[
+def add_enumeration_to_data_base(symbol_name: str, enum_map: dict, index: DatabaseIndex) -> Union[
     dict, None]:
     """
     Adds new enumeration records to database.
     :param symbol_name: A foreign key to a symbol record in the symbols table.
     :param enum_map: A dictionary of the form {ENUM_NAME:VALUE} that represents all of the names and values that
     are part of this enumeration.
-    :param db_handle:
-    :return: The last enumeration record that was inserted if the records were added successfully. None is returned if the symbol
-    with name of symbol_name does not exist.
+    :param index:
+    :return: The last enumeration record that will be inserted if the records were added successfully. None is returned
+    if the symbol with name of symbol_name does not exist.
     """
-    if symbol_exists(symbol_name, db_handle) is False:
+    if symbol_exists(symbol_name, index) is False:
         logging.error(f'The symbol record with name of {symbol_name} does not exist.')
         return None
 
     enumeration_record = {}
 
-    enumeration_record['symbol'] = list(db_handle['symbols'].rows_where('name=?', [symbol_name]))[0]['id']
-
-    last_row_id = None
+    enumeration_record['symbol'] = index.get_symbol(symbol_name)['id']
 
-    for name, value in enum_map.items():
-        enumeration_record['name'] = name
-        enumeration_record['value'] = value
-        last_row_id = db_handle['enumerations'].insert(enumeration_record).last_rowid
+    # All of the records of the enumeration are inserted together by index.apply.
+    index.insert_enumeration(enumeration_record['symbol'], enum_map)
 
-    enumeration_record['id'] = last_row_id
+    if enum_map:
+        enumeration_record['name'], enumeration_record['value'] = list(enum_map.items())[-1]
 
     return enumeration_record
 
 
-def get_field_record(symbol_name: str, field_name: str, db_handle: sqlite_utils.Database) -> Union[dict, None]:
+def get_field_record(symbol_name: str, field_name: str, index: DatabaseIndex) -> Union[dict, None]:
     """
     Return a field record from the database that is part of symbol symbol_name and has the name of filed_name.
-    :param db_handle:
+    :param index:
     :param symbol_name:
     :param field_name:
     :return: Returns None if either the symbol with name symbol_name or the field with name of field_name does not exist.
+    The record is a copy; call index.set_field once it has been written back to the database.
     """
-    field_record = None
-
-    if symbol_exists(symbol_name, db_handle) is False:
-        return field_record
-
-    symbol_id = list(db_handle['symbols'].rows_where('name=?', [symbol_name]))[0]['id']
+    field_record = index.get_field(symbol_name, field_name)
 
-    field_record = list(db_handle['fields'].rows_where('symbol=? and name=?', [symbol_id, field_name]))
-
-    if len(field_record) == 0:
+    if field_record is None:
         return None
 
-    return field_record[0]
+    return dict(field_record)
 
 
-def get_field_type_record(symbol_name: str, field_name: str, db_handle: sqlite_utils.Database) -> Union[dict, None]:
+def get_field_type_record(symbol_name: str, field_name: str, index: DatabaseIndex) -> Union[dict, None]:
     """
     Fetch the type of the field field_name that is inside the struct with name of symbol_name. Note that the record
     returned is a record from the symbols table.
-    :param db_handle:
+    :param index:
     :param symbol_name:
     :param field_name:
-    :return: The new field record that was inserted into the database. None if the symbol record with name symbol_name
-    does not exist.
+    :return: The symbol record of the type of the field. None if the symbol record with name symbol_name or its field
+    with name field_name do not exist.
     """
-    symbol_record = None
-    if symbol_exists(symbol_name, db_handle) is False:
+    if symbol_exists(symbol_name, index) is False:
         logging.error(f'The symbol name with name {symbol_name} does not exist.')
-        return symbol_record
+        return None
 
-    # TODO: There is a string edge case on this.
-    # if field_exists(symbol_name, field_name, db_handle) is False:
-    #     logging.error(f'The field name with name {field_name} and parent {symbol_name} does not exist.')
-    #     return symbol_record
+    field_record = index.get_field(symbol_name, field_name)
+    if field_record is None:
+        logging.error(f'The field name with name {field_name} and parent {symbol_name} does not exist.')
+        return None
 
-    field_symbol = list(db_handle['symbols'].rows_where('name=?', [symbol_name]))[0]['id']
-    field_record = list(db_handle['fields'].rows_where('symbol=? and name=?', [field_symbol, field_name]))[0]
+    return index.symbols_by_id.get(field_record['type'])
 
-    symbol_record = list(db_handle['symbols'].rows_where('id=?', [field_record['type']]))[0]
 
-    return symbol_record
+def set_field_type(field_record: dict, type_id: int, index: DatabaseIndex):
+    """
+    Sets the type of field_record to type_id. The field is updated in place by index.apply, so it keeps its id.
+    :param field_record: See get_field_record.
+    :param type_id:
+    :param index:
+    :return:
+    """
+    index.update_field_type(field_record, type_id)
 
 
-def process_enum_override(enum_override: dict, symbol_elf: str, db_handle: sqlite_utils.Database):
+def process_enum_override(enum_override: dict, symbol_elf: str, index: DatabaseIndex):
     """
     Process the enumeration override enum_override.
     :param enum_override: A dict with the configuration of this override.
     :param symbol_elf: The elf this new enum symbol will point in the database.
-    :param db_handle:
+    :param index:
     :return:
     """
-    type_record = get_field_type_record(enum_override['parent'], enum_override['member'], db_handle)
+    type_record = get_field_type_record(enum_override['parent'], enum_override['member'], index)
     if type_record:
         type_byte_size = type_record['byte_size']
-        new_type_record = add_random_type_to_database(symbol_elf, type_byte_size, db_handle)
+        new_type_record = add_enumeration_type_to_database(symbol_elf, type_byte_size, enum_override['enumerations'],
+                                                           index)
         if new_type_record:
-            new_enum_record = add_enumeration_to_data_base(new_type_record['name'],
-                                                           enum_override['enumerations'],
-                                                           db_handle)
-            if new_enum_record:
-                new_field_record = get_field_record(enum_override['parent'],
-                                                    enum_override['member'],
-                                                    db_handle)
-                db_handle['fields'].delete_where('id=?', [new_field_record['id']])
-                db_handle.conn.commit()
-                new_field_record['type'] = new_type_record['id']
-                db_handle['fields'].insert(new_field_record)
+            new_field_record = get_field_record(enum_override['parent'],
+                                                enum_override['member'],
+                                                index)
+            set_field_type(new_field_record, new_type_record['id'], index)
 
     else:
         logging.warning(f'The symbol "{enum_override["parent"]}" does not exist in the database.'
@@ -239,27 +349,20 @@ def process_enum_override(enum_override: dict, symbol_elf: str, db_handle: sqlit
 
 
 
-def process_symbol_override(symbol_override: dict, symbol_elf: str, db_handle: sqlite_utils.Database):
-    type_record = get_field_type_record(symbol_override['parent'], symbol_override['member'], db_handle)
+def process_symbol_override(symbol_override: dict, symbol_elf: str, index: DatabaseIndex):
+    type_record = get_field_type_record(symbol_override['parent'], symbol_override['member'], index)
     if type_record:
         type_byte_size = type_record['byte_size']
-        if symbol_exists(symbol_override['type'], db_handle) is False:
-            new_type = add_type_to_database(symbol_override['type'], symbol_elf, type_byte_size, db_handle)
+        if symbol_exists(symbol_override['type'], index) is False:
+            new_type = add_type_to_database(symbol_override['type'], symbol_elf, type_byte_size, index)
             if new_type:
-                new_field_record = get_field_record(symbol_override['parent'], symbol_override['member'], db_handle)
+                new_field_record = get_field_record(symbol_override['parent'], symbol_override['member'], index)
                 if new_field_record:
-                    db_handle['fields'].delete_where('id=?', [new_field_record['id']])
-                    db_handle.conn.commit()
-                    new_field_record['type'] = new_type['id']
-                    db_handle['fields'].insert(new_field_record)
+                    set_field_type(new_field_record, new_type['id'], index)
         else:
-            new_field_record = get_field_record(symbol_override['parent'], symbol_override['member'], db_handle)
+            new_field_record = get_field_record(symbol_override['parent'], symbol_override['member'], index)
             if new_field_record:
-                db_handle['fields'].delete_where('id=?', [new_field_record['id']])
-                db_handle.conn.commit()
-                new_field_record['type'] = \
-                list(db_handle['symbols'].rows_where('name=?', [symbol_override['type']]))[0]['id']
-                db_handle['fields'].insert(new_field_record)
+                set_field_type(new_field_record, index.get_symbol(symbol_override['type'])['id'], index)
             else:
                 logging.warning(f'The field record with symbol "{symbol_override["parent"]}" with name'
                                 f' "{symbol_override["member"]}".')
@@ -281,13 +384,33 @@ def get_elf_file(registry: dict):
                 
                 
 
-def process_def_overrides(def_overrides: dict, db_handle: sqlite_utils.Database, module_elf=None):
+def get_override_parents(def_overrides: dict) -> list:
+    """
+    :return: The names of the symbols whose fields the overrides in def_overrides, and its child modules, override.
+    """
+    parents = []
+
+    for module in def_overrides.get('modules') or {}:
+        module_dict = def_overrides['modules'][module]
+        if 'msg_def_overrides' in module_dict:
+            parents += [override['parent'] for override in module_dict['msg_def_overrides']]
+        if 'modules' in module_dict:
+            parents += get_override_parents(module_dict)
+
+    return parents
+
+
+def process_def_overrides(def_overrides: dict, db_handle: sqlite_utils.Database, module_elf=None,
+                          index: DatabaseIndex = None, dry_run: bool = False):
     """
     Apply overrides in def_overrides to database. Examples of these are strings that show up as char[] in sour code
     or enumerations that are represented
     :param module_elf:
     :param def_overrides:
     :param db_handle:
+    :param index: The index every lookup goes through. It is built when None; child modules share the index of their
+    parent. The call that builds the index writes the overrides of the whole module tree in one transaction.
+    :param dry_run: Print the changes instead of writing them to the database.
     :return:
     """
     
@@ -297,6 +420,10 @@ def process_def_overrides(def_overrides: dict, db_handle: sqlite_utils.Database,
         if module_elf is None:
             logging.error(f"The elf file was not found in the registry.")
             return             
+
+    owns_index = index is None
+    if owns_index:
+        index = DatabaseIndex(db_handle, get_override_parents(def_overrides))
     
     if 'modules' in def_overrides:
         for module in def_overrides['modules']:
@@ -304,19 +431,19 @@ def process_def_overrides(def_overrides: dict, db_handle: sqlite_utils.Database,
                 if 'msg_def_overrides' in def_overrides['modules'][module]:
                     for override in def_overrides['modules'][module]['msg_def_overrides']:
                         if override['type'] != 'enumeration':
-                            process_symbol_override(override, module_elf, db_handle)
+                            process_symbol_override(override, module_elf, index)
                         else:
-                            process_enum_override(override, module_elf, db_handle)
+                            process_enum_override(override, module_elf, index)
             else:
                 if 'msg_def_overrides' in def_overrides['modules'][module]:
                     for override in def_overrides['modules'][module]['msg_def_overrides']:
                         if override['type'] != 'enumeration':
-                            process_symbol_override(override, module_elf, db_handle)
+                            process_symbol_override(override, module_elf, index)
                         else:
-                            process_enum_override(override, module_elf, db_handle)
+                            process_enum_override(override, module_elf, index)
 
             if 'modules' in def_overrides['modules'][module]:
-                process_def_overrides(def_overrides['modules'][module], db_handle, module_elf)
+                process_def_overrides(def_overrides['modules'][module], db_handle, module_elf, index)
                 # FIXME:We will use the old elf for now to deal with the edge case such as
                 #       core:
                 #         elf_files:
@@ -328,6 +455,13 @@ def process_def_overrides(def_overrides: dict, db_handle: sqlite_utils.Database,
                 # This is why we have "module_elf = None" comment out for now
                 # module_elf = None
 
+    if owns_index:
+        if dry_run:
+            for change in index.describe():
+                print(change)
+        else:
+            index.apply()
+
 
 def read_yaml(yaml_file: str) -> dict:
     yaml_data = yaml.load(open(yaml_file, 'r'),
@@ -347,6 +481,9 @@ def parse_cli() -> argparse.Namespace:
     parser.add_argument('--yaml_path', type=str, required=True,
                         help='The yaml config file that has the overrides.')
 
+    parser.add_argument('--dry_run', '--dry-run', action='store_true',
+                        help='Print the changes the overrides would make instead of writing them to the database.')
+
     return parser.parse_args()
 
 
@@ -356,7 +493,7 @@ def main():
     db_handle = sqlite_utils.Database(args.database)
     yaml_override_data = read_yaml(args.yaml_path)
 
-    process_def_overrides(yaml_override_data, db_handle)
+    process_def_overrides(yaml_override_data, db_handle, dry_run=args.dry_run)
 
 
 if __name__ == '__main__':
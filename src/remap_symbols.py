@@ -1,6 +1,17 @@
 import argparse
+import fnmatch
+import logging
+import re
 import yaml
 import sqlite3
+from contextlib import closing
+
+
+"""
+Remaps whose old symbol starts with this prefix are regular expressions, i.e. "re:CFE_.*_(MsgId|PipeId)_t".
+"""
+REGEX_PREFIX = 're:'
+GLOB_CHARACTERS = '*?['
 
 
 def read_yaml(yaml_file: str) -> dict:
@@ -9,36 +20,216 @@ def read_yaml(yaml_file: str) -> dict:
     return yaml_data
 
 
-def remap_symbols(database_path, yaml_map: dict):
+def is_pattern(old_symbol: str) -> bool:
+    """
+    :return: True if old_symbol is a regular expression(see REGEX_PREFIX) or a glob pattern such as "*_MsgId_t",
+    rather than the name of a symbol.
+    """
+    return old_symbol.startswith(REGEX_PREFIX) or any(character in old_symbol for character in GLOB_CHARACTERS)
+
+
+"""
+Matches numbered backreferences such as "\\1" and named ones such as "(?P=name)" in a regular expression.
+"""
+BACKREFERENCE_EXPRESSION = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def can_combine(expression: str) -> bool:
+    """
+    :param expression: A regular expression that compiles.
+    :return: True if expression matches the same names when it is wrapped in a named group and joined to other
+    expressions. Global inline flags such as "(?i)" must be at the start of the whole expression, numbered
+    backreferences point at other groups once groups are added before them, and named groups may clash with those of
+    other expressions, so expressions with any of those are matched on their own.
+    """
+    compiled = re.compile(expression)
+    return compiled.flags == re.compile('').flags and not compiled.groupindex and \
+        BACKREFERENCE_EXPRESSION.search(expression) is None
+
+
+def compile_patterns(patterns: list) -> list:
+    """
+    Compiles the patterns into as few regular expressions as possible, so a symbol name is matched against all of them
+    at once. Consecutive patterns that can be combined(see can_combine) are joined into a single expression; every
+    other pattern gets an expression of its own.
+    :param patterns: Regular expressions(see REGEX_PREFIX) and glob patterns.
+    :return: (expression, index) tuples, in the order of patterns; see get_matching_pattern. index is the index in
+    patterns of the pattern of an expression of its own, and None for joined expressions, in which the name of the
+    group that matches is "pattern" followed by the index of the pattern.
+    :raises ValueError: If a pattern is not a valid regular expression.
+    """
+    expressions = []
+    alternatives = []
+
+    def join_alternatives():
+        if alternatives:
+            try:
+                expressions.append((re.compile('|'.join(alternatives)), None))
+            except re.error as error:
+                raise ValueError(f'The remap patterns {patterns} cannot be matched together: {error}')
+            alternatives.clear()
+
+    for index, pattern in enumerate(patterns):
+        if pattern.startswith(REGEX_PREFIX):
+            expression = pattern[len(REGEX_PREFIX):]
+        else:
+            expression = fnmatch.translate(pattern)
+        try:
+            combine = can_combine(expression)
+        except re.error as error:
+            raise ValueError(f'The remap pattern "{pattern}" is not valid: {error}')
+
+        if combine:
+            alternatives.append(f'(?P<pattern{index}>{expression})')
+        else:
+            join_alternatives()
+            expressions.append((re.compile(expression), index))
+
+    join_alternatives()
+
+    return expressions
+
+
+def get_matching_pattern(expressions: list, name: str):
+    """
+    :param expressions: See compile_patterns.
+    :param name:
+    :return: The index of the pattern that matches all of name. When several patterns match it, the one that comes
+    first wins. None if no pattern matches it.
+    """
+    for expression, index in expressions:
+        match = expression.fullmatch(name)
+        if match is not None:
+            return index if index is not None else int(match.lastgroup[len('pattern'):])
+    return None
+
+
+def expand_patterns(db_handle: sqlite3.Connection, yaml_map: dict) -> dict:
+    """
+    Replaces every pattern in yaml_map with the names of the symbols in the database that match it. The symbols table
+    is scanned once, however many patterns there are.
+    :param db_handle:
+    :param yaml_map: See remap_symbols.
+    :return: A dictionary of the form {old_symbol1:new_symbol1} without patterns. Symbols that are remapped explicitly
+    in yaml_map are not remapped by patterns.
+    """
+    expanded_map = {old_symbol: new_symbol for old_symbol, new_symbol in yaml_map.items()
+                    if not is_pattern(old_symbol)}
+    patterns = [old_symbol for old_symbol in yaml_map if is_pattern(old_symbol)]
+
+    if not patterns:
+        return expanded_map
+
+    pattern_expressions = compile_patterns(patterns)
+    pattern_counts = dict.fromkeys(patterns, 0)
+
+    for symbol_name, in db_handle.execute('SELECT name FROM symbols'):
+        if symbol_name in expanded_map:
+            continue
+
+        pattern_index = get_matching_pattern(pattern_expressions, symbol_name)
+        if pattern_index is None:
+            continue
+
+        pattern = patterns[pattern_index]
+        # A pattern such as "*_t: uint16_t" matches its own new symbol.
+        if yaml_map[pattern] != symbol_name:
+            expanded_map[symbol_name] = yaml_map[pattern]
+            pattern_counts[pattern] += 1
+
+    for pattern, symbol_count in pattern_counts.items():
+        logging.info(f'The remap pattern "{pattern}" matches {symbol_count} symbols.')
+
+    return expanded_map
+
+
+def resolve_remaps(yaml_map: dict) -> dict:
+    """
+    Resolves chained remaps transitively; with {A: B, B: C} fields of both A and B end up as C.
+    :param yaml_map: A dictionary of the form {old_symbol1:new_symbol1, old_symbol2:new_symbol2}.
+    :return: A dictionary of the same form where no new symbol is itself remapped. Remaps that are part of a cycle, such
+    as {A: B, B: A}, are left out.
+    """
+    resolved_map = {}
+
+    for old_symbol in yaml_map:
+        new_symbol = yaml_map[old_symbol]
+        chain = [old_symbol]
+        while new_symbol in yaml_map and new_symbol not in chain:
+            chain.append(new_symbol)
+            new_symbol = yaml_map[new_symbol]
+
+        if new_symbol in chain:
+            logging.error(f'The remap of "{old_symbol}" is part of a cycle({" -> ".join(chain + [new_symbol])}). '
+                          f'It will not be remapped.')
+            continue
+
+        resolved_map[old_symbol] = new_symbol
+
+    return resolved_map
+
+
+def remap_symbols(database_path, yaml_map: dict) -> dict:
     """
     Remaps symbols in the database. This is very useful for situations where juicer does not
     accurately capture the intent of the source code. An example is a typedef'd voi* type by a macro.
     Since the "void*" type does not exist in the database(as of DWARF Version4), one may remap the macro to the word size
     of the machine which may represented by uint16, uint32 or uint64 depending on the architecture of course.
-    :param database_path: The path to the sqlite database.
+    All of the remaps are applied with a single UPDATE in a single transaction. Remaps whose old or new symbol does not
+    exist in the database are reported together and skipped.
+    :param database_path: The path to the sqlite database, or an open sqlite3 connection to it.
     :param yaml_map:A dictionary of the form {old_symbol1:new_symbol1, old_symbol2:new_symbol2} which has all
-    of the remaps.
-    :return:
+    of the remaps. Chained remaps are resolved; see resolve_remaps. An old symbol may also be a glob pattern such as
+    "*_MsgId_t" or a regular expression such as "re:CFE_.*_MsgId_t"; see expand_patterns.
+    :return: The number of fields every remap changed, keyed by the old symbol.
     NOTE: This function commits the database transactions; so there is no need for the caller to commit anything to the
     database.
     """
-    db_handle = sqlite3.connect(database_path)
-    db_cursor = db_handle.cursor()
+    if not isinstance(database_path, sqlite3.Connection):
+        # Only the connection opened here is closed; a connection passed in belongs to the caller.
+        with closing(sqlite3.connect(database_path)) as db_handle:
+            return remap_symbols(db_handle, yaml_map)
+
+    db_handle = database_path
+    resolved_map = resolve_remaps(expand_patterns(db_handle, yaml_map))
+
+    with db_handle:
+        db_handle.execute('CREATE TEMP TABLE IF NOT EXISTS remaps(old_name TEXT PRIMARY KEY, new_name TEXT NOT NULL)')
+        db_handle.execute('DELETE FROM temp.remaps')
+        db_handle.executemany('INSERT INTO temp.remaps(old_name, new_name) VALUES(?, ?)', resolved_map.items())
+
+        missing_symbols = [name for name, in db_handle.execute(
+            'SELECT name FROM (SELECT old_name AS name FROM temp.remaps UNION SELECT new_name FROM temp.remaps) '
+            'WHERE name NOT IN (SELECT name FROM symbols) ORDER BY name')]
+
+        db_handle.execute('CREATE TEMP TABLE IF NOT EXISTS remap_ids(old_id INTEGER PRIMARY KEY, '
+                          'new_id INTEGER NOT NULL, old_name TEXT NOT NULL)')
+        db_handle.execute('DELETE FROM temp.remap_ids')
+        db_handle.execute('INSERT INTO temp.remap_ids(old_id, new_id, old_name) '
+                          'SELECT old_symbol.id, new_symbol.id, old_symbol.name FROM temp.remaps '
+                          'JOIN symbols AS old_symbol ON old_symbol.name = temp.remaps.old_name '
+                          'JOIN symbols AS new_symbol ON new_symbol.name = temp.remaps.new_name')
+
+        remap_counts = {old_name: 0 for old_name, in db_handle.execute('SELECT old_name FROM temp.remap_ids')}
+        remap_counts.update(db_handle.execute('SELECT temp.remap_ids.old_name, COUNT(*) FROM fields '
+                                              'JOIN temp.remap_ids ON temp.remap_ids.old_id = fields.type '
+                                              'GROUP BY temp.remap_ids.old_id'))
+
+        db_handle.execute('UPDATE fields SET type = (SELECT new_id FROM temp.remap_ids '
+                          'WHERE temp.remap_ids.old_id = fields.type) '
+                          'WHERE type IN (SELECT old_id FROM temp.remap_ids)')
 
-    for old_symbol, new_symbol in yaml_map.items():
-        old_symbol_id = db_cursor.execute('SELECT id FROM symbols where name=?',
-                                          (old_symbol,)).fetchone()[0]
+        db_handle.execute('DROP TABLE temp.remaps')
+        db_handle.execute('DROP TABLE temp.remap_ids')
 
-        new_symbol_id = db_cursor.execute('SELECT id FROM symbols where name=?',
-                                          (new_symbol,)).fetchone()[0]
+    if missing_symbols:
+        logging.warning(f'The symbols {missing_symbols} do not exist in the database. '
+                        f'The remaps that use them were skipped.')
 
-        field_ids = db_cursor.execute('SELECT id FROM fields where type=?',
-                                      (old_symbol_id,)).fetchall()
+    for old_symbol, field_count in remap_counts.items():
+        logging.info(f'Remapped {field_count} fields of "{old_symbol}" to "{resolved_map[old_symbol]}".')
 
-        for field_id in field_ids:
-            db_handle.execute("UPDATE fields SET type = ? WHERE id = ?",
-                              (new_symbol_id, field_id[0]))
-            db_handle.commit()
+    return remap_counts
 
 
 def parse_cli() -> argparse.Namespace:
@@ -59,11 +250,11 @@ def parse_cli() -> argparse.Namespace:
 def main():
     args = parse_cli()
 
-    yaml = read_yaml(args.yaml_path)
-    if 'remaps' in yaml:
-        yaml_remaps = read_yaml(args.yaml_path)['remaps']
+    yaml_data = read_yaml(args.yaml_path)
+    if 'remaps' in yaml_data:
+        yaml_remaps = yaml_data['remaps']
     else:
-        yaml_remaps = read_yaml(args.yaml_path)['type_remaps']
+        yaml_remaps = yaml_data['type_remaps']
 
     remap_symbols(args.database, yaml_remaps)
 
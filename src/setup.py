@@ -33,8 +33,10 @@ setup(
     python_requires='>=3.6.0',
     install_requires=requires,
     packages=find_packages(),
-    py_modules=['header_mod', 'log_parser', 'mod_sql', 'msg_def_overrides', 'remap_symbols', 'squeezer', 'yaml_merger',
-                'yaml_merger'], #FIXME: We need to organize auto-yamcs into a package to avoid ugly things like this one.
+    py_modules=['benchmark', 'ccsds', 'ds_decoder', 'ds_index', 'ds_sinks', 'file_watcher', 'header_mod', 'juicer_cache', 'layout_cache',
+                'log_parser', 'memory_db', 'mod_sql', 'msg_def_overrides', 'remap_symbols', 'shard_merger', 'squeezer', 'squeezer_config', 'stage_profiler',
+                'stage_scheduler', 'synthetic_mdb',
+                'yaml_merger', 'yaml_merger'], #FIXME: We need to organize auto-yamcs into a package to avoid ugly things like this one.
     include_package_data=True,
     entry_points={'console_scripts': ['auto-yamcs = squeezer:main']},
     classifiers=[
@@ -0,0 +1,253 @@
+"""
+Merges the shard databases written by parallel juicer runs into a single database. Every ELF file is juiced into its
+own shard, which means the ids in each shard start from scratch. This module copies every shard into the output
+database in one bulk pass and remaps the foreign keys(elfs, symbols and fields ids) on the way in.
+
+Tables the merger has no foreign keys for are copied as they are only if nothing in them can refer to the records of
+another table; copying ids that are only valid within their shard would silently corrupt the merged database. Tables
+that do must be given their foreign keys and natural keys(see merge_shards).
+"""
+import argparse
+import logging
+import sqlite3
+
+"""
+The foreign keys of the juicer schema at [1]. Each table maps its foreign key columns to the table they point to.
+The order of this map matters; a table must come after every table it references.
+[1]:https://github.com/WindhoverLabs/juicer/tree/develop
+"""
+shard_foreign_keys = \
+    {
+        'elfs': {},
+        'symbols': {'elf': 'elfs'},
+        'fields': {'symbol': 'symbols', 'type': 'symbols'},
+        'enumerations': {'symbol': 'symbols'},
+    }
+
+"""
+The columns that identify a record across shards. juicer never writes two symbols with the same name into one
+database; the first ELF that defines a symbol owns it. We honor that same rule when merging shards.
+"""
+shard_natural_keys = \
+    {
+        'elfs': ('name',),
+        'symbols': ('name',),
+        'fields': ('symbol', 'name'),
+        'enumerations': ('symbol', 'name'),
+    }
+
+
+"""
+The names of columns that refer to the records of another table in the juicer schema. Tables without known foreign keys
+that have columns named like these, an id, or columns ending in "_id" are not copied; see get_reference_columns.
+"""
+reference_column_names = {column for foreign_keys in shard_foreign_keys.values() for column in foreign_keys}
+
+
+def get_table_columns(db_handle: sqlite3.Connection, table: str) -> list:
+    return [column[1] for column in db_handle.execute(f'PRAGMA table_info("{table}")').fetchall()]
+
+
+def get_table_names(db_handle: sqlite3.Connection) -> list:
+    return [row[0] for row in db_handle.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                                                "AND name NOT LIKE 'sqlite_%' ORDER BY rowid").fetchall()]
+
+
+def get_reference_columns(db_handle: sqlite3.Connection, table: str) -> list:
+    """
+    :param db_handle:
+    :param table:
+    :return: The columns of table that are, or may be, ids of its records or references to the records of another
+    table: its declared foreign keys along with the columns named like them(see reference_column_names).
+    """
+    declared_columns = {foreign_key[3] for foreign_key in
+                        db_handle.execute(f'PRAGMA foreign_key_list("{table}")').fetchall()}
+    return [column for column in get_table_columns(db_handle, table)
+            if column in declared_columns or column == 'id' or column.endswith('_id') or
+            column in reference_column_names]
+
+
+def copy_schema(shard_handle: sqlite3.Connection, db_handle: sqlite3.Connection):
+    """
+    Creates every table and index of the shard on db_handle, unless it exists already.
+    :param shard_handle:
+    :param db_handle:
+    :return:
+    """
+    existing_tables = set(get_table_names(db_handle))
+    schema = shard_handle.execute("SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL "
+                                  "AND name NOT LIKE 'sqlite_%' ORDER BY rowid").fetchall()
+    for object_type, name, sql in schema:
+        if object_type == 'table' and name not in existing_tables:
+            db_handle.execute(sql)
+        elif object_type == 'index':
+            db_handle.execute(sql.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1)
+                              .replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX IF NOT EXISTS', 1))
+
+
+class ShardMerger:
+    """
+    Merges shards into the database behind db_handle. The merger remembers the natural keys of every record that has
+    been written so far, so shards must be merged in the same order juicer would have processed the ELF files.
+    """
+
+    def __init__(self, db_handle: sqlite3.Connection, foreign_keys: dict = None, natural_keys: dict = None):
+        """
+        :param db_handle:
+        :param foreign_keys: The foreign keys of tables that are not in the juicer schema, in the form of
+        shard_foreign_keys. They are merged after the tables of the juicer schema, in the order they are given.
+        :param natural_keys: The natural keys of the tables in foreign_keys, in the form of shard_natural_keys.
+        """
+        self.db_handle = db_handle
+        self.foreign_keys = dict(shard_foreign_keys, **(foreign_keys or {}))
+        self.natural_keys = dict(shard_natural_keys, **(natural_keys or {}))
+        # {table: {natural_key: id}}
+        self.__natural_key_ids = {}
+        # {table: next free id}
+        self.__next_ids = {}
+
+    def __load_table(self, table: str):
+        if table in self.__natural_key_ids:
+            return
+
+        key_columns = self.natural_keys[table]
+        self.__natural_key_ids[table] = {}
+        self.__next_ids[table] = 1
+
+        if 'id' in get_table_columns(self.db_handle, table):
+            query = f'SELECT id, {", ".join(key_columns)} FROM {table}'
+            for record in self.db_handle.execute(query):
+                self.__natural_key_ids[table][tuple(record[1:])] = record[0]
+            self.__next_ids[table] = self.db_handle.execute(f'SELECT IFNULL(MAX(id), 0) + 1 FROM {table}') \
+                                         .fetchone()[0]
+        else:
+            query = f'SELECT {", ".join(key_columns)} FROM {table}'
+            for record in self.db_handle.execute(query):
+                self.__natural_key_ids[table][tuple(record)] = None
+
+    def merge(self, shard_path: str):
+        """
+        Copies every record in the shard at shard_path into the database. Records that already exist (by natural key)
+        are not copied again; references to them are pointed at the existing record instead.
+        NOTE: This function does NOT commit. The caller decides how big the transaction is.
+        :param shard_path: The path to a database written by juicer.
+        :return:
+        :raises ValueError: If the shard has a table with no known foreign keys that has ids or references to other
+        tables(see get_reference_columns). Nothing is copied from the shard in that case.
+        """
+        shard_handle = sqlite3.connect(f'file:{shard_path}?mode=ro', uri=True)
+        try:
+            unknown_tables = [table for table in get_table_names(shard_handle) if table not in self.foreign_keys]
+            for table in unknown_tables:
+                reference_columns = get_reference_columns(shard_handle, table)
+                if reference_columns:
+                    raise ValueError(f'The table "{table}" in shard "{shard_path}" has no known foreign keys, but its '
+                                     f'columns {reference_columns} may be ids or refer to other tables. Give its '
+                                     f'foreign keys and natural keys to merge it.')
+
+            copy_schema(shard_handle, self.db_handle)
+            # {table: {shard_id: merged_id}}
+            id_maps = {}
+
+            for table, foreign_keys in self.foreign_keys.items():
+                if table not in get_table_names(shard_handle):
+                    continue
+                self.__load_table(table)
+                id_maps[table] = self.__merge_table(shard_handle, table, foreign_keys, id_maps)
+
+            for table in unknown_tables:
+                logging.info(f'The table "{table}" in shard "{shard_path}" has no ids nor references to other tables. '
+                             f'Its records are copied as they are.')
+                self.__copy_table(shard_handle, table)
+        finally:
+            shard_handle.close()
+
+    def __merge_table(self, shard_handle: sqlite3.Connection, table: str, foreign_keys: dict, id_maps: dict) -> dict:
+        columns = get_table_columns(shard_handle, table)
+        has_id = 'id' in columns
+        key_indices = [columns.index(column) for column in self.natural_keys[table]]
+        foreign_key_indices = [(columns.index(column), id_maps[referenced_table])
+                               for column, referenced_table in foreign_keys.items() if column in columns]
+
+        id_map = {}
+        new_records = []
+        natural_key_ids = self.__natural_key_ids[table]
+
+        for record in shard_handle.execute(f'SELECT {", ".join(columns)} FROM {table}'):
+            record = list(record)
+            for index, referenced_ids in foreign_key_indices:
+                record[index] = referenced_ids.get(record[index], record[index])
+
+            natural_key = tuple(record[index] for index in key_indices)
+            if natural_key in natural_key_ids:
+                if has_id:
+                    id_map[record[columns.index('id')]] = natural_key_ids[natural_key]
+                continue
+
+            if has_id:
+                id_index = columns.index('id')
+                id_map[record[id_index]] = self.__next_ids[table]
+                record[id_index] = self.__next_ids[table]
+                natural_key_ids[natural_key] = self.__next_ids[table]
+                self.__next_ids[table] += 1
+            else:
+                natural_key_ids[natural_key] = None
+
+            new_records.append(record)
+
+        self.db_handle.executemany(f'INSERT INTO {table}({", ".join(columns)}) '
+                                   f'VALUES({", ".join("?" * len(columns))})', new_records)
+
+        return id_map
+
+    def __copy_table(self, shard_handle: sqlite3.Connection, table: str):
+        columns = get_table_columns(shard_handle, table)
+        self.db_handle.executemany(f'INSERT INTO {table}({", ".join(columns)}) '
+                                   f'VALUES({", ".join("?" * len(columns))})',
+                                   shard_handle.execute(f'SELECT {", ".join(columns)} FROM {table}'))
+
+
+def merge_shards(shard_paths: list, output_path: str, foreign_keys: dict = None, natural_keys: dict = None):
+    """
+    Merges all of the shards in shard_paths into the database at output_path in a single transaction.
+    :param shard_paths: Paths to juicer databases. They are merged in the order they are given.
+    :param output_path: The database to merge into. It is created if it does not exist.
+    :param foreign_keys: See ShardMerger.
+    :param natural_keys: See ShardMerger.
+    :return:
+    :raises ValueError: See ShardMerger.merge. No records are merged in that case.
+    """
+    db_handle = sqlite3.connect(output_path)
+    try:
+        with db_handle:
+            merger = ShardMerger(db_handle, foreign_keys, natural_keys)
+            for shard_path in shard_paths:
+                logging.info(f'Merging shard "{shard_path}"')
+                merger.merge(shard_path)
+    finally:
+        db_handle.close()
+
+
+def parse_cli() -> argparse.Namespace:
+    """
+    Parses cli arguments.
+    :return: The namespace that has all of the arguments that have been parsed.
+    """
+    parser = argparse.ArgumentParser(description='Merges juicer shard databases into a single database.')
+
+    parser.add_argument('--shards', type=str, nargs='+', required=True,
+                        help='The shard databases to merge. They are merged in the order they are given.')
+
+    parser.add_argument('--output_file', type=str, required=True, help='The database to merge the shards into.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_cli()
+
+    merge_shards(args.shards, args.output_file)
+
+
+if __name__ == '__main__':
+    main()
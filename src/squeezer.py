@@ -1,14 +1,26 @@
 import argparse
+import sqlite3
 import subprocess
 import os
 import logging
+import shutil
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
-import yaml
 import sys
 import remap_symbols
 import msg_def_overrides
 import sqlite_utils
 import mod_sql
+import shard_merger
+import juicer_cache
+import stage_profiler
+import memory_db
+import file_watcher
+import squeezer_config
+import stage_scheduler
+from squeezer_config import SqueezerConfig
 
 # There does not seem to be a cleaner way of doing this in python when working with git submodules
 sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../')))
@@ -18,29 +30,130 @@ sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(_
 from xtce_generator.src.xtce import xtce_generator
 import tlm_cmd_merger
 
+JUICER_PATH = '../juicer/build/juicer'
 
-def squeeze_files(elf_files: list, output_path: str, mode: str, verbosity: str):
-    subprocess.run(['rm', '-f', output_path])
-    subprocess.run(['make', '-C', os.path.join(os.getcwd(), '../juicer')], check=True)
 
-    logging.info('Squeezing files...')
+def get_existing_elf_files(elf_files: list) -> list:
+    """
+    Filters out the elf files that do not exist along with duplicates. The order of elf_files is preserved.
+    :param elf_files:
+    :return:
+    """
+    existing_elf_files = []
+
     for file_path in elf_files:
         my_file = Path(file_path)
         if my_file.exists() and my_file.is_file():
-            logging.info('Running juicer on {0}'.format(my_file))
-            print('../juicer/build/juicer --input ' + file_path + ' --mode ' + mode + ' --output ' + output_path + ' -v ' + verbosity)
-            subprocess.run(
-                ['../juicer/build/juicer', '--input', file_path, '--mode', mode, '--output', output_path, '-v',
-                 verbosity],
-                check=True)
+            if file_path not in existing_elf_files:
+                existing_elf_files.append(file_path)
         else:
             logging.warning(f'Elf file "{my_file}" does not exist. Revise your configuration file.')
 
+    return existing_elf_files
+
+
+def run_juicer(elf_file: str, output_path: str, mode: str, verbosity: str):
+    logging.info('Running juicer on {0}'.format(elf_file))
+    print(JUICER_PATH + ' --input ' + elf_file + ' --mode ' + mode + ' --output ' + output_path + ' -v ' + verbosity)
+    subprocess.run(
+        [JUICER_PATH, '--input', elf_file, '--mode', mode, '--output', output_path, '-v',
+         verbosity],
+        check=True)
+
+
+def squeeze_shard(elf_file: str, shard_path: str, mode: str, verbosity: str, cache: juicer_cache.JuicerCache = None):
+    """
+    Squeezes elf_file into its own shard database at shard_path. If a cache is given, the shard is pulled from the
+    cache when this exact elf file has been squeezed before; otherwise the new shard is added to the cache.
+    :return:
+    """
+    if cache is None:
+        run_juicer(elf_file, shard_path, mode, verbosity)
+        return
+
+    key = cache.get_key(elf_file, mode)
+    if cache.get(key, shard_path):
+        logging.info(f'Found "{elf_file}" in the juicer cache.')
+    else:
+        run_juicer(elf_file, shard_path, mode, verbosity)
+        cache.put(key, shard_path)
+
+
+def build_juicer():
+    subprocess.run(['make', '-C', os.path.join(os.getcwd(), '../juicer')], check=True)
+
+
+def squeeze_shards(elf_files: list, shard_dir: str, mode: str, verbosity: str, jobs: int,
+                   cache: juicer_cache.JuicerCache = None) -> list:
+    """
+    Runs juicer on every elf file concurrently. Each elf file is written to its own shard database inside shard_dir.
+    :param elf_files: The elf files to squeeze. These are assumed to exist.
+    :param shard_dir:
+    :param mode:
+    :param verbosity:
+    :param jobs: The number of juicer processes to run at the same time.
+    :param cache: An optional cache of shards from previous runs.
+    :return: The paths of the shards, in the same order as elf_files.
+    """
+    shard_paths = [os.path.join(shard_dir, f'{index}.sqlite') for index in range(len(elf_files))]
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        juicer_runs = [pool.submit(squeeze_shard, elf_file, shard_path, mode, verbosity, cache)
+                       for elf_file, shard_path in zip(elf_files, shard_paths)]
+        for juicer_run in juicer_runs:
+            juicer_run.result()
+
+    return shard_paths
+
 
-def merge_command_telemetry(yaml_path: str, module_path: str, sqlite_path: str):
+def squeeze_files_parallel(elf_files: list, output_path: str, mode: str, verbosity: str, jobs: int,
+                           cache: juicer_cache.JuicerCache = None):
+    """
+    Squeezes every elf file into its own temporary shard database(see squeeze_shards); once all of them are done the
+    shards are merged into output_path in one pass.
+    :return:
+    """
+    with tempfile.TemporaryDirectory(prefix='squeezer_shards_') as shard_dir:
+        shard_paths = squeeze_shards(elf_files, shard_dir, mode, verbosity, jobs, cache)
+
+        logging.info('Merging shards...')
+        shard_merger.merge_shards(shard_paths, output_path)
+
+
+def get_juicer_cache(cache_dir: str, cache_size: int):
+    """
+    :param cache_dir:
+    :param cache_size: The size limit of the cache in megabytes.
+    :return: The juicer cache at cache_dir. None if cache_dir is None.
+    """
+    if cache_dir is None:
+        return None
+
+    return juicer_cache.JuicerCache(cache_dir, cache_size * 1024 * 1024, juicer_cache.get_juicer_version(JUICER_PATH))
+
+
+def squeeze_files(elf_files: list, output_path: str, mode: str, verbosity: str, jobs: int = 1,
+                  cache_dir: str = None, cache_size: int = 0):
+    subprocess.run(['rm', '-f', output_path])
+    build_juicer()
+
+    logging.info('Squeezing files...')
+    elf_files = get_existing_elf_files(elf_files)
+    cache = get_juicer_cache(cache_dir, cache_size)
+
+    # The cache works on shards, so the shard path is taken whenever a cache is used; even with a single job.
+    if jobs > 1 or cache is not None:
+        squeeze_files_parallel(elf_files, output_path, mode, verbosity, jobs, cache)
+    else:
+        for file_path in elf_files:
+            run_juicer(file_path, output_path, mode, verbosity)
+
+
+def merge_command_telemetry(config: SqueezerConfig, module_path: str, sqlite_path: str):
     logging.info('Merging commands and telemetry into database.')
-    # FIXME: Change the yaml_path to a yaml_dict; this way we avoid parsing the same YAML twice.
-    tlm_cmd_merger.merge_all(sqlite_path, module_path, yaml_path)
+    # NOTE: tlm_cmd_merger only takes a path to the configuration, so it parses config.path on its own. Be sure to
+    # write the config before calling this function.
+    tlm_cmd_merger.merge_all(sqlite_path, module_path, config.path)
 
 
 def get_elf_files(yaml_dict: dict):
@@ -70,9 +183,7 @@ def run_xtce_generator(sqlite_path: str, xtce_yaml: dict, verbosity: str, output
 
 
 def read_yaml(yaml_file: str) -> dict:
-    yaml_data = yaml.load(open(yaml_file, 'r'),
-                          Loader=yaml.FullLoader)
-    return yaml_data
+    return squeezer_config.read_yaml(yaml_file)
 
 
 def check_version():
@@ -91,14 +202,14 @@ def remap(database_path: str, remap_yaml_path: str):
     yaml_data = read_yaml(remap_yaml_path)
     logging.info('Remapping synbols...')
     if 'type_remaps' in yaml_data:
-        yaml_remaps = read_yaml(remap_yaml_path)['type_remaps']
+        yaml_remaps = yaml_data['type_remaps']
         remap_symbols.remap_symbols(database_path, yaml_remaps)
     else:
         logging.warning('remap tool was invoked but "type_remaps" configuration does exist on'
                         f'"{remap_yaml_path}". Thus no remapping will be done.')
 
 
-def run_mod_sql(database_path: str, yaml_path):
+def run_mod_sql(database_path, yaml_path):
     logging.info('Modding sqlite database(manual entries)...')
     mod_sql.mod_sql(database_path, yaml_path)
 
@@ -164,30 +275,14 @@ def set_log_level(log_level: str):
     logging.getLogger().name = 'squeezer'
 
 
-def run_msg_def_overrides(yaml_path: str, module_path: str, sqlite_path: str):
-    yaml_overrides_dict = read_yaml(yaml_path)
-    module_dict = get_module_by_path(module_path, yaml_overrides_dict)
+def apply_msg_def_overrides(module_dict: dict, sqlite_path):
     db_handle = sqlite_utils.Database(sqlite_path)
     logging.info('Processing overrides...')
     msg_def_overrides.process_def_overrides(module_dict, db_handle)
 
 
-def get_module_by_path(module_path: str, yaml_data: dict): 
-    module_yaml_dict = yaml_data    
-     
-    for module_name in module_path.split("/"):
-        if module_name != "":                
-            if "modules" in module_yaml_dict:
-                if module_name not in module_yaml_dict["modules"]:
-                    logging.error('"{0}" is not found. Aborting'.format(module_name))
-                    exit(-1)
-                else:
-                    module_yaml_dict = module_yaml_dict["modules"][module_name]
-            else:
-                logging.error('"{0}" is not found. Aborting'.format(module_name))
-                exit(-1)
-                
-    return module_yaml_dict
+def get_module_by_path(module_path: str, yaml_data: dict):
+    return squeezer_config.get_module_by_path(module_path, yaml_data)
 
 
 def set_module_by_path(module_path: str, module_data, full_data: dict): 
@@ -208,45 +303,328 @@ def set_module_by_path(module_path: str, module_data, full_data: dict):
     return full_data
 
 
-def inline_mode_handler(args: argparse.Namespace):
-    set_log_level(args.verbosity)
-    logging.info('"inline" mode invoked.')
-    
-    full_dict = read_yaml(args.inline_yaml_path)
-    
-    module_dict = get_module_by_path(args.module_path, full_dict)
+def get_juicer_output_path(output_file: str, in_memory: bool) -> str:
+    """
+    :return: The path juicer should write to. When building in memory, juicer writes to a temporary file so
+    output_file is only ever replaced once the database is complete.
+    """
+    if in_memory:
+        return output_file + '.juicer.tmp'
+    return output_file
+
 
-    elfs = get_elf_files(module_dict)
+def open_database(juicer_output_path: str, in_memory: bool):
+    """
+    :return: What the post-juicer stages should run against. This is either the path to the database or, when
+    in_memory is True, a connection to an in-memory copy of the database written by juicer.
+    """
+    if not in_memory:
+        return juicer_output_path
 
-    squeeze_files(elfs, args.output_file, args.juicer_mode, args.verbosity)
+    db_handle = memory_db.load_into_memory(juicer_output_path)
+    os.remove(juicer_output_path)
+    return db_handle
 
-    module_dict["db"] = dict()
-    module_dict["db"]["sqlite"] = args.output_file
 
-    if args.remap_yaml:
-        yaml_remaps_dict = read_yaml(args.remap_yaml)
-        yaml_remaps = __inline_get_remaps(yaml_remaps_dict)
+def write_database(database, output_file: str) -> str:
+    """
+    Writes an in-memory database to a temporary file next to output_file. Call commit_database once every tool that
+    needs the file on disk is done with it.
+    :param database: The path or connection returned by open_database.
+    :param output_file:
+    :return: The path of the database on disk.
+    """
+    if isinstance(database, sqlite3.Connection):
+        sqlite_path = memory_db.write_to_temp_file(database, output_file)
+        database.close()
+        return sqlite_path
+    return output_file
+
+
+def commit_database(sqlite_path: str, output_file: str):
+    """
+    Atomically moves the database written by write_database over output_file.
+    """
+    if sqlite_path != output_file:
+        os.replace(sqlite_path, output_file)
+        logging.info(f'Database has been written to "{output_file}".')
+
+
+def get_xtce_config(module_dict: dict, yaml_path: str):
+    if 'xtce_config' in module_dict:
+        return module_dict['xtce_config']
+
+    logging.warning(f'The xtce configuration file "{yaml_path}" has no "xtce_config" key.'
+                    'No configuration will be applied when generating xtce file.')
+    return None
+
+
+def build_database(config: SqueezerConfig, module_path: str, juicer_output_path: str, output_file: str,
+                   in_memory: bool, profiler: stage_profiler.StageProfiler):
+    """
+    Runs every stage that comes after juicer and modifies the database of the module at module_path; remapping,
+    overrides and merging of commands and telemetry.
+    :param config: The singleton configuration. It must already have the "db" entry of the module written to it.
+    :param module_path:
+    :param juicer_output_path: The database juicer wrote. See get_juicer_output_path.
+    :param output_file: The final database.
+    :param in_memory: See open_database.
+    :param profiler:
+    :return:
+    """
+    module_dict = config.get_module(module_path)
+
+    with profiler.stage('load_database'):
+        database = open_database(juicer_output_path, in_memory)
+
+    with profiler.stage('remap_symbols'):
+        yaml_remaps = __singleton_get_remap(module_dict)
+
         if len(yaml_remaps['type_remaps']) > 0:
-            remap_symbols.remap_symbols(args.output_file, yaml_remaps['type_remaps'])
+            remap_symbols.remap_symbols(database, yaml_remaps['type_remaps'])
         else:
-            logging.warning('No type_remaps configuration found. No remapping was done done.')
+            logging.warning('No type_remaps configuration found. No type_remapping was done done.')
+
+    with profiler.stage('msg_def_overrides'):
+        apply_msg_def_overrides(module_dict, database)
+
+    with profiler.stage('write_database'):
+        sqlite_path = write_database(database, output_file)
+
+    # NOTE: tlm_cmd_merger only works on files, so it runs on the database after it has been written to disk.
+    with profiler.stage('merge_command_telemetry'):
+        merge_command_telemetry(config, module_path, sqlite_path)
+
+    commit_database(sqlite_path, output_file)
+
+
+def build_xtce(config: SqueezerConfig, module_path: str, output_file: str, xtce_output_path: str, verbosity: str,
+               profiler: stage_profiler.StageProfiler):
+    module_dict = config.get_module(module_path)
+    xtce_config_data = get_xtce_config(module_dict, config.path)
+
+    with profiler.stage('xtce_generator'):
+        run_xtce_generator(output_file, xtce_config_data, verbosity, xtce_output_path, get_cpu_id(module_dict))
+
+
+def build_module(config: SqueezerConfig, module_path: str, juicer_output_path: str, output_file: str,
+                 xtce_output_path: str, in_memory: bool, verbosity: str, profiler: stage_profiler.StageProfiler):
+    """
+    Runs every stage that comes after juicer for the module at module_path. See build_database and build_xtce.
+    :return:
+    """
+    build_database(config, module_path, juicer_output_path, output_file, in_memory, profiler)
+    build_xtce(config, module_path, output_file, xtce_output_path, verbosity, profiler)
+
+
+def get_juiced_path(state_path: str) -> str:
+    """
+    :param state_path: See stage_scheduler.StageScheduler.
+    :return: Where the juicer stage keeps the database exactly as juicer wrote it, next to the state of the stages, so
+    the stages after it can run again without running juicer again.
+    """
+    return os.path.splitext(state_path)[0] + '.juiced'
+
+
+@contextmanager
+def get_stage_files(args: argparse.Namespace):
+    """
+    Stage state is only kept when --stage_state is passed. Otherwise nothing is recorded, every stage runs, and the
+    database juicer writes is kept in a temporary directory that is removed once the stages are done.
+    :return: A (state path, juiced path) tuple. The state path is None when no state is kept; see get_juiced_path.
+    """
+    if args.stage_state is not None:
+        Path(args.stage_state).parent.mkdir(parents=True, exist_ok=True)
+        yield args.stage_state, get_juiced_path(args.stage_state)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='squeezer_stages_') as stage_dir:
+        yield None, os.path.join(stage_dir, 'juiced.sqlite')
+
+
+def get_database_config(module_dict: dict) -> dict:
+    """
+    :return: The part of the configuration of a module that the stages which modify the database depend on.
+    """
+    return {key: value for key, value in module_dict.items() if key != 'xtce_config'}
+
+
+def get_juicer_stage(elf_files: list, juiced_path: str, args: argparse.Namespace,
+                     profiler: stage_profiler.StageProfiler) -> stage_scheduler.Stage:
+    def run():
+        with profiler.stage('juicer'):
+            squeeze_files(elf_files, juiced_path, args.juicer_mode, args.verbosity, args.jobs, args.cache_dir,
+                          args.cache_size)
+
+    return stage_scheduler.Stage('juicer', run,
+                                 inputs=[stage_scheduler.FileInput(elf_file) for elf_file in elf_files] +
+                                        [stage_scheduler.FileInput(JUICER_PATH),
+                                         stage_scheduler.DataInput('juicer_mode', args.juicer_mode)],
+                                 outputs=[juiced_path])
+
+
+def copy_juiced_database(juiced_path: str, output_file: str, in_memory: bool) -> str:
+    """
+    Copies the database the juicer stage kept to where the stages after juicer expect it.
+    :return: See get_juicer_output_path.
+    """
+    juicer_output_path = get_juicer_output_path(output_file, in_memory)
+    shutil.copyfile(juiced_path, juicer_output_path)
+    return juicer_output_path
+
+
+def get_singleton_stages(config: SqueezerConfig, args: argparse.Namespace, juiced_path: str,
+                         profiler: stage_profiler.StageProfiler) -> list:
+    """
+    :param juiced_path: See get_stage_files.
+    :return: The stages of a singleton build of args.module_path, for stage_scheduler.
+    """
+    module_dict = config.get_module(args.module_path)
+    elf_files = get_existing_elf_files(get_elf_files(module_dict))
+
+    def run_database():
+        juicer_output_path = copy_juiced_database(juiced_path, args.output_file, args.in_memory)
+        build_database(config, args.module_path, juicer_output_path, args.output_file, args.in_memory, profiler)
+
+    def run_xtce():
+        build_xtce(config, args.module_path, args.output_file, args.xtce_output_path, args.verbosity, profiler)
+
+    return [get_juicer_stage(elf_files, juiced_path, args, profiler),
+            stage_scheduler.Stage('database', run_database,
+                                  inputs=[stage_scheduler.FileInput(juiced_path),
+                                          stage_scheduler.DataInput('module_path', args.module_path),
+                                          stage_scheduler.DataInput('module', get_database_config(module_dict)),
+                                          stage_scheduler.DataInput('in_memory', args.in_memory)],
+                                  outputs=[args.output_file]),
+            stage_scheduler.Stage('xtce', run_xtce,
+                                  inputs=[stage_scheduler.FileInput(args.output_file),
+                                          stage_scheduler.DataInput('xtce_config', module_dict.get('xtce_config')),
+                                          stage_scheduler.DataInput('cpu_id', get_cpu_id(module_dict))],
+                                  outputs=[args.xtce_output_path] if args.xtce_output_path else [])]
+
+
+def build_module_worker(config: SqueezerConfig, module_path: str, juicer_output_path: str, output_file: str,
+                        xtce_output_path: str, in_memory: bool, verbosity: str, profile: bool) -> list:
+    """
+    Runs build_module on a worker process.
+    :return: The stages recorded by the profiler of the worker.
+    """
+    set_log_level(verbosity)
+    profiler = stage_profiler.StageProfiler(profile)
+
+    build_module(config, module_path, juicer_output_path, output_file, xtce_output_path, in_memory, verbosity,
+                 profiler)
+
+    return profiler.stages
+
+
+def build_inline_database(config: SqueezerConfig, juicer_output_path: str, args: argparse.Namespace,
+                          profiler: stage_profiler.StageProfiler):
+    """
+    The inline counterpart of build_database; the remaps, sql entries and overrides come from the YAML files passed in
+    from the command line.
+    :return:
+    """
+    with profiler.stage('load_database'):
+        database = open_database(juicer_output_path, args.in_memory)
+
+    if args.remap_yaml:
+        with profiler.stage('remap_symbols'):
+            yaml_remaps_dict = read_yaml(args.remap_yaml)
+            yaml_remaps = __inline_get_remaps(yaml_remaps_dict)
+            if len(yaml_remaps['type_remaps']) > 0:
+                remap_symbols.remap_symbols(database, yaml_remaps['type_remaps'])
+            else:
+                logging.warning('No type_remaps configuration found. No remapping was done done.')
 
     if args.sql_yaml:
-        run_mod_sql(args.output_file, args.sql_yaml)
+        with profiler.stage('mod_sql'):
+            run_mod_sql(database, args.sql_yaml)
 
     if args.override_yaml:
-        run_msg_def_overrides(args.override_yaml, args.output_file)
+        with profiler.stage('msg_def_overrides'):
+            apply_msg_def_overrides(read_yaml(args.override_yaml), database)
+
+    with profiler.stage('write_database'):
+        sqlite_path = write_database(database, args.output_file)
+
+    # NOTE: tlm_cmd_merger only works on files, so it runs on the database after it has been written to disk.
+    with profiler.stage('merge_command_telemetry'):
+        merge_command_telemetry(config, args.module_path, sqlite_path)
+
+    commit_database(sqlite_path, args.output_file)
 
-    merge_command_telemetry(args.inline_yaml_path, args.output_file)
+
+def get_inline_stages(config: SqueezerConfig, args: argparse.Namespace, juiced_path: str,
+                      profiler: stage_profiler.StageProfiler) -> list:
+    """
+    :param juiced_path: See get_stage_files.
+    :return: The stages of an inline build, for stage_scheduler.
+    """
+    module_dict = config.get_module(args.module_path)
+    elf_files = get_existing_elf_files(get_elf_files(module_dict))
+
+    def run_database():
+        juicer_output_path = copy_juiced_database(juiced_path, args.output_file, args.in_memory)
+        build_inline_database(config, juicer_output_path, args, profiler)
+
+    def run_xtce():
+        with profiler.stage('xtce_generator'):
+            xtce_config_data = read_yaml(args.xtce_config_yaml)
+            run_xtce_generator(args.output_file, xtce_config_data, args.verbosity, args.xtce_output_path,
+                               xtce_config_data['root_spacesystem'])
+
+    database_inputs = [stage_scheduler.FileInput(juiced_path),
+                       stage_scheduler.DataInput('module_path', args.module_path),
+                       stage_scheduler.DataInput('module', get_database_config(module_dict)),
+                       stage_scheduler.DataInput('in_memory', args.in_memory)]
+    for yaml_path in [args.remap_yaml, args.sql_yaml, args.override_yaml]:
+        if yaml_path:
+            database_inputs.append(stage_scheduler.FileInput(yaml_path))
+
+    stages = [get_juicer_stage(elf_files, juiced_path, args, profiler),
+              stage_scheduler.Stage('database', run_database, inputs=database_inputs, outputs=[args.output_file])]
 
     if args.xtce_config_yaml:
-        xtce_config_data = read_yaml(args.xtce_config_yaml)
-        run_xtce_generator(args.output_file, xtce_config_data, args.verbosity, args.xtce_output_path,
-                           xtce_config_data['root_spacesystem'])
+        stages.append(stage_scheduler.Stage('xtce', run_xtce,
+                                            inputs=[stage_scheduler.FileInput(args.output_file),
+                                                    stage_scheduler.FileInput(args.xtce_config_yaml)],
+                                            outputs=[args.xtce_output_path] if args.xtce_output_path else []))
+
+    return stages
+
+
+def run_stages(stages: list, state_path: str, args: argparse.Namespace):
+    """
+    Runs stages with stage_scheduler, skipping those that are up to date.
+    :param stages:
+    :param state_path: See get_stage_files.
+    :param args:
+    :return:
+    """
+    build_juicer()
+    scheduler = stage_scheduler.StageScheduler(state_path, args.force)
+    scheduler.run(stages)
+
+
+def inline_mode_handler(args: argparse.Namespace):
+    set_log_level(args.verbosity)
+    logging.info('"inline" mode invoked.')
+    profiler = stage_profiler.StageProfiler(args.profile is not None)
+
+    with profiler.stage('read_config'):
+        config = SqueezerConfig.load(args.inline_yaml_path)
+
+    config.set_database(args.module_path, args.output_file)
+
+    with get_stage_files(args) as (state_path, juiced_path):
+        run_stages(get_inline_stages(config, args, juiced_path, profiler), state_path, args)
+
+    with profiler.stage('write_config'):
+        config.write()
 
-    set_module_by_path(args.module_path, module_dict, full_dict)
-        
-    yaml.dump(full_dict, open(args.inline_yaml_path, "w"))
+    if args.profile:
+        profiler.write_report(args.profile)
 
 
 def singleton_mode_handler(args: argparse.Namespace):
@@ -257,43 +635,282 @@ def singleton_mode_handler(args: argparse.Namespace):
     :return:
     """
     set_log_level(args.verbosity)
-    
-    full_dict = read_yaml(args.singleton_yaml_path)
-    
-    module_dict = get_module_by_path(args.module_path, full_dict)
-    
-    elfs = get_elf_files(module_dict)
+    profiler = stage_profiler.StageProfiler(args.profile is not None)
 
-    squeeze_files(elfs, args.output_file, args.juicer_mode, args.verbosity)
+    with profiler.stage('read_config'):
+        config = SqueezerConfig.load(args.singleton_yaml_path)
 
-    module_dict["db"] = dict()
-    module_dict["db"]["sqlite"] = args.output_file
- 
-    cpu_id = get_cpu_id(module_dict)
+    config.set_database(args.module_path, args.output_file)
 
-    yaml_remaps = __singleton_get_remap(module_dict)
+    with profiler.stage('write_config'):
+        config.write()
 
-    if len(yaml_remaps['type_remaps']) > 0:
-        remap_symbols.remap_symbols(args.output_file, yaml_remaps['type_remaps'])
-    else:
-        logging.warning('No type_remaps configuration found. No type_remapping was done done.')
-        
-    set_module_by_path(args.module_path, module_dict, full_dict)
-    
-    yaml.dump(full_dict, open(args.singleton_yaml_path, "w"))
+    with get_stage_files(args) as (state_path, juiced_path):
+        run_stages(get_singleton_stages(config, args, juiced_path, profiler), state_path, args)
 
-    run_msg_def_overrides(args.singleton_yaml_path, args.module_path, args.output_file)
-    
-    merge_command_telemetry(args.singleton_yaml_path, args.module_path, args.output_file)
+    if args.profile:
+        profiler.write_report(args.profile)
 
-    if 'xtce_config' in module_dict:
-        xtce_config_data = module_dict['xtce_config']
-    else:
-        logging.warning(f'The xtce configuration file "{args.singleton_yaml_path}" has no "xtce_config" key.'
-                        'No configuration will be applied when generating xtce file.')
-        xtce_config_data = None
 
-    run_xtce_generator(args.output_file, xtce_config_data, args.verbosity, args.xtce_output_path, cpu_id)
+def get_batch_targets(config: SqueezerConfig, module_paths: list, output_dir: str, in_memory: bool) -> list:
+    """
+    Sets the "db" entry of every module in module_paths and works out where each of them is built to.
+    :param config:
+    :param module_paths:
+    :param output_dir: The directory the database and XTCE file of every module are written to.
+    :param in_memory: See get_juicer_output_path.
+    :return: A list with one dictionary per module.
+    """
+    targets = []
+    for module_path in module_paths:
+        output_name = os.path.join(output_dir, module_path.strip('/').replace('/', '_'))
+        output_file = output_name + '.sqlite'
+
+        config.set_database(module_path, output_file)
+
+        targets.append({'module_path': module_path,
+                        'elf_files': get_existing_elf_files(get_elf_files(config.get_module(module_path))),
+                        'output_file': output_file,
+                        'juicer_output_path': get_juicer_output_path(output_file, in_memory),
+                        'xtce_output_path': output_name + '.xml'})
+
+    return targets
+
+
+def get_distinct_elf_files(targets: list) -> list:
+    elf_files = []
+    for target in targets:
+        elf_files += [elf_file for elf_file in target['elf_files'] if elf_file not in elf_files]
+
+    return elf_files
+
+
+def merge_target_shards(target: dict, elf_shards: dict):
+    """
+    Merges the shards of the elf files of target into the database juicer would have written for it.
+    :param target: See get_batch_targets.
+    :param elf_shards: The shard of every elf file.
+    :return:
+    """
+    logging.info(f'Merging shards of "{target["module_path"]}"...')
+    subprocess.run(['rm', '-f', target['juicer_output_path']])
+    shard_merger.merge_shards([elf_shards[elf_file] for elf_file in target['elf_files']],
+                              target['juicer_output_path'])
+
+
+def build_targets(config: SqueezerConfig, targets: list, in_memory: bool, verbosity: str,
+                  profiler: stage_profiler.StageProfiler):
+    """
+    Runs build_module on every target concurrently, one process per target.
+    :return:
+    """
+    with ProcessPoolExecutor(max_workers=len(targets)) as pool:
+        builds = [pool.submit(build_module_worker, config, target['module_path'], target['juicer_output_path'],
+                              target['output_file'], target['xtce_output_path'], in_memory, verbosity,
+                              profiler.enabled)
+                  for target in targets]
+
+        for target, build in zip(targets, builds):
+            profiler.add_stages(build.result(), target['module_path'] + '/')
+
+
+def batch_mode_handler(args: argparse.Namespace):
+    """
+    The batch mode builds the database and XTCE file of several modules(such as "cpd", "ppd" and "simlink") in one
+    invocation. The configuration is read once and every distinct elf file is squeezed once, even when it is shared by
+    several modules. The stages that come after juicer run concurrently, one process per module.
+    This function is invoked when the "batch" argument is passed in from the command line.
+    :param args:
+    :return:
+    """
+    set_log_level(args.verbosity)
+    profiler = stage_profiler.StageProfiler(args.profile is not None)
+
+    with profiler.stage('read_config'):
+        config = SqueezerConfig.load(args.singleton_yaml_path)
+
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    targets = get_batch_targets(config, args.module_paths, args.output_dir, args.in_memory)
+
+    with profiler.stage('juicer'):
+        build_juicer()
+        cache = get_juicer_cache(args.cache_dir, args.cache_size)
+
+        elf_files = get_distinct_elf_files(targets)
+
+        logging.info('Squeezing files...')
+        with tempfile.TemporaryDirectory(prefix='squeezer_shards_') as shard_dir:
+            elf_shards = dict(zip(elf_files, squeeze_shards(elf_files, shard_dir, args.juicer_mode, args.verbosity,
+                                                            args.jobs, cache)))
+
+            for target in targets:
+                merge_target_shards(target, elf_shards)
+
+    with profiler.stage('write_config'):
+        config.write()
+
+    build_targets(config, targets, args.in_memory, args.verbosity, profiler)
+
+    if args.profile:
+        profiler.write_report(args.profile)
+
+
+class WatchSession:
+    def __init__(self, args: argparse.Namespace, shard_dir: str):
+        """
+        The state watch mode keeps between rebuilds: the parsed configuration, one shard database per elf
+        file(see squeeze_shards) and the watcher of the configuration and the elf files. When an elf file changes only
+        its shard is squeezed again; the shards of every other elf file are merged as they are.
+        The watcher is created before anything is read, so files that change while a rebuild, including the first one,
+        reads them are rebuilt again afterwards.
+        :param args: The arguments of the "watch" mode.
+        :param shard_dir: Where the shards are kept. It is owned by the caller.
+        """
+        self.args = args
+        self.shard_dir = shard_dir
+        self.config = None
+        self.targets = []
+        self.elf_shards = {}
+        # Modules whose last rebuild did not finish. They are rebuilt along with whatever changes next.
+        self.stale_module_paths = set()
+        self.cache = get_juicer_cache(args.cache_dir, args.cache_size)
+        self.watcher = file_watcher.FileWatcher([args.singleton_yaml_path], args.poll_interval)
+
+    def get_watched_paths(self) -> list:
+        return [self.args.singleton_yaml_path] + get_distinct_elf_files(self.targets)
+
+    def load_config(self) -> list:
+        """
+        Reads the configuration again.
+        :return: The targets whose configuration or elf files changed since the configuration was last read. Every
+        target on the first call.
+        """
+        old_targets = {target['module_path']: (target, self.config.get_module(target['module_path']))
+                       for target in self.targets}
+
+        self.config = SqueezerConfig.load(self.args.singleton_yaml_path)
+        self.targets = get_batch_targets(self.config, self.args.module_paths, self.args.output_dir,
+                                         self.args.in_memory)
+
+        changed_targets = []
+        for target in self.targets:
+            if target['module_path'] not in old_targets:
+                changed_targets.append(target)
+                continue
+
+            old_target, old_module_dict = old_targets[target['module_path']]
+            if old_target['elf_files'] != target['elf_files'] or \
+                    old_module_dict != self.config.get_module(target['module_path']):
+                changed_targets.append(target)
+
+        return changed_targets
+
+    def squeeze(self, elf_files: list):
+        """
+        Squeezes elf_files into new shards, replacing the shards they had.
+        :param elf_files:
+        :return:
+        """
+        if not elf_files:
+            return
+
+        logging.info('Squeezing files...')
+        round_dir = tempfile.mkdtemp(dir=self.shard_dir)
+        shard_paths = squeeze_shards(elf_files, round_dir, self.args.juicer_mode, self.args.verbosity, self.args.jobs,
+                                     self.cache)
+
+        for elf_file, shard_path in zip(elf_files, shard_paths):
+            if elf_file in self.elf_shards:
+                os.remove(self.elf_shards[elf_file])
+            self.elf_shards[elf_file] = shard_path
+
+    def rebuild(self, changed_paths: set, profiler: stage_profiler.StageProfiler) -> list:
+        """
+        Runs only the stages that changed_paths affect, and only for the modules they affect.
+        :param changed_paths: The files that changed. Every module is considered changed when this is None.
+        :param profiler:
+        :return: The targets that were rebuilt.
+        """
+        changed_targets = []
+        if changed_paths is None or self.args.singleton_yaml_path in changed_paths:
+            with profiler.stage('read_config'):
+                changed_targets = self.load_config()
+            # Elf files that are new to the watcher are seen as they are before they are squeezed.
+            self.watcher.set_paths(self.get_watched_paths())
+
+        elf_files = get_distinct_elf_files(self.targets)
+        changed_elf_files = [elf_file for elf_file in elf_files
+                             if elf_file not in self.elf_shards or (changed_paths and elf_file in changed_paths)]
+
+        with profiler.stage('juicer'):
+            self.squeeze(changed_elf_files)
+
+        changed_targets += [target for target in self.targets
+                            if target not in changed_targets and (set(target['elf_files']) & set(changed_elf_files) or
+                                                                  target['module_path'] in self.stale_module_paths)]
+
+        if not changed_targets:
+            logging.info('No module is affected by the changes.')
+            return changed_targets
+
+        self.stale_module_paths.update(target['module_path'] for target in changed_targets)
+
+        with profiler.stage('juicer'):
+            for target in changed_targets:
+                merge_target_shards(target, self.elf_shards)
+
+        with profiler.stage('write_config'):
+            self.config.write()
+            # Writing the "db" entries to the configuration is not a change made by the user, but any change made after
+            # it is.
+            self.watcher.mark_seen(self.args.singleton_yaml_path,
+                                   file_watcher.get_file_stat(self.args.singleton_yaml_path))
+
+        build_targets(self.config, changed_targets, self.args.in_memory, self.args.verbosity, profiler)
+
+        self.stale_module_paths.clear()
+
+        return changed_targets
+
+
+def watch_mode_handler(args: argparse.Namespace):
+    """
+    The watch mode builds the same modules batch mode does and then keeps watching the elf files of those modules and
+    the configuration. When any of them changes, only the modules affected by the change are built again. Elf files
+    that did not change are not squeezed again.
+    This function is invoked when the "watch" argument is passed in from the command line.
+    :param args:
+    :return:
+    """
+    set_log_level(args.verbosity)
+
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    build_juicer()
+
+    with tempfile.TemporaryDirectory(prefix='squeezer_shards_') as shard_dir:
+        session = WatchSession(args, shard_dir)
+        changed_paths = None
+
+        try:
+            while True:
+                profiler = stage_profiler.StageProfiler(args.profile is not None)
+                try:
+                    rebuilt_targets = session.rebuild(changed_paths, profiler)
+                    logging.info(f'Rebuilt {[target["module_path"] for target in rebuilt_targets]}.')
+                except Exception as error:
+                    if session.config is None:
+                        raise
+                    # Keep watching; the next change might very well fix whatever went wrong, such as a half-written
+                    # elf file or a typo in the configuration.
+                    logging.error(f'Rebuild failed: {error}')
+
+                if args.profile:
+                    profiler.write_report(args.profile)
+
+                changed_paths = session.watcher.wait()
+        except KeyboardInterrupt:
+            logging.info('Stopped watching.')
 
 
 def parse_cli() -> argparse.Namespace:
@@ -303,26 +920,60 @@ def parse_cli() -> argparse.Namespace:
     """
     parser = argparse.ArgumentParser(add_help=False)
 
-    parent_parser = argparse.ArgumentParser(add_help=False)
+    common_parser = argparse.ArgumentParser(add_help=False)
 
-    parent_parser.add_argument('--juicer_mode', type=str, default='SQLITE', choices=['SQLITE'],
+    common_parser.add_argument('--juicer_mode', type=str, default='SQLITE', choices=['SQLITE'],
                                help='The mode which to run juicer on')
 
+    common_parser.add_argument('--verbosity', type=str, default='0', choices=['0', '1', '2', '3', '4'],
+                               help='[(0=SILENT), (1=ERRORS), (2=WARNINGS), (3=INFO), (4=DEBUG)]')
+
+    common_parser.add_argument('--jobs', type=int, default=1,
+                               help='The number of juicer processes to run in parallel. When greater than 1, every elf '
+                                    'file is squeezed into its own shard database and the shards are merged into '
+                                    'the output file at the end.')
+
+    common_parser.add_argument('--cache_dir', '--cache-dir', type=str, default=None,
+                               help='A directory where juicer output is cached across runs. Elf files that have not '
+                                    'changed since they were last squeezed are pulled from the cache instead of '
+                                    'being parsed by juicer again.')
+
+    common_parser.add_argument('--cache_size', type=int, default=2048,
+                               help='The size limit of the juicer cache in megabytes. The least recently used entries '
+                                    'are evicted first.')
+
+    common_parser.add_argument('--in_memory', action='store_true',
+                               help='Load the database written by juicer into memory and run every stage against it. '
+                                    'The database is written to --output_file once, at the end of the run, and is '
+                                    'replaced atomically.')
+
+    common_parser.add_argument('--profile', type=str, default=None,
+                               help='Write a JSON report to this file with the wall time, CPU time, peak RSS and number '
+                                    'of SQLite statements of every stage of the run.')
+
+    parent_parser = argparse.ArgumentParser(add_help=False, parents=[common_parser])
+
     parent_parser.add_argument('--output_file', type=str, default='newdb.sqlite',
                                help='The output file juicer will write to; the database.', required=True)
 
-    parent_parser.add_argument('--verbosity', type=str, default='0', choices=['0', '1', '2', '3', '4'],
-                               help='[(0=SILENT), (1=ERRORS), (2=WARNINGS), (3=INFO), (4=DEBUG)]')
-
     parent_parser.add_argument('--xtce_output_path', type=str, default=None,
                                help='The output path where to write the output XTCE to.')
 
     parent_parser.add_argument('--module_path', type=str, default=None,
                                help='The path of the module to parse, i.e. "cpd", "ppd", "simlink", or "reference".')
 
+    parent_parser.add_argument('--stage_state', type=str, default=None,
+                               help='The file where the inputs and outputs of every stage are recorded. Stages whose '
+                                    'inputs and outputs have not changed since the last run are skipped. The database '
+                                    'juicer writes is kept next to it. Nothing is recorded, and every stage runs, if '
+                                    'this is not passed.')
+
+    parent_parser.add_argument('--force', action='store_true',
+                               help='Run every stage, even those that are up to date.')
+
     subparsers = parser.add_subparsers(
         description='Mode to run squeezer.',
-        dest='inline | singleton',
+        dest='inline | singleton | batch | watch',
         help='Pass a single YAML or invoke each tool separately.'
     )
 
@@ -337,9 +988,23 @@ def parse_cli() -> argparse.Namespace:
         help='Run invoking every tool individually. Can provide flexibility in some cases.',
         parents=[parent_parser]
     )
+
+    batch_parser = subparsers.add_parser(
+        'batch',
+        help='Run using a single YAML file for several modules at once.',
+        parents=[common_parser]
+    )
     singleton_parser.set_defaults(func=singleton_mode_handler)
     inline_parser.set_defaults(func=inline_mode_handler)
 
+    watch_parser = subparsers.add_parser(
+        'watch',
+        help='Like batch, but keep watching the elf files and the YAML file and rebuild whenever they change.',
+        parents=[common_parser]
+    )
+    batch_parser.set_defaults(func=batch_mode_handler)
+    watch_parser.set_defaults(func=watch_mode_handler)
+
     inline_parser.add_argument('--inline_yaml_path', type=str, required=True,
                                help='The yaml_path that will be passed to tlm_cmd_merger.py. '
                                     'This script uses this config file '
@@ -365,6 +1030,28 @@ def parse_cli() -> argparse.Namespace:
     singleton_parser.add_argument('--singleton_yaml_path', type=str, required=True, help='A single YAML file that '
                                                                                          'has everything auto-yamcs needs.')
 
+    batch_parser.add_argument('--singleton_yaml_path', type=str, required=True, help='A single YAML file that '
+                                                                                     'has everything auto-yamcs needs.')
+
+    batch_parser.add_argument('--module_paths', type=str, nargs='+', required=True,
+                              help='The paths of the modules to build, i.e. "cpd ppd simlink".')
+
+    batch_parser.add_argument('--output_dir', type=str, default='.',
+                              help='The directory where the database and XTCE file of every module are written to. '
+                                   'They are named after the module; "cpd.sqlite" and "cpd.xml" for "cpd".')
+
+    watch_parser.add_argument('--singleton_yaml_path', type=str, required=True, help='A single YAML file that '
+                                                                                     'has everything auto-yamcs needs.')
+
+    watch_parser.add_argument('--module_paths', type=str, nargs='+', required=True,
+                              help='The paths of the modules to build, i.e. "cpd ppd simlink".')
+
+    watch_parser.add_argument('--output_dir', type=str, default='.',
+                              help='The directory where the database and XTCE file of every module are written to.')
+
+    watch_parser.add_argument('--poll_interval', type=float, default=1.0,
+                              help='How often, in seconds, the elf files and the YAML file are checked for changes.')
+
     return parser.parse_args()
 
 
@@ -378,7 +1065,7 @@ def main():
         args.func(args)
 
     else:
-        print('A mode must be passed:{"inline", "singleton"}')
+        print('A mode must be passed:{"inline", "singleton", "batch", "watch"}')
 
 
 if __name__ == '__main__':
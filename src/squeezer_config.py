@@ -0,0 +1,82 @@
+"""
+The configuration squeezer runs on. The configuration is parsed once and the same object is handed to every stage,
+instead of every stage parsing the YAML file on its own. Parsing is done with the libyaml-backed loader when PyYAML
+was built with it, which is several times faster than the pure-python loader on configuration files as big as ours.
+"""
+import logging
+import yaml
+
+YamlLoader = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+YamlDumper = getattr(yaml, 'CDumper', yaml.Dumper)
+
+
+def read_yaml(yaml_file: str) -> dict:
+    with open(yaml_file, 'r') as f:
+        yaml_data = yaml.load(f, Loader=YamlLoader)
+    return yaml_data
+
+
+def write_yaml(yaml_data: dict, yaml_file: str):
+    with open(yaml_file, 'w') as f:
+        yaml.dump(yaml_data, f, Dumper=YamlDumper)
+
+
+def get_module_by_path(module_path: str, yaml_data: dict):
+    module_yaml_dict = yaml_data
+
+    for module_name in module_path.split("/"):
+        if module_name != "":
+            if "modules" in module_yaml_dict:
+                if module_name not in module_yaml_dict["modules"]:
+                    logging.error('"{0}" is not found. Aborting'.format(module_name))
+                    exit(-1)
+                else:
+                    module_yaml_dict = module_yaml_dict["modules"][module_name]
+            else:
+                logging.error('"{0}" is not found. Aborting'.format(module_name))
+                exit(-1)
+
+    return module_yaml_dict
+
+
+class SqueezerConfig:
+    def __init__(self, path: str, data: dict):
+        """
+        :param path: The file the configuration was read from. This is where write() writes to.
+        :param data: The parsed configuration.
+        """
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        :param path:
+        :return: The configuration in the YAML file at path.
+        """
+        return cls(path, read_yaml(path))
+
+    def get_module(self, module_path: str) -> dict:
+        """
+        :param module_path: A path such as "cpd" or "cpd/apps".
+        :return: The configuration of the module at module_path.
+        """
+        return get_module_by_path(module_path, self.data)
+
+    def set_database(self, module_path: str, sqlite_path: str):
+        """
+        Records the database of the module at module_path in the configuration. Call write() for other tools to see it.
+        :param module_path:
+        :param sqlite_path:
+        :return:
+        """
+        module_dict = self.get_module(module_path)
+        module_dict["db"] = dict()
+        module_dict["db"]["sqlite"] = sqlite_path
+
+    def write(self):
+        """
+        Writes the configuration back to the file it was read from.
+        :return:
+        """
+        write_yaml(self.data, self.path)
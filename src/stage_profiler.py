@@ -0,0 +1,202 @@
+"""
+Records how long each stage of the squeezer pipeline takes and what it costs. For every stage the profiler records
+wall time, CPU time(of this process and of child processes such as juicer), peak RSS and the number of SQLite
+statements that were executed.
+Peak RSS is the high-water mark the operating system keeps for the whole life of a process, which cannot be reset for a
+single stage portably. process_peak_rss_kb and largest_child_peak_rss_kb are those marks when the stage ends, so every
+stage after the heaviest one repeats its value. peak_rss_growth_kb is how much the stage raised the mark of this
+process: stages that stay under the memory of earlier stages report 0, and the stage that sets the peak reports how
+much memory it took beyond them. The report is written as JSON with a versioned, stable layout so runs can be compared
+across builds.
+Stages may run concurrently on several threads; SQLite statements are counted towards the stage of the thread that
+executes them. CPU time and peak RSS are measured for the whole process, so those of concurrent stages overlap.
+"""
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # resource is only available on Unix.
+    resource = None
+
+"""
+Bump this whenever the layout of the report changes, so tools that track reports across builds can tell.
+"""
+REPORT_FORMAT_VERSION = 2
+
+STAGE_METRICS = ('wall_time_s', 'cpu_time_s', 'children_cpu_time_s', 'process_peak_rss_kb', 'peak_rss_growth_kb',
+                 'largest_child_peak_rss_kb', 'sql_statements')
+
+"""
+The metrics whose total is their largest value across stages. The total of every other metric is its sum.
+"""
+MAX_METRICS = {'process_peak_rss_kb', 'largest_child_peak_rss_kb'}
+
+
+def get_resource_usage(children: bool = False) -> tuple:
+    """
+    :param children: If True, the usage of the child processes that have been waited for is returned instead of the
+    usage of this process.
+    :return: A (cpu_time_s, peak_rss_kb) tuple. peak_rss_kb is the high-water mark of the resident set of the
+    process over its whole life, or of the largest child process. Both are None if the resource module is not
+    available.
+    """
+    if resource is None:
+        return None, None
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    peak_rss_kb = usage.ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else.
+    if sys.platform == 'darwin':
+        peak_rss_kb //= 1024
+
+    return usage.ru_utime + usage.ru_stime, peak_rss_kb
+
+
+def subtract(end, start):
+    if end is None or start is None:
+        return None
+    return end - start
+
+
+class StageProfiler:
+    def __init__(self, enabled: bool = True):
+        """
+        :param enabled: When False, stage() does not record anything. This keeps call sites free of
+        "if profiling" checks.
+        """
+        self.enabled = enabled
+        self.stages = []
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__connect = None
+        self.__tracing_count = 0
+
+    def __get_active_stages(self) -> list:
+        """
+        :return: The stages that are running on the calling thread, innermost last.
+        """
+        if not hasattr(self.__local, 'active_stages'):
+            self.__local.active_stages = []
+        return self.__local.active_stages
+
+    def __count_statement(self, statement: str):
+        active_stages = self.__get_active_stages()
+        if active_stages:
+            with self.__lock:
+                active_stages[-1]['sql_statements'] += 1
+
+    def trace(self, db_handle: sqlite3.Connection):
+        """
+        Counts the statements executed on db_handle towards whichever stage is running when they are executed.
+        Connections that are opened inside of a stage are traced automatically; this is only needed for connections
+        that are opened before the stage that uses them.
+        :param db_handle:
+        :return:
+        """
+        if self.enabled:
+            db_handle.set_trace_callback(self.__count_statement)
+
+    @contextmanager
+    def __trace_new_connections(self):
+        # sqlite3.connect is patched once for however many stages run at the same time, and is restored when the last
+        # of them is done.
+        with self.__lock:
+            if self.__tracing_count == 0:
+                connect = sqlite3.connect
+                self.__connect = connect
+
+                def traced_connect(*args, **kwargs):
+                    db_handle = connect(*args, **kwargs)
+                    self.trace(db_handle)
+                    return db_handle
+
+                sqlite3.connect = traced_connect
+            self.__tracing_count += 1
+        try:
+            yield
+        finally:
+            with self.__lock:
+                self.__tracing_count -= 1
+                if self.__tracing_count == 0:
+                    sqlite3.connect = self.__connect
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profiles everything that runs inside of the with block as the stage called name.
+        :param name:
+        :return:
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = {'name': name, 'sql_statements': 0}
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        children_cpu_start, _ = get_resource_usage(children=True)
+        _, peak_rss_start_kb = get_resource_usage()
+
+        active_stages = self.__get_active_stages()
+        active_stages.append(record)
+        try:
+            if len(active_stages) == 1:
+                with self.__trace_new_connections():
+                    yield
+            else:
+                yield
+        finally:
+            active_stages.pop()
+
+            _, peak_rss_kb = get_resource_usage()
+            children_cpu_end, children_peak_rss_kb = get_resource_usage(children=True)
+            record['wall_time_s'] = time.perf_counter() - wall_start
+            record['cpu_time_s'] = time.process_time() - cpu_start
+            record['children_cpu_time_s'] = subtract(children_cpu_end, children_cpu_start)
+            record['process_peak_rss_kb'] = peak_rss_kb
+            record['peak_rss_growth_kb'] = subtract(peak_rss_kb, peak_rss_start_kb)
+            record['largest_child_peak_rss_kb'] = children_peak_rss_kb
+            self.stages.append(record)
+
+            logging.info(f'Stage "{name}" took {record["wall_time_s"]:.3f}s.')
+
+    def add_stages(self, stages: list, prefix: str = ''):
+        """
+        Adds stages recorded by another profiler, such as one on a worker process.
+        :param stages: The stages attribute of the other profiler.
+        :param prefix: Prepended to the name of every stage.
+        :return:
+        """
+        if self.enabled:
+            for stage in stages:
+                self.stages.append(dict(stage, name=prefix + stage['name']))
+
+    def get_report(self) -> dict:
+        stages = [dict({'name': stage['name']}, **{metric: stage[metric] for metric in STAGE_METRICS})
+                  for stage in self.stages]
+
+        total = {}
+        for metric in STAGE_METRICS:
+            values = [stage[metric] for stage in stages if stage[metric] is not None]
+            if metric in MAX_METRICS:
+                total[metric] = max(values) if values else None
+            else:
+                total[metric] = sum(values) if values else None
+
+        return {'format_version': REPORT_FORMAT_VERSION,
+                'stages': stages,
+                'total': total}
+
+    def write_report(self, report_path: str):
+        with open(report_path, 'w') as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+            report_file.write('\n')
+
+        logging.info(f'Profile report has been written to "{report_path}".')
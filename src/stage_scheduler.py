@@ -0,0 +1,198 @@
+"""
+Runs the stages of a squeezer build as a graph instead of as a fixed sequence of calls. Every stage declares what it
+consumes(files such as elf files and databases, and data such as a subtree of the configuration) and which files it
+produces. A stage that consumes a file another stage produces runs after that stage. Stages run one at a time; the
+builds squeezer runs as stages are chains, where every stage needs the output of the one before it.
+
+The fingerprints of the inputs and outputs of every stage are recorded in a JSON state file when the stage finishes. On
+the next run a stage whose inputs and outputs still have the same fingerprints is skipped.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import juicer_cache
+
+"""
+Bump this whenever the layout of the state file changes. State files of another version are ignored.
+"""
+STATE_FORMAT_VERSION = 1
+
+
+class FileInput:
+    def __init__(self, path: str):
+        """
+        A file a stage reads. Its fingerprint is the hash of its contents.
+        :param path:
+        """
+        self.path = path
+        self.key = 'file:' + os.path.realpath(path)
+
+    def get_fingerprint(self):
+        """
+        :return: The hash of the file. None if the file does not exist.
+        """
+        return get_file_fingerprint(self.path)
+
+
+class DataInput:
+    def __init__(self, name: str, data):
+        """
+        Data a stage reads, such as a subtree of the configuration. Its fingerprint is the hash of its JSON encoding.
+        :param name: Must be unique among the inputs of a stage.
+        :param data: Anything that can be encoded to JSON. Anything else is encoded with str().
+        """
+        self.data = data
+        self.key = 'data:' + name
+
+    def get_fingerprint(self):
+        return hashlib.sha256(json.dumps(self.data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_file_fingerprint(path: str):
+    if not os.path.isfile(path):
+        return None
+    return juicer_cache.hash_file(path).hexdigest()
+
+
+class Stage:
+    def __init__(self, name: str, run, inputs: list = (), outputs: list = ()):
+        """
+        :param name: Must be unique among the stages of a run; the state of the stage is recorded under it.
+        :param run: A callable that takes no arguments.
+        :param inputs: FileInput and DataInput objects.
+        :param outputs: The paths of the files the stage writes.
+        """
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
+def get_dependencies(stages: list) -> dict:
+    """
+    :param stages:
+    :return: A dictionary with the names of the stages every stage depends on, keyed by the name of the stage.
+    """
+    producers = {}
+    for stage in stages:
+        for output_path in stage.outputs:
+            producers[os.path.realpath(output_path)] = stage.name
+
+    dependencies = {}
+    for stage in stages:
+        dependencies[stage.name] = set()
+        for stage_input in stage.inputs:
+            if isinstance(stage_input, FileInput):
+                producer = producers.get(os.path.realpath(stage_input.path))
+                if producer is not None and producer != stage.name:
+                    dependencies[stage.name].add(producer)
+
+    return dependencies
+
+
+class StageScheduler:
+    def __init__(self, state_path: str = None, force: bool = False):
+        """
+        :param state_path: The JSON file where the fingerprints of every stage are recorded. If None, nothing is
+        recorded and every stage runs.
+        :param force: Run every stage, even those that are up to date.
+        """
+        self.state_path = state_path
+        self.force = force
+        self.__state = self.__read_state()
+
+    def __read_state(self) -> dict:
+        if self.state_path is None or not os.path.isfile(self.state_path):
+            return {}
+
+        try:
+            with open(self.state_path, 'r') as state_file:
+                state = json.load(state_file)
+        except ValueError:
+            logging.warning(f'"{self.state_path}" is not a valid state file. Every stage will run.')
+            return {}
+
+        if state.get('format_version') != STATE_FORMAT_VERSION:
+            return {}
+
+        return state['stages']
+
+    def __write_state(self):
+        if self.state_path is None:
+            return
+
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as state_file:
+            json.dump({'format_version': STATE_FORMAT_VERSION, 'stages': self.__state}, state_file, indent=2,
+                      sort_keys=True)
+            state_file.write('\n')
+        os.replace(temp_path, self.state_path)
+
+    @staticmethod
+    def get_fingerprints(stage: Stage) -> dict:
+        return {'inputs': {stage_input.key: stage_input.get_fingerprint() for stage_input in stage.inputs},
+                'outputs': {os.path.realpath(output_path): get_file_fingerprint(output_path)
+                            for output_path in stage.outputs}}
+
+    def is_up_to_date(self, stage: Stage, fingerprints: dict) -> bool:
+        """
+        :param stage:
+        :param fingerprints: See get_fingerprints.
+        :return: True if stage ran before with these same inputs and its outputs have not changed since.
+        """
+        if self.force or stage.name not in self.__state:
+            return False
+
+        if None in fingerprints['outputs'].values():
+            return False
+
+        return self.__state[stage.name] == fingerprints
+
+    def __run_stage(self, stage: Stage) -> bool:
+        """
+        :return: True if stage ran, False if it was skipped.
+        """
+        fingerprints = self.get_fingerprints(stage)
+        if self.is_up_to_date(stage, fingerprints):
+            logging.info(f'Stage "{stage.name}" is up to date.')
+            return False
+
+        # If the stage fails, it must run again next time even if its inputs are the same.
+        if self.__state.pop(stage.name, None) is not None:
+            self.__write_state()
+
+        stage.run()
+
+        fingerprints['outputs'] = self.get_fingerprints(stage)['outputs']
+        self.__state[stage.name] = fingerprints
+        self.__write_state()
+
+        return True
+
+    def run(self, stages: list) -> dict:
+        """
+        Runs every stage in stages that is not up to date, after the stages it depends on. Stages that do not depend on
+        each other run in the order they are given. If a stage fails, the error is raised and no other stage runs.
+        :param stages:
+        :return: A dictionary that tells whether every stage ran(True) or was skipped(False), keyed by its name.
+        """
+        dependencies = get_dependencies(stages)
+        pending = {stage.name: stage for stage in stages}
+        results = {}
+
+        while pending:
+            ready = [stage for name, stage in pending.items() if dependencies[name].issubset(results.keys())]
+            if not ready:
+                raise ValueError(f'The stages {sorted(pending.keys())} depend on each other.')
+
+            for stage in ready:
+                del pending[stage.name]
+                try:
+                    results[stage.name] = self.__run_stage(stage)
+                except Exception:
+                    logging.error(f'Stage "{stage.name}" failed.')
+                    raise
+
+        return results
@@ -0,0 +1,294 @@
+"""
+Generates synthetic databases with the same schema juicer and tlm_cmd_merger write, at any scale. This way the tools
+that work on the database can be tested and benchmarked without an airliner build or the juicer submodule.
+
+The database looks like a small airliner build: a handful of apps, each with telemetry and command messages made up of
+intrinsic types, enumerations, strings and nested structures. Every message starts with a CCSDS header, so the ds logs
+written by generate_ds_file can be parsed by log_parser.py.
+"""
+import argparse
+import logging
+import math
+import os
+import random
+import sqlite3
+import struct
+
+SCHEMA = [
+    'CREATE TABLE elfs(id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, checksum TEXT NOT NULL, '
+    'date DATETIME, little_endian BOOLEAN NOT NULL)',
+    'CREATE TABLE symbols(id INTEGER PRIMARY KEY, elf INTEGER NOT NULL, name TEXT UNIQUE NOT NULL, '
+    'byte_size INTEGER NOT NULL, FOREIGN KEY (elf) REFERENCES elfs(id))',
+    'CREATE TABLE fields(id INTEGER PRIMARY KEY, symbol INTEGER NOT NULL, name TEXT NOT NULL, byte_offset INTEGER, '
+    'type INTEGER NOT NULL, multiplicity INTEGER NOT NULL, little_endian BOOLEAN, bit_size INTEGER, '
+    'bit_offset INTEGER, UNIQUE (symbol, name), FOREIGN KEY (symbol) REFERENCES symbols(id), '
+    'FOREIGN KEY (type) REFERENCES symbols(id))',
+    'CREATE TABLE enumerations(symbol INTEGER NOT NULL, value INTEGER NOT NULL, name TEXT NOT NULL, '
+    'PRIMARY KEY (symbol, name), FOREIGN KEY (symbol) REFERENCES symbols(id))',
+    'CREATE TABLE modules(id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)',
+    'CREATE TABLE telemetry(id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, message_id INTEGER NOT NULL, '
+    'macro TEXT, symbol INTEGER NOT NULL, module INTEGER NOT NULL, FOREIGN KEY (symbol) REFERENCES symbols(id), '
+    'FOREIGN KEY (module) REFERENCES modules(id))',
+    'CREATE TABLE commands(id INTEGER PRIMARY KEY, name TEXT NOT NULL, command_code INTEGER NOT NULL, '
+    'message_id INTEGER NOT NULL, macro TEXT, symbol INTEGER NOT NULL, module INTEGER NOT NULL, '
+    'FOREIGN KEY (symbol) REFERENCES symbols(id), FOREIGN KEY (module) REFERENCES modules(id))',
+    'CREATE TABLE events(id INTEGER PRIMARY KEY, event_id INTEGER NOT NULL, name TEXT NOT NULL, '
+    'module INTEGER NOT NULL, FOREIGN KEY (module) REFERENCES modules(id))',
+    'CREATE TABLE configurations(id INTEGER PRIMARY KEY, name TEXT NOT NULL, value INTEGER, '
+    'module INTEGER NOT NULL, FOREIGN KEY (module) REFERENCES modules(id))',
+]
+
+ELF_NAME = '/synthetic/build/target/exe/airliner'
+
+"""
+The intrinsic types of the payload of every message, along with their size. int64 is left out because log_parser.py
+maps it to a format character that is only 4 bytes long.
+"""
+INTRINSIC_TYPES = [('uint8', 1), ('int8', 1), ('uint16', 2), ('int16', 2), ('uint32', 4), ('int32', 4),
+                   ('uint64', 8), ('float', 4), ('double', 8)]
+
+TELEMETRY_HEADER_SIZE = 12
+COMMAND_HEADER_SIZE = 8
+STRING_SIZE = 16
+MESSAGES_PER_APP = 10
+MIN_FIELDS_PER_MESSAGE = 20
+# Message ids are 11 bits; this keeps every telemetry message on its own message id.
+MAX_MESSAGES = 2000
+
+"""
+The structures at the start of every ds log, in order, and their size.
+"""
+DS_FILE_HEADERS = [('CFE_FS_Header_t', 64), ('DS_FileHeader_t', 76)]
+
+
+class SyntheticDatabase:
+    def __init__(self, db_handle: sqlite3.Connection):
+        self.db_handle = db_handle
+        self.elf_id = None
+        self.symbol_ids = {}
+        self.symbol_sizes = {}
+        self.fields = []
+        self.field_count = 0
+
+    def add_symbol(self, name: str, byte_size: int) -> int:
+        symbol_id = len(self.symbol_ids) + 1
+        self.db_handle.execute('INSERT INTO symbols(id, elf, name, byte_size) VALUES(?, ?, ?, ?)',
+                               (symbol_id, self.elf_id, name, byte_size))
+        self.symbol_ids[name] = symbol_id
+        self.symbol_sizes[name] = byte_size
+        return symbol_id
+
+    def add_field(self, symbol: str, name: str, byte_offset: int, type_name: str, multiplicity: int = 0):
+        self.field_count += 1
+        self.fields.append((self.field_count, self.symbol_ids[symbol], name, byte_offset, self.symbol_ids[type_name],
+                            multiplicity, 1, 0, 0))
+        if len(self.fields) >= 10000:
+            self.flush_fields()
+
+    def flush_fields(self):
+        self.db_handle.executemany('INSERT INTO fields(id, symbol, name, byte_offset, type, multiplicity, '
+                                   'little_endian, bit_size, bit_offset) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   self.fields)
+        self.fields = []
+
+    def add_struct(self, name: str, members: list) -> int:
+        """
+        Adds a packed structure.
+        :param name:
+        :param members: A list of (name, type_name, multiplicity) tuples.
+        :return: The size of the structure.
+        """
+        byte_offset = 0
+        for member_name, type_name, multiplicity in members:
+            byte_offset += self.symbol_sizes[type_name] * max(multiplicity, 1)
+
+        self.add_symbol(name, byte_offset)
+
+        byte_offset = 0
+        for member_name, type_name, multiplicity in members:
+            self.add_field(name, member_name, byte_offset, type_name, multiplicity)
+            byte_offset += self.symbol_sizes[type_name] * max(multiplicity, 1)
+
+        return byte_offset
+
+
+def get_payload_member(app: str, index: int) -> tuple:
+    """
+    :return: The (name, type_name, multiplicity) of the member at index in the payload of a message of app. Every tenth
+    member is a message id typedef, an enumeration, a string and a nested structure respectively.
+    """
+    if index % 10 == 0:
+        return f'MsgId{index}', f'{app}_MsgId_t', 0
+    if index % 10 == 5:
+        return f'State{index}', f'{app}_State_t', 0
+    if index % 10 == 7:
+        return f'Name{index}', 'char', STRING_SIZE
+    if index % 10 == 9:
+        return f'Vector{index}', f'{app}_Vector_t', 0
+
+    type_name, _ = INTRINSIC_TYPES[index % len(INTRINSIC_TYPES)]
+    return f'Value{index}', type_name, 0
+
+
+def get_app_name(app_index: int) -> str:
+    return f'APP{app_index}'
+
+
+def generate_database(output_path: str, field_count: int = 1000):
+    """
+    Writes a synthetic database to output_path.
+    :param output_path: Any existing file at this path is replaced.
+    :param field_count: The number of fields in the messages of the database; the database has a few more than this for
+    headers and the structures the messages use.
+    :return: The number of records in every table of the new database, keyed by table.
+    """
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    fields_per_message = max(MIN_FIELDS_PER_MESSAGE, math.ceil(field_count / MAX_MESSAGES))
+    message_count = max(1, math.ceil(field_count / fields_per_message))
+    app_count = math.ceil(message_count / MESSAGES_PER_APP)
+
+    db_handle = sqlite3.connect(output_path)
+    for statement in SCHEMA:
+        db_handle.execute(statement)
+
+    database = SyntheticDatabase(db_handle)
+
+    with db_handle:
+        database.elf_id = db_handle.execute('INSERT INTO elfs(name, checksum, date, little_endian) '
+                                            'VALUES(?, ?, ?, ?)', (ELF_NAME, '0' * 32, '2021-03-11', 1)).lastrowid
+
+        for type_name, byte_size in INTRINSIC_TYPES + [('char', 1)]:
+            database.add_symbol(type_name, byte_size)
+
+        database.add_struct('CCSDS_PriHdr_t', [('StreamId', 'uint8', 2), ('Sequence', 'uint8', 2),
+                                               ('Length', 'uint8', 2)])
+        database.add_struct('CCSDS_TlmSecHdr_t', [('Time', 'uint8', 6)])
+        database.add_struct('CCSDS_CmdSecHdr_t', [('Command', 'uint16', 0)])
+        for header_name, byte_size in DS_FILE_HEADERS:
+            database.add_struct(header_name, [('Data', 'uint8', byte_size)])
+
+        message_index = 0
+        telemetry_index = 0
+        records = {'telemetry': [], 'commands': []}
+        for app_index in range(app_count):
+            app = get_app_name(app_index)
+            module_id = db_handle.execute('INSERT INTO modules(name) VALUES(?)', (app.lower(),)).lastrowid
+
+            database.add_struct(f'{app}_MsgId_t', [('Value', 'uint16', 0)])
+            database.add_struct(f'{app}_Vector_t', [('X', 'float', 0), ('Y', 'float', 0), ('Z', 'float', 0)])
+            state_id = database.add_symbol(f'{app}_State_t', 4)
+            db_handle.executemany('INSERT INTO enumerations(symbol, value, name) VALUES(?, ?, ?)',
+                                  [(state_id, value, f'{app}_STATE_{value}') for value in range(4)])
+
+            for command_code in range(min(MESSAGES_PER_APP, message_count - message_index)):
+                is_command = message_index % 4 == 3
+                symbol_name = f'{app}_{"Cmd" if is_command else "Tlm"}{command_code}_t'
+
+                header = ('CmdHeader', 'uint8', COMMAND_HEADER_SIZE) if is_command else \
+                    ('TlmHeader', 'uint8', TELEMETRY_HEADER_SIZE)
+                database.add_struct(symbol_name, [header] + [get_payload_member(app, index)
+                                                             for index in range(fields_per_message)])
+
+                macro = f'{app}_{"CMD" if is_command else "TLM"}{command_code}_MID'
+                if is_command:
+                    records['commands'].append((f'{app}_CMD{command_code}', command_code, 0x1800 | app_index, macro,
+                                                database.symbol_ids[symbol_name], module_id))
+                else:
+                    records['telemetry'].append((f'{app}_TLM{command_code}', 0x0800 | telemetry_index, macro,
+                                                 database.symbol_ids[symbol_name], module_id))
+                    telemetry_index += 1
+
+                message_index += 1
+
+        database.flush_fields()
+        db_handle.executemany('INSERT INTO telemetry(name, message_id, macro, symbol, module) VALUES(?, ?, ?, ?, ?)',
+                              records['telemetry'])
+        db_handle.executemany('INSERT INTO commands(name, command_code, message_id, macro, symbol, module) '
+                              'VALUES(?, ?, ?, ?, ?, ?)', records['commands'])
+
+    counts = {table: db_handle.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ['elfs', 'symbols', 'fields', 'enumerations', 'modules', 'telemetry', 'commands']}
+    db_handle.close()
+
+    logging.info(f'Synthetic database has been written to "{output_path}": {counts}')
+
+    return counts
+
+
+def generate_ds_file(database_path: str, output_path: str, packet_count: int, seed: int = 0):
+    """
+    Writes a ds log with packet_count telemetry and command packets of the messages in the synthetic database at
+    database_path. The payloads are random.
+    :param database_path: A database written by generate_database.
+    :param output_path:
+    :param packet_count:
+    :param seed: The seed of the random payloads; the same seed always writes the same file.
+    :return: The names of the structures at the start of the file, as log_parser.parse_file expects them.
+    """
+    db_handle = sqlite3.connect(database_path)
+    messages = db_handle.execute('SELECT telemetry.message_id, NULL, symbols.byte_size FROM telemetry '
+                                 'JOIN symbols ON symbols.id = telemetry.symbol ORDER BY telemetry.id').fetchall()
+    messages += db_handle.execute('SELECT commands.message_id, commands.command_code, symbols.byte_size FROM commands '
+                                  'JOIN symbols ON symbols.id = commands.symbol ORDER BY commands.id').fetchall()
+    db_handle.close()
+
+    rng = random.Random(seed)
+
+    with open(output_path, 'wb') as ds_file:
+        for _, header_size in DS_FILE_HEADERS:
+            ds_file.write(bytes(header_size))
+
+        for sequence in range(packet_count):
+            message_id, command_code, byte_size = messages[rng.randrange(len(messages))]
+
+            if command_code is None:
+                secondary_header = struct.pack('<IH', sequence, 0)
+                payload_size = byte_size - TELEMETRY_HEADER_SIZE
+            else:
+                # The command code lives in bits 1 through 7 of the command secondary header.
+                secondary_header = struct.pack('!H', command_code << 1)
+                payload_size = byte_size - COMMAND_HEADER_SIZE
+
+            # The length of a CCSDS packet counts every byte after the primary header, minus one.
+            length = len(secondary_header) + payload_size - 1
+            ds_file.write(struct.pack('!HHH', message_id, 0xC000 | (sequence & 0x3FFF), length))
+            ds_file.write(secondary_header)
+            ds_file.write(rng.getrandbits(8 * payload_size).to_bytes(payload_size, 'little') if payload_size else b'')
+
+    return [header_name for header_name, _ in DS_FILE_HEADERS]
+
+
+def parse_cli() -> argparse.Namespace:
+    """
+    Parses cli arguments.
+    :return: The namespace that has all of the arguments that have been parsed.
+    """
+    parser = argparse.ArgumentParser(description='Writes a synthetic database with the schema of juicer.')
+
+    parser.add_argument('--output_file', type=str, required=True, help='The path of the new database.')
+
+    parser.add_argument('--fields', type=int, default=1000,
+                        help='The number of fields in the messages of the database.')
+
+    parser.add_argument('--ds_file', type=str, default=None,
+                        help='Also write a ds log with packets of the messages in the database to this file.')
+
+    parser.add_argument('--packets', type=int, default=1000, help='The number of packets in the ds log.')
+
+    return parser.parse_args()
+
+
+def main():
+    logging.getLogger().setLevel(logging.INFO)
+    args = parse_cli()
+
+    generate_database(args.output_file, args.fields)
+
+    if args.ds_file:
+        generate_ds_file(args.output_file, args.ds_file, args.packets)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import benchmark
+
+
+def test_run_benchmarks():
+    results = benchmark.run_benchmarks([200], repeat=1)
+
+    assert results['format_version'] == benchmark.RESULTS_FORMAT_VERSION
+    assert [result['benchmark'] for result in results['results']] == list(benchmark.BENCHMARKS.keys())
+    for result in results['results']:
+        assert result['fields'] >= 200
+        assert result['wall_time_s'] == min(result['wall_times_s'])
@@ -0,0 +1,130 @@
+import ast
+import csv
+import os
+import struct
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import numpy as np
+import pytest
+
+import ds_decoder
+import layout_cache
+import log_parser
+import synthetic_mdb
+
+
+@pytest.mark.parametrize('length_source', list(log_parser.LengthSource))
+def test_decode_file(tmp_path, monkeypatch, length_source):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 400)
+    ds_path = str(tmp_path / 'ds.bin')
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, 200)
+
+    monkeypatch.chdir(tmp_path)
+    log_parser.parse_file(ds_path, database_path, structures, log_parser.TimeFormat.CFE_SB_TIME_32_16_SUBS,
+                          length_source)
+
+    messages = ds_decoder.decode_file(ds_path, database_path, structures, length_source)
+    assert sum(len(message.offsets) for message in messages) == 200
+
+    # Every packet decodes to the same values log_parser writes to its csv files.
+    for message in messages:
+        file_name = message.layout.macro
+        if isinstance(message.layout.key, tuple):
+            file_name += '_CC_' + str(message.layout.key[1])
+        with open(file_name + '.csv', 'r', newline='') as csv_file:
+            rows = list(csv.reader(csv_file))[1:]
+
+        assert len(rows) == len(message.offsets)
+        for index, row in enumerate(rows):
+            if message.times is not None:
+                assert int(row[1]) == message.times[index]
+                row = row[3:]
+            else:
+                row = row[2:]
+
+            values = []
+            for column in message.columns.values():
+                values += np.atleast_1d(column[index]).tolist()
+            assert len(values) == len(row)
+            for value, csv_value in zip(values, row):
+                if isinstance(value, bytes):
+                    assert ast.literal_eval(csv_value).rstrip(b'\0') == value
+                else:
+                    assert value == pytest.approx(float(csv_value), nan_ok=True)
+
+
+def test_layout_table(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    layouts = ds_decoder.LayoutTable(layout_cache.get_layouts(database_path))
+    message_id, = [key for key, layout in layouts.telemetry.items() if layout['macro'] == 'APP0_TLM0_MID']
+    layout = layouts.get_layout(message_id)
+    assert layout.header_size == ds_decoder.TELEMETRY_HEADER_SIZE
+
+    # The header is left out, strings are byte strings and nested structures are flattened into their fields.
+    assert 'TlmHeader' not in layout.dtype.names
+    assert layout.dtype['Name7'] == np.dtype('S16')
+    assert {'Vector9.X', 'Vector9.Y', 'Vector9.Z'}.issubset(layout.dtype.names)
+    assert 'Vector9' not in layout.dtype.names
+
+    # The dtype has a field for every leaf of the layout log_parser unpacks, in the same order.
+    assert list(layout.dtype.names) == layouts.telemetry[message_id]['field_names']
+    assert layout.dtype.fields['Vector9.Y'][1] == layout.dtype.fields['Vector9.X'][1] + 4
+
+    command_key = next(iter(layouts.commands))
+    assert layouts.get_layout(command_key).header_size == ds_decoder.COMMAND_HEADER_SIZE
+
+
+def test_decode_files(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 400)
+    input_dir = tmp_path / 'ds'
+    input_dir.mkdir()
+    structures = None
+    for seed in range(2):
+        structures = synthetic_mdb.generate_ds_file(database_path, str(input_dir / f'ds{seed}.bin'), 200, seed)
+
+    file_paths = ds_decoder.get_input_files(str(input_dir))
+    messages = ds_decoder.decode_files(file_paths, database_path, structures, log_parser.LengthSource.STREAM,
+                                       processes=2, packets_per_task=64)
+    assert ds_decoder.get_input_files(str(input_dir)) == file_paths
+    assert sum(len(message.offsets) for message in messages) == 400
+
+    file_messages = [{message.layout.key: message for message in
+                      ds_decoder.decode_file(file_path, database_path, structures, log_parser.LengthSource.STREAM)}
+                     for file_path in file_paths]
+
+    # Every packet decodes to the same values it does when its file is decoded by itself, and packets are in time order.
+    for message in messages:
+        if message.times is not None:
+            times = message.times.astype(np.int64) << 16 | message.subseconds
+            assert np.all(np.diff(times) >= 0)
+
+        for index, (file_index, offset) in enumerate(zip(message.file_indices, message.offsets)):
+            file_message = file_messages[file_index][message.layout.key]
+            file_position, = np.flatnonzero(file_message.offsets == offset)
+            for name, column in message.columns.items():
+                assert column[index].tobytes() == file_message.columns[name][file_position].tobytes()
+
+
+@pytest.mark.parametrize('length_source', list(log_parser.LengthSource))
+def test_decode_file_with_truncated_command(tmp_path, length_source):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+    ds_path = str(tmp_path / 'ds.bin')
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, 50)
+    messages = ds_decoder.decode_file(ds_path, database_path, structures, length_source)
+
+    # The log is cut off one byte into the command header of a command packet appended to it.
+    command_key = next(iter(ds_decoder.LayoutTable(layout_cache.get_layouts(database_path)).commands))
+    with open(ds_path, 'ab') as ds_file:
+        ds_file.write(struct.pack('!HHH', command_key[0], 0xC000, 1) + b'\0')
+
+    truncated_messages = ds_decoder.decode_file(ds_path, database_path, structures, length_source)
+    assert {message.layout.key: len(message.offsets) for message in truncated_messages} == \
+           {message.layout.key: len(message.offsets) for message in messages}
@@ -0,0 +1,108 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import numpy as np
+import pytest
+
+import ds_decoder
+import ds_index
+import log_parser
+import synthetic_mdb
+
+
+@pytest.fixture
+def ds_file(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 400)
+    ds_path = str(tmp_path / 'ds.bin')
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, 200)
+    start = sum(byte_size for _, byte_size in synthetic_mdb.DS_FILE_HEADERS)
+    return database_path, ds_path, structures, start
+
+
+def test_get_index(ds_file):
+    database_path, ds_path, structures, start = ds_file
+
+    index = ds_index.get_index(ds_path, start)
+    assert len(index) == 200
+    assert os.path.isfile(ds_index.get_index_path(ds_path))
+    assert sum(index.get_counts().values()) == 200
+
+    # The sidecar is reused while the log does not change.
+    reloaded = ds_index.load_index(ds_path, start)
+    assert np.array_equal(reloaded.offsets, index.offsets)
+    assert np.array_equal(reloaded.times, index.times)
+    assert ds_index.load_index(ds_path, start + 1) is None
+
+    file_stat = os.stat(ds_path)
+    os.utime(ds_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1000000000))
+    assert ds_index.load_index(ds_path, start) is None
+
+    stream_id = int(index.stream_ids[0])
+    filtered = index.filter(message_ids=[stream_id])
+    assert len(filtered) == index.get_counts()[(stream_id, None)]
+    assert set(filtered.stream_ids.tolist()) == {stream_id}
+
+    # Command codes only filter commands, so telemetry is kept along with the commands that have one of the codes.
+    command_position = int(np.flatnonzero(index.command_codes != ds_index.NO_COMMAND_CODE)[0])
+    command_id = int(index.stream_ids[command_position])
+    command_code = int(index.command_codes[command_position])
+    filtered = index.filter(message_ids=[stream_id, command_id], command_codes=[command_code])
+    assert len(filtered) == index.get_counts()[(stream_id, None)] + index.get_counts()[(command_id, command_code)]
+    assert len(index.filter(command_codes=[command_code]).filter(command_codes=[])) == \
+        np.count_nonzero(index.command_codes == ds_index.NO_COMMAND_CODE)
+
+
+def test_decode_file_with_index(ds_file):
+    database_path, ds_path, structures, _ = ds_file
+
+    messages = ds_decoder.decode_file(ds_path, database_path, structures, log_parser.LengthSource.STREAM)
+    indexed_messages = ds_decoder.decode_file(ds_path, database_path, structures, log_parser.LengthSource.STREAM,
+                                              use_index=True)
+
+    assert [message.layout.key for message in indexed_messages] == [message.layout.key for message in messages]
+    for message, indexed_message in zip(messages, indexed_messages):
+        assert np.array_equal(indexed_message.offsets, message.offsets)
+        assert indexed_message.columns.keys() == message.columns.keys()
+        for name, column in message.columns.items():
+            assert np.array_equal(indexed_message.columns[name], column, equal_nan=column.dtype.kind == 'f')
+
+    stream_id = ds_decoder.get_stream_id(messages[0].layout.key)
+    selected = ds_decoder.decode_file(ds_path, database_path, structures, log_parser.LengthSource.STREAM,
+                                      use_index=True, message_ids=[stream_id])
+    assert [message.layout.key for message in selected] == [messages[0].layout.key]
+
+
+def test_get_index_without_sidecar(ds_file, monkeypatch):
+    database_path, ds_path, structures, start = ds_file
+
+    def savez(*args, **kwargs):
+        raise PermissionError('Read-only file system')
+
+    # The index is still built and used when it cannot be saved, as with logs in a read-only directory.
+    monkeypatch.setattr(np, 'savez', savez)
+    index = ds_index.get_index(ds_path, start)
+    assert len(index) == 200
+    assert not os.path.exists(ds_index.get_index_path(ds_path))
+
+    messages = ds_decoder.decode_file(ds_path, database_path, structures, log_parser.LengthSource.STREAM,
+                                      use_index=True)
+    assert sum(len(message.offsets) for message in messages) == 200
+
+    messages = ds_decoder.decode_files([ds_path], database_path, structures, log_parser.LengthSource.STREAM,
+                                       processes=1, packets_per_task=64)
+    assert sum(len(message.offsets) for message in messages) == 200
+    assert not os.path.exists(ds_index.get_index_path(ds_path))
+
+
+def test_get_index_with_index_dir(ds_file, tmp_path):
+    _, ds_path, _, start = ds_file
+    index_dir = str(tmp_path / 'indexes')
+
+    index = ds_index.get_index(ds_path, start, index_dir=index_dir)
+    assert os.path.isfile(os.path.join(index_dir, 'ds.bin' + ds_index.INDEX_FILE_SUFFIX))
+    assert not os.path.exists(ds_index.get_index_path(ds_path))
+    assert np.array_equal(ds_index.load_index(ds_path, start, index_dir).offsets, index.offsets)
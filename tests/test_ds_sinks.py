@@ -0,0 +1,68 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import numpy as np
+import pytest
+
+import ds_decoder
+import ds_sinks
+import log_parser
+import synthetic_mdb
+
+
+@pytest.fixture
+def messages(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 400)
+    ds_path = str(tmp_path / 'ds.bin')
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, 200)
+    return ds_decoder.decode_file(ds_path, database_path, structures, log_parser.LengthSource.STREAM)
+
+
+def test_npz_sink(tmp_path, messages):
+    paths = ds_decoder.write_messages(messages, str(tmp_path / 'npz'), 'npz')
+    assert len(paths) == len(messages)
+
+    for message, path in zip(messages, paths):
+        assert os.path.basename(path) == ds_sinks.get_table_name(message) + '.npz'
+        with np.load(path) as table:
+            for name, column in ds_sinks.get_columns(message).items():
+                assert table[name].dtype == column.dtype
+                assert table[name].tobytes() == column.tobytes()
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'feather'])
+def test_arrow_sinks(tmp_path, messages, output_format):
+    pytest.importorskip('pyarrow')
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    paths = ds_decoder.write_messages(messages, str(tmp_path / output_format), output_format)
+
+    message = next(message for message in messages if message.times is not None)
+    path = paths[messages.index(message)]
+    if output_format == 'parquet':
+        table = pyarrow.parquet.read_table(path, columns=['time', 'Value1', 'Name7', 'Vector9.X'])
+    else:
+        table = pyarrow.feather.read_table(path, columns=['time', 'Value1', 'Name7', 'Vector9.X'], memory_map=True)
+
+    assert table.schema.metadata[b'macro'] == message.layout.macro.encode()
+    assert table.column('time').to_pylist() == message.times.tolist()
+    assert table.column('Value1').type == pyarrow.from_numpy_dtype(message.columns['Value1'].dtype.newbyteorder('='))
+    assert table.column('Value1').to_pylist() == message.columns['Value1'].tolist()
+    assert table.column('Name7').type == pyarrow.binary(16)
+    assert np.array_equal(table.column('Vector9.X').to_numpy(), message.columns['Vector9.X'], equal_nan=True)
+
+
+def test_get_sink(tmp_path):
+    with pytest.raises(ValueError):
+        ds_sinks.get_sink('csv', str(tmp_path))
+    assert isinstance(ds_sinks.get_sink('npz', str(tmp_path)), ds_sinks.NpzSink)
+
+
+def test_message_sink_is_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        ds_sinks.MessageSink(str(tmp_path))
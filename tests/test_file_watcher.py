@@ -0,0 +1,46 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import file_watcher
+
+
+def test_file_watcher_poll(tmp_path):
+    elf = tmp_path / 'app.so'
+    elf.write_bytes(b'version 1')
+    config = tmp_path / 'config.yaml'
+    config.write_text('modules: {}')
+
+    watcher = file_watcher.FileWatcher([str(elf), str(config)], poll_interval=0.01, settle_time=0.01)
+    assert watcher.poll() == set()
+
+    elf.write_bytes(b'version 2, which is longer')
+    assert watcher.poll() == {str(elf)}
+    assert watcher.poll() == set()
+
+    # Writes squeezer makes itself are not changes.
+    config.write_text('modules: {cpd: {}}')
+    watcher.mark_seen(str(config))
+    assert watcher.poll() == set()
+
+    elf.unlink()
+    assert watcher.wait() == {str(elf)}
+
+
+def test_file_watcher_mark_seen_after_write(tmp_path):
+    config = tmp_path / 'config.yaml'
+    config.write_text('modules: {}')
+    watcher = file_watcher.FileWatcher([str(config)], poll_interval=0.01, settle_time=0.01)
+
+    # Only the state squeezer left the file in is seen; an edit made after the write is still a change.
+    config.write_text('modules: {cpd: {}}')
+    written_stat = file_watcher.get_file_stat(str(config))
+    config.write_text('modules: {cpd: {}, ppd: {}}')
+    watcher.mark_seen(str(config), written_stat)
+    assert watcher.poll() == {str(config)}
+
+    config.write_text('modules: {cpd: {}}')
+    watcher.mark_seen(str(config), file_watcher.get_file_stat(str(config)))
+    assert watcher.poll() == set()
@@ -0,0 +1,49 @@
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import sqlite_utils
+
+import benchmark
+import header_mod
+import synthetic_mdb
+
+
+def get_header_fields(db_handle: sqlite3.Connection, symbol_name: str, header_size: int) -> list:
+    return db_handle.execute('SELECT fields.name, fields.byte_offset, type.name FROM fields '
+                             'JOIN symbols ON symbols.id = fields.symbol JOIN symbols AS type ON type.id = fields.type '
+                             'WHERE symbols.name = ? AND fields.byte_offset < ? ORDER BY fields.byte_offset',
+                             (symbol_name, header_size)).fetchall()
+
+
+def test_header_mod(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    db_handle = sqlite3.connect(database_path)
+    # A message whose symbol has no field inside the header is left as it is.
+    with db_handle:
+        db_handle.execute('UPDATE fields SET byte_offset = byte_offset + 100 WHERE symbol = '
+                          '(SELECT id FROM symbols WHERE name = ?)', ('APP0_Tlm1_t',))
+    no_header_fields = db_handle.execute('SELECT * FROM fields WHERE symbol = (SELECT id FROM symbols WHERE name = ?) '
+                                         'ORDER BY id', ('APP0_Tlm1_t',)).fetchall()
+
+    # Split the header of a command in two, so there is more than one field to replace.
+    with db_handle:
+        db_handle.execute('UPDATE fields SET multiplicity = 4 WHERE name = ? AND symbol = '
+                          '(SELECT id FROM symbols WHERE name = ?)', ('CmdHeader', 'APP0_Cmd3_t'))
+        db_handle.execute('INSERT INTO fields(symbol, name, byte_offset, type, multiplicity, little_endian, bit_size, '
+                          'bit_offset) SELECT id, ?, 4, (SELECT id FROM symbols WHERE name = ?), 4, 1, 0, 0 '
+                          'FROM symbols WHERE name = ?', ('CmdHeader2', 'uint8', 'APP0_Cmd3_t'))
+
+    header_mod.header_mod(sqlite_utils.Database(database_path), benchmark.get_header_definitions())
+
+    assert get_header_fields(db_handle, 'APP0_Tlm0_t', synthetic_mdb.TELEMETRY_HEADER_SIZE) == \
+           [('TlmHeader', 0, 'CCSDS_TlmPkt_t')]
+    assert get_header_fields(db_handle, 'APP0_Cmd3_t', synthetic_mdb.COMMAND_HEADER_SIZE) == \
+           [('CmdHeader', 0, 'CCSDS_CmdPkt_t')]
+    assert db_handle.execute('SELECT * FROM fields WHERE symbol = (SELECT id FROM symbols WHERE name = ?) '
+                             'ORDER BY id', ('APP0_Tlm1_t',)).fetchall() == no_header_fields
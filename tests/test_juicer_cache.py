@@ -0,0 +1,46 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import juicer_cache
+
+
+def test_juicer_cache_get_put(tmp_path):
+    elf = tmp_path / 'app.so'
+    elf.write_bytes(b'\x7fELF version 1')
+    shard = tmp_path / 'shard.sqlite'
+    shard.write_bytes(b'shard contents')
+
+    cache = juicer_cache.JuicerCache(str(tmp_path / 'cache'), 1024, 'juicer-1')
+    key = cache.get_key(str(elf), 'SQLITE')
+
+    assert cache.get(key, str(tmp_path / 'miss.sqlite')) is False
+
+    cache.put(key, str(shard))
+    assert cache.get(key, str(tmp_path / 'hit.sqlite')) is True
+    assert (tmp_path / 'hit.sqlite').read_bytes() == b'shard contents'
+
+    # Any change to the elf, the juicer version or the mode is a different entry.
+    assert juicer_cache.JuicerCache(str(tmp_path / 'cache'), 1024, 'juicer-2').get_key(str(elf), 'SQLITE') != key
+    assert cache.get_key(str(elf), 'OTHER') != key
+    elf.write_bytes(b'\x7fELF version 2')
+    assert cache.get_key(str(elf), 'SQLITE') != key
+
+
+def test_juicer_cache_lru_eviction(tmp_path):
+    cache = juicer_cache.JuicerCache(str(tmp_path / 'cache'), 250, 'juicer-1')
+    shard = tmp_path / 'shard.sqlite'
+    shard.write_bytes(b'x' * 100)
+
+    cache.put('a', str(shard))
+    cache.put('b', str(shard))
+    os.utime(tmp_path / 'cache' / 'a.sqlite', (1, 1))
+    os.utime(tmp_path / 'cache' / 'b.sqlite', (2, 2))
+
+    # Using "a" makes "b" the least recently used entry.
+    assert cache.get('a', str(tmp_path / 'out.sqlite')) is True
+    cache.put('c', str(shard))
+
+    assert sorted(entry[0].name for entry in cache.get_entries()) == ['a.sqlite', 'c.sqlite']
@@ -0,0 +1,115 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import sqlite_utils
+
+import layout_cache
+import log_parser
+import synthetic_mdb
+
+
+def test_compile_layouts(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 400)
+    db_handle = sqlite_utils.Database(database_path)
+
+    layouts = layout_cache.compile_layouts(db_handle)
+    assert len(layouts['telemetry']) == db_handle['telemetry'].count
+    assert len(layouts['commands']) == db_handle['commands'].count
+
+    # The layouts are what log_parser builds with its queries.
+    for layout in layouts['telemetry'] + layouts['commands']:
+        assert layout['struct_string'] == log_parser.get_struct_format_string(layout['symbol_id'],
+                                                                              layout['header_size'], db_handle)
+        assert layout['symbol_field_labels'] == log_parser.get_field_names_from_struct(layout['symbol_id'],
+                                                                                       layout['header_size'],
+                                                                                       db_handle)
+
+    fields = dict(zip(layouts['telemetry'][0]['field_names'], zip(layouts['telemetry'][0]['field_offsets'],
+                                                                  layouts['telemetry'][0]['field_enumerations'])))
+    assert fields['State5'][1]
+    assert not fields['Value1'][1]
+    assert fields['Vector9.Y'][0] == fields['Vector9.X'][0] + 4
+
+
+def test_get_layouts(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    layouts = layout_cache.get_layouts(database_path)
+    assert os.path.isfile(layout_cache.get_cache_path(database_path))
+
+    fingerprint = layout_cache.get_database_fingerprint(database_path)
+    assert layout_cache.load_layouts(database_path, fingerprint) == layouts
+
+    # Any write to the database invalidates the cache. Its modification time is set explicitly, since it may not
+    # change between two writes made this close together.
+    database_stat = os.stat(database_path)
+    db_handle = sqlite_utils.Database(database_path)
+    db_handle.execute('UPDATE telemetry SET macro = ? WHERE id = 1', ['RENAMED_MID'])
+    db_handle.conn.commit()
+    os.utime(database_path, ns=(database_stat.st_atime_ns, database_stat.st_mtime_ns + 1000000))
+    assert layout_cache.load_layouts(database_path, layout_cache.get_database_fingerprint(database_path)) is None
+    assert 'RENAMED_MID' in [layout['macro'] for layout in layout_cache.get_layouts(database_path)['telemetry']]
+
+
+def test_get_layouts_with_hash_contents(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    layouts = layout_cache.get_layouts(database_path, hash_contents=True)
+    fingerprint = layout_cache.get_database_fingerprint(database_path, hash_contents=True)
+    assert layout_cache.load_layouts(database_path, fingerprint) == layouts
+    # Both fingerprints key the same sidecar, but never match each other.
+    assert layout_cache.load_layouts(database_path, layout_cache.get_database_fingerprint(database_path)) is None
+
+    # A change to the contents invalidates the cache even if the size and modification time are kept.
+    database_stat = os.stat(database_path)
+    db_handle = sqlite_utils.Database(database_path)
+    db_handle.execute('UPDATE telemetry SET macro = ? WHERE id = 1', ['RENAMED_MID'])
+    db_handle.conn.commit()
+    db_handle.conn.close()
+    os.utime(database_path, ns=(database_stat.st_atime_ns, database_stat.st_mtime_ns))
+    assert os.path.getsize(database_path) == database_stat.st_size
+    assert layout_cache.load_layouts(database_path,
+                                     layout_cache.get_database_fingerprint(database_path, hash_contents=True)) is None
+    assert 'RENAMED_MID' in [layout['macro'] for layout in
+                             layout_cache.get_layouts(database_path, hash_contents=True)['telemetry']]
+
+
+def test_compile_layouts_with_arrays_of_structures(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+    db_handle = sqlite_utils.Database(database_path)
+
+    vector = list(db_handle['symbols'].rows_where('name=?', ['APP0_Vector_t']))[0]
+    uint8 = list(db_handle['symbols'].rows_where('name=?', ['uint8']))[0]
+    message = list(db_handle['telemetry'].rows_where(order_by='id', limit=1))[0]
+
+    symbol_id = db_handle['symbols'].insert({'elf': vector['elf'], 'name': 'APP0_Vectors_t',
+                                             'byte_size': 12 + 2 * vector['byte_size']}).last_pk
+    db_handle['fields'].insert_all([
+        {'symbol': symbol_id, 'name': 'TlmHeader', 'byte_offset': 0, 'type': uint8['id'], 'multiplicity': 12,
+         'little_endian': 1, 'bit_size': 0, 'bit_offset': 0},
+        {'symbol': symbol_id, 'name': 'Vectors', 'byte_offset': 12, 'type': vector['id'], 'multiplicity': 2,
+         'little_endian': 1, 'bit_size': 0, 'bit_offset': 0}])
+    db_handle['telemetry'].insert({'name': 'APP0_VECTORS_TLM', 'message_id': 0x0FF0, 'macro': 'APP0_VECTORS_TLM_MID',
+                                   'symbol': symbol_id, 'module': message['module']})
+
+    layout, = [layout for layout in layout_cache.compile_layouts(db_handle)['telemetry']
+               if layout['macro'] == 'APP0_VECTORS_TLM_MID']
+
+    # Every element of the array is unpacked, with its own path and offset.
+    assert layout['field_names'] == ['Vectors[0].X', 'Vectors[0].Y', 'Vectors[0].Z',
+                                     'Vectors[1].X', 'Vectors[1].Y', 'Vectors[1].Z']
+    assert layout['field_offsets'] == [12, 16, 20, 24, 28, 32]
+    assert layout['struct_string'] == '<ffffff'
+    assert layout['symbol_field_labels'] == ['X', 'Y', 'Z', 'X', 'Y', 'Z']
+
+    # log_parser unpacks arrays of structures the same way when it walks the database itself.
+    assert log_parser.get_struct_format_string(symbol_id, layout['header_size'], db_handle) == layout['struct_string']
+    assert log_parser.get_field_names_from_struct(symbol_id, layout['header_size'], db_handle) == \
+        layout['symbol_field_labels']
@@ -0,0 +1,63 @@
+import csv
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import log_parser
+import synthetic_mdb
+
+
+def read_csv(path) -> list:
+    with open(path, 'r', newline='') as csv_file:
+        return list(csv.reader(csv_file))
+
+
+def test_csv_writer_pool(tmp_path):
+    paths = [str(tmp_path / f'MSG{index}.csv') for index in range(3)]
+
+    # A file that already exists does not get a header.
+    with open(paths[2], 'w', newline='') as csv_file:
+        csv.writer(csv_file).writerow(['existing'])
+
+    with log_parser.CsvWriterPool(2) as writers:
+        for row in range(3):
+            for path in paths:
+                writers.write_row(path, ['header'], [row])
+                assert len(writers.get_open_files()) <= 2
+        assert writers.get_open_files() == paths[1:]
+
+    assert read_csv(paths[0]) == [['header'], ['0'], ['1'], ['2']]
+    assert read_csv(paths[1]) == [['header'], ['0'], ['1'], ['2']]
+    assert read_csv(paths[2]) == [['existing'], ['0'], ['1'], ['2']]
+
+
+def test_parse_file(tmp_path, monkeypatch):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+    ds_path = str(tmp_path / 'ds.bin')
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, 50)
+
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    monkeypatch.chdir(csv_dir)
+
+    for length_source in log_parser.LengthSource:
+        for csv_path in csv_dir.iterdir():
+            csv_path.unlink()
+
+        log_parser.parse_file(ds_path, database_path, structures, log_parser.TimeFormat.CFE_SB_TIME_32_16_SUBS,
+                              length_source, max_open_files=2)
+
+        # Every packet is a row below the header of its csv file.
+        assert sum(len(read_csv(csv_path)) - 1 for csv_path in csv_dir.iterdir()) == 50
+
+    # A file with nothing but the file headers has no packets to parse.
+    for csv_path in csv_dir.iterdir():
+        csv_path.unlink()
+    with open(ds_path, 'r+b') as ds_file:
+        ds_file.truncate(sum(byte_size for _, byte_size in synthetic_mdb.DS_FILE_HEADERS))
+    log_parser.parse_file(ds_path, database_path, structures, log_parser.TimeFormat.CFE_SB_TIME_32_16_SUBS,
+                          log_parser.LengthSource.STREAM)
+    assert list(csv_dir.iterdir()) == []
@@ -0,0 +1,33 @@
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import memory_db
+import remap_symbols
+
+
+def test_in_memory_round_trip(tmp_path):
+    juicer_output = str(tmp_path / 'juicer.sqlite')
+    output = str(tmp_path / 'newdb.sqlite')
+
+    db_handle = sqlite3.connect(juicer_output)
+    db_handle.execute('CREATE TABLE symbols(id INTEGER PRIMARY KEY, name TEXT)')
+    db_handle.execute('CREATE TABLE fields(id INTEGER PRIMARY KEY, symbol INTEGER, name TEXT, type INTEGER)')
+    db_handle.executemany('INSERT INTO symbols VALUES(?, ?)', [(1, 'CFE_SB_MsgId_t'), (2, 'uint16'), (3, 'Msg_t')])
+    db_handle.execute('INSERT INTO fields VALUES(1, 3, "MsgId", 1)')
+    db_handle.commit()
+    db_handle.close()
+
+    memory_handle = memory_db.load_into_memory(juicer_output)
+    remap_symbols.remap_symbols(memory_handle, {'CFE_SB_MsgId_t': 'uint16'})
+
+    # Nothing is written to disk until the very end.
+    assert sqlite3.connect(juicer_output).execute('SELECT type FROM fields').fetchone()[0] == 1
+
+    memory_db.write_atomically(memory_handle, output)
+
+    assert sqlite3.connect(output).execute('SELECT type FROM fields').fetchone()[0] == 2
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
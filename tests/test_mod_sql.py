@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import pytest
+import sqlite_utils
+import yaml
+
+import mod_sql
+import synthetic_mdb
+
+
+def get_sql_entries(symbol_name: str, field_type: str) -> dict:
+    return {'symbols': [{'name': symbol_name, 'elf': synthetic_mdb.ELF_NAME, 'byte_size': 8}],
+            'fields': [{'symbol': symbol_name, 'name': f'Value{index}', 'byte_offset': index * 4, 'type': field_type,
+                        'multiplicity': 0, 'little_endian': 1, 'bit_size': 0, 'bit_offset': 0}
+                       for index in range(2)],
+            'telemetry': [{'name': 'APP0_MANUAL_TLM', 'message_id': 0x0FFF, 'macro': 'APP0_MANUAL_TLM_MID',
+                           'symbol': symbol_name, 'module': 'app0'}]}
+
+
+def test_write_dict_to_database(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    mod_sql.write_dict_to_database(get_sql_entries('APP0_ManualTlm_t', 'uint32'), sqlite_utils.Database(database_path))
+
+    db_handle = sqlite3.connect(database_path)
+    symbol_id, = db_handle.execute('SELECT id FROM symbols WHERE name = ?', ('APP0_ManualTlm_t',)).fetchone()
+    assert db_handle.execute('SELECT fields.name, symbols.name FROM fields JOIN symbols ON symbols.id = fields.type '
+                             'WHERE fields.symbol = ? ORDER BY fields.name', (symbol_id,)).fetchall() == \
+           [('Value0', 'uint32'), ('Value1', 'uint32')]
+    assert db_handle.execute('SELECT telemetry.symbol, modules.name FROM telemetry JOIN modules ON '
+                             'modules.id = telemetry.module WHERE telemetry.name = ?',
+                             ('APP0_MANUAL_TLM',)).fetchone() == (symbol_id, 'app0')
+
+
+def test_write_dict_to_database_unresolved(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    sql_entries = get_sql_entries('APP0_ManualTlm_t', 'DOES_NOT_EXIST_t')
+    sql_entries['telemetry'][0]['module'] = 'does_not_exist'
+
+    with pytest.raises(ValueError) as error:
+        mod_sql.write_dict_to_database(sql_entries, sqlite_utils.Database(database_path))
+
+    # Every name that does not exist is reported, and nothing is written.
+    assert str(error.value).count('DOES_NOT_EXIST_t') == 2
+    assert 'does_not_exist' in str(error.value)
+    db_handle = sqlite3.connect(database_path)
+    assert db_handle.execute('SELECT COUNT(*) FROM symbols WHERE name = ?', ('APP0_ManualTlm_t',)).fetchone() == (0,)
+
+
+def test_mod_sql_stream(tmp_path):
+    sql_entries = get_sql_entries('APP0_ManualTlm_t', 'uint32')
+
+    yaml_path = str(tmp_path / 'sql_entries.yaml')
+    with open(yaml_path, 'w') as yaml_file:
+        yaml.dump(sql_entries, yaml_file, sort_keys=False)
+
+    jsonl_path = str(tmp_path / 'sql_entries.jsonl')
+    with open(jsonl_path, 'w') as jsonl_file:
+        for table, row in mod_sql.iter_dict_records(sql_entries):
+            jsonl_file.write(json.dumps({'table': table, 'row': row}) + '\n')
+
+    assert list(mod_sql.iter_yaml_records(yaml_path)) == list(mod_sql.iter_dict_records(sql_entries))
+
+    for entries_path in [yaml_path, jsonl_path]:
+        database_path = str(tmp_path / 'synthetic.sqlite')
+        synthetic_mdb.generate_database(database_path, 200)
+
+        # With a batch size of one, every field refers to a symbol that was written in an earlier batch.
+        mod_sql.mod_sql(database_path, entries_path, stream=True, batch_size=1)
+
+        db_handle = sqlite3.connect(database_path)
+        written = db_handle.execute('SELECT fields.name, fields.byte_offset, telemetry.message_id FROM fields '
+                                    'JOIN symbols ON symbols.id = fields.symbol '
+                                    'JOIN telemetry ON telemetry.symbol = symbols.id '
+                                    'WHERE symbols.name = ? ORDER BY fields.name', ('APP0_ManualTlm_t',)).fetchall()
+        db_handle.close()
+        os.remove(database_path)
+
+        assert written == [('Value0', 0, 0x0FFF), ('Value1', 4, 0x0FFF)]
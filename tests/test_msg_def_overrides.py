@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import sqlite_utils
+
+import msg_def_overrides
+import synthetic_mdb
+
+
+def get_field_type(db_handle: sqlite3.Connection, symbol_name: str, field_name: str) -> tuple:
+    return db_handle.execute('SELECT type.id, type.name FROM fields JOIN symbols ON symbols.id = fields.symbol '
+                             'JOIN symbols AS type ON type.id = fields.type '
+                             'WHERE symbols.name = ? AND fields.name = ?', (symbol_name, field_name)).fetchone()
+
+
+def test_process_def_overrides(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    def_overrides = {'modules': {
+        'app0': {'elf_files': [synthetic_mdb.ELF_NAME],
+                 'msg_def_overrides': [{'type': 'string', 'parent': 'APP0_Tlm0_t', 'member': 'Name7'},
+                                       {'type': 'enumeration', 'parent': 'APP0_Tlm0_t', 'member': 'Value1',
+                                        'enumerations': {'OFF': 0, 'ON': 1}},
+                                       {'type': 'string', 'parent': 'DOES_NOT_EXIST_t', 'member': 'Name7'}],
+                 'modules': {
+                     'child': {'msg_def_overrides': [
+                         {'type': 'string', 'parent': 'APP0_Tlm1_t', 'member': 'Name7'},
+                         {'type': 'enumeration', 'parent': 'APP0_Tlm1_t', 'member': 'Value1',
+                          'enumerations': {'ON': 1, 'OFF': 0}},
+                         {'type': 'uint32', 'parent': 'APP0_Tlm1_t', 'member': 'DOES_NOT_EXIST'}]}}}}}
+
+    db_handle = sqlite3.connect(database_path)
+    field_ids = db_handle.execute('SELECT id FROM fields ORDER BY id').fetchall()
+
+    msg_def_overrides.process_def_overrides(def_overrides, sqlite_utils.Database(database_path))
+
+    # Fields are updated in place.
+    assert db_handle.execute('SELECT id FROM fields ORDER BY id').fetchall() == field_ids
+    string_id, string_name = get_field_type(db_handle, 'APP0_Tlm0_t', 'Name7')
+    assert string_name == 'string'
+    # The string type that was added for the first override is used by the second one as well.
+    assert get_field_type(db_handle, 'APP0_Tlm1_t', 'Name7') == (string_id, 'string')
+
+    enum_id, _ = get_field_type(db_handle, 'APP0_Tlm0_t', 'Value1')
+    assert sorted(db_handle.execute('SELECT name, value FROM enumerations WHERE symbol = ?', (enum_id,))) == \
+           [('OFF', 0), ('ON', 1)]
+    # Identical enumerations share a type, whose name does not change across builds.
+    assert get_field_type(db_handle, 'APP0_Tlm1_t', 'Value1') == \
+           (enum_id, msg_def_overrides.get_enumeration_type_name(1, {'OFF': 0, 'ON': 1}))
+    assert db_handle.execute('SELECT COUNT(*) FROM enumerations WHERE symbol = ?', (enum_id,)).fetchone() == (2,)
+
+
+def test_process_def_overrides_dry_run(tmp_path, capsys):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    def_overrides = {'modules': {
+        'app0': {'elf_files': [synthetic_mdb.ELF_NAME],
+                 'msg_def_overrides': [{'type': 'string', 'parent': 'APP0_Tlm0_t', 'member': 'Name7'}]}}}
+
+    db_handle = sqlite3.connect(database_path)
+    before = db_handle.execute('SELECT COUNT(*) FROM symbols').fetchone(), get_field_type(db_handle, 'APP0_Tlm0_t',
+                                                                                          'Name7')
+
+    msg_def_overrides.process_def_overrides(def_overrides, sqlite_utils.Database(database_path), dry_run=True)
+
+    assert (db_handle.execute('SELECT COUNT(*) FROM symbols').fetchone(),
+            get_field_type(db_handle, 'APP0_Tlm0_t', 'Name7')) == before
+    assert capsys.readouterr().out.splitlines() == ['Add symbol "string"(byte_size=1)',
+                                                    'Change type of "APP0_Tlm0_t.Name7" from "char" to "string"']
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import pytest
+
+import remap_symbols
+import synthetic_mdb
+
+
+def get_field_types(database_path: str) -> dict:
+    db_handle = sqlite3.connect(database_path)
+    field_types = dict(db_handle.execute('SELECT fields.id, symbols.name FROM fields '
+                                         'JOIN symbols ON symbols.id = fields.type'))
+    db_handle.close()
+    return field_types
+
+
+def test_remap_symbols(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+    old_types = get_field_types(database_path)
+
+    # APP0_MsgId_t -> int16 -> uint16 is a chain; APP0_Vector_t and DOES_NOT_EXIST_t are skipped.
+    remap_counts = remap_symbols.remap_symbols(database_path, {'APP0_MsgId_t': 'int16',
+                                                               'int16': 'uint16',
+                                                               'APP0_Vector_t': 'DOES_NOT_EXIST_t',
+                                                               'APP1_MsgId_t': 'APP1_MsgId_t'})
+
+    assert remap_counts == {'APP0_MsgId_t': list(old_types.values()).count('APP0_MsgId_t'),
+                            'int16': list(old_types.values()).count('int16')}
+    assert remap_counts['APP0_MsgId_t'] > 0
+
+    for field_id, new_type in get_field_types(database_path).items():
+        if old_types[field_id] in remap_counts:
+            assert new_type == 'uint16'
+        else:
+            assert new_type == old_types[field_id]
+
+
+def test_resolve_remaps():
+    assert remap_symbols.resolve_remaps({'A': 'B', 'B': 'C', 'C': 'D', 'X': 'Y', 'Y': 'X'}) == \
+           {'A': 'D', 'B': 'D', 'C': 'D'}
+
+
+def test_remap_symbols_patterns(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+    old_types = get_field_types(database_path)
+
+    # APP0_MsgId_t is remapped explicitly, so the glob pattern does not apply to it.
+    remap_counts = remap_symbols.remap_symbols(database_path, {'*_MsgId_t': 'uint16',
+                                                               'APP0_MsgId_t': 'uint32',
+                                                               're:APP[0-9]+_Vector_t': 'double'})
+
+    assert set(remap_counts.keys()) == {symbol for symbol in set(old_types.values())
+                                        if symbol.endswith('_MsgId_t') or symbol.endswith('_Vector_t')}
+
+    new_types = get_field_types(database_path)
+    for field_id, old_type in old_types.items():
+        if old_type == 'APP0_MsgId_t':
+            assert new_types[field_id] == 'uint32'
+        elif old_type.endswith('_MsgId_t'):
+            assert new_types[field_id] == 'uint16'
+        elif old_type.endswith('_Vector_t'):
+            assert new_types[field_id] == 'double'
+        else:
+            assert new_types[field_id] == old_type
+
+
+def test_compile_patterns():
+    # Global flags, numbered backreferences and named groups cannot be joined with other patterns, so those patterns are
+    # matched on their own, in the same order.
+    expressions = remap_symbols.compile_patterns(['re:(?i)cfe_.*', '*_MsgId_t'])
+    assert remap_symbols.get_matching_pattern(expressions, 'CFE_SB_MsgId_t') == 0
+    assert remap_symbols.get_matching_pattern(expressions, 'APP0_MsgId_t') == 1
+
+    expressions = remap_symbols.compile_patterns(['x*', 're:(A)\\1_t', 'y*'])
+    assert remap_symbols.get_matching_pattern(expressions, 'AA_t') == 1
+    assert remap_symbols.get_matching_pattern(expressions, 'AB_t') is None
+    assert remap_symbols.get_matching_pattern(expressions, 'yA') == 2
+
+    expressions = remap_symbols.compile_patterns(['re:(?P<x>a)b', 're:(?P<x>c)d', 're:(?P<y>e)(?P=y)'])
+    assert [remap_symbols.get_matching_pattern(expressions, name) for name in ['ab', 'cd', 'ee', 'ef']] == \
+           [0, 1, 2, None]
+
+    # Patterns that can be joined share one expression.
+    assert len(remap_symbols.compile_patterns(['*_MsgId_t', 're:APP[0-9]+_Vector_t', 're:(a|b)_t'])) == 1
+
+    with pytest.raises(ValueError, match='not valid'):
+        remap_symbols.compile_patterns(['re:(A', '*_t'])
+
+
+def test_remap_symbols_closes_its_connection(tmp_path, monkeypatch):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    synthetic_mdb.generate_database(database_path, 200)
+
+    connections = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, 'connect', lambda *args, **kwargs: connections.append(connect(*args, **kwargs)) or
+                        connections[-1])
+
+    # The connection opened for a path is closed; one passed in by the caller is left open.
+    remap_symbols.remap_symbols(database_path, {'APP0_MsgId_t': 'uint16'})
+    connection, = connections
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute('SELECT 1')
+
+    db_handle = connect(database_path)
+    remap_symbols.remap_symbols(db_handle, {'APP1_MsgId_t': 'uint16'})
+    assert db_handle.execute('SELECT 1').fetchone() == (1,)
+    db_handle.close()
@@ -0,0 +1,105 @@
+import sqlite3
+import sys
+import os
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import pytest
+
+import shard_merger
+
+JUICER_SCHEMA = [
+    'CREATE TABLE elfs(id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, checksum TEXT NOT NULL, '
+    'little_endian BOOLEAN NOT NULL)',
+    'CREATE TABLE symbols(id INTEGER PRIMARY KEY, elf INTEGER NOT NULL, name TEXT UNIQUE NOT NULL, '
+    'byte_size INTEGER NOT NULL, FOREIGN KEY (elf) REFERENCES elfs(id))',
+    'CREATE TABLE fields(id INTEGER PRIMARY KEY, symbol INTEGER NOT NULL, name TEXT NOT NULL, byte_offset INTEGER, '
+    'type INTEGER NOT NULL, multiplicity INTEGER NOT NULL, little_endian BOOLEAN, bit_size INTEGER, '
+    'bit_offset INTEGER, UNIQUE (symbol, name))',
+    'CREATE TABLE enumerations(symbol INTEGER NOT NULL, value INTEGER NOT NULL, name TEXT NOT NULL, '
+    'PRIMARY KEY (symbol, name))',
+]
+
+
+def write_shard(path: str, elf_name: str, struct_name: str, enum_name: str):
+    db_handle = sqlite3.connect(path)
+    for statement in JUICER_SCHEMA:
+        db_handle.execute(statement)
+    db_handle.execute('INSERT INTO elfs VALUES(1, ?, "abc", 1)', (elf_name,))
+    db_handle.execute('INSERT INTO symbols VALUES(1, 1, "uint16", 2)')
+    db_handle.execute('INSERT INTO symbols VALUES(2, 1, ?, 4)', (struct_name,))
+    db_handle.execute('INSERT INTO symbols VALUES(3, 1, ?, 2)', (enum_name,))
+    db_handle.execute('INSERT INTO fields VALUES(1, 2, "Count", 0, 1, 0, 1, 0, 0)')
+    db_handle.execute('INSERT INTO fields VALUES(2, 2, "Mode", 2, 3, 0, 1, 0, 0)')
+    db_handle.execute('INSERT INTO enumerations VALUES(3, 1, "ON")')
+    db_handle.commit()
+    db_handle.close()
+
+
+def test_merge_shards(tmp_path):
+    shard_a = str(tmp_path / 'a.sqlite')
+    shard_b = str(tmp_path / 'b.sqlite')
+    output = str(tmp_path / 'out.sqlite')
+    write_shard(shard_a, '/elfs/a', 'A_Msg_t', 'A_Mode_t')
+    write_shard(shard_b, '/elfs/b', 'B_Msg_t', 'B_Mode_t')
+
+    shard_merger.merge_shards([shard_a, shard_b], output)
+
+    db_handle = sqlite3.connect(output)
+    assert db_handle.execute('SELECT COUNT(*) FROM elfs').fetchone()[0] == 2
+    # "uint16" is defined by both shards, but must only be written once.
+    assert db_handle.execute('SELECT COUNT(*) FROM symbols').fetchone()[0] == 5
+    assert db_handle.execute('SELECT COUNT(*) FROM enumerations').fetchone()[0] == 2
+
+    fields = db_handle.execute('SELECT parent.name, fields.name, type.name, elfs.name FROM fields '
+                               'JOIN symbols AS parent ON fields.symbol = parent.id '
+                               'JOIN symbols AS type ON fields.type = type.id '
+                               'JOIN elfs ON parent.elf = elfs.id ORDER BY fields.id').fetchall()
+    assert fields == [('A_Msg_t', 'Count', 'uint16', '/elfs/a'),
+                      ('A_Msg_t', 'Mode', 'A_Mode_t', '/elfs/a'),
+                      ('B_Msg_t', 'Count', 'uint16', '/elfs/b'),
+                      ('B_Msg_t', 'Mode', 'B_Mode_t', '/elfs/b')]
+
+    enumerations = db_handle.execute('SELECT symbols.name, enumerations.name FROM enumerations '
+                                     'JOIN symbols ON enumerations.symbol = symbols.id '
+                                     'ORDER BY symbols.name').fetchall()
+    assert enumerations == [('A_Mode_t', 'ON'), ('B_Mode_t', 'ON')]
+
+
+def test_merge_shards_with_unknown_tables(tmp_path):
+    shard_a = str(tmp_path / 'a.sqlite')
+    shard_b = str(tmp_path / 'b.sqlite')
+    write_shard(shard_a, '/elfs/a', 'A_Msg_t', 'A_Mode_t')
+    write_shard(shard_b, '/elfs/b', 'B_Msg_t', 'B_Mode_t')
+    for shard_path in (shard_a, shard_b):
+        db_handle = sqlite3.connect(shard_path)
+        db_handle.execute('CREATE TABLE notes(elf_name TEXT NOT NULL, note TEXT NOT NULL)')
+        db_handle.execute('INSERT INTO notes VALUES(?, "juiced")', (shard_path,))
+        db_handle.commit()
+        db_handle.close()
+
+    db_handle = sqlite3.connect(shard_b)
+    db_handle.execute('CREATE TABLE macros(id INTEGER PRIMARY KEY, symbol INTEGER NOT NULL, name TEXT NOT NULL)')
+    db_handle.execute('INSERT INTO macros VALUES(1, 2, "B_MID")')
+    db_handle.commit()
+    db_handle.close()
+
+    # The ids and symbols of macros are only valid within their shard, so they cannot be copied as they are. Neither
+    # are the records of the shards that were merged before.
+    output = str(tmp_path / 'out.sqlite')
+    with pytest.raises(ValueError, match='macros'):
+        shard_merger.merge_shards([shard_a, shard_b], output)
+    db_handle = sqlite3.connect(output)
+    assert db_handle.execute('SELECT COUNT(*) FROM symbols').fetchone()[0] == 0
+    db_handle.close()
+
+    output = str(tmp_path / 'mapped.sqlite')
+    shard_merger.merge_shards([shard_a, shard_b], output, foreign_keys={'macros': {'symbol': 'symbols'}},
+                              natural_keys={'macros': ('name',)})
+    db_handle = sqlite3.connect(output)
+    macros = db_handle.execute('SELECT macros.name, symbols.name FROM macros '
+                               'JOIN symbols ON macros.symbol = symbols.id').fetchall()
+    assert macros == [('B_MID', 'B_Msg_t')]
+    # Tables without ids nor references are copied as they are.
+    assert db_handle.execute('SELECT COUNT(*) FROM notes').fetchone()[0] == 2
@@ -0,0 +1,27 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import squeezer_config
+
+
+def test_squeezer_config_set_database(tmp_path):
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text('modules:\n'
+                           '  cpd:\n'
+                           '    elf_files: [cfe-core.so]\n'
+                           '    modules:\n'
+                           '      apps:\n'
+                           '        elf_files: [sch.so]\n')
+
+    config = squeezer_config.SqueezerConfig.load(str(config_path))
+    assert config.get_module('cpd/apps') == {'elf_files': ['sch.so']}
+
+    config.set_database('cpd/apps', 'cpd_apps.sqlite')
+    config.write()
+
+    written = squeezer_config.read_yaml(str(config_path))
+    assert written['modules']['cpd']['modules']['apps']['db'] == {'sqlite': 'cpd_apps.sqlite'}
+    assert written['modules']['cpd']['elf_files'] == ['cfe-core.so']
@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import pytest
+
+import stage_profiler
+
+
+def test_stage_profiler_report(tmp_path):
+    profiler = stage_profiler.StageProfiler()
+    connect = sqlite3.connect
+
+    long_lived_handle = sqlite3.connect(':memory:')
+    profiler.trace(long_lived_handle)
+
+    with profiler.stage('create'):
+        # Connections opened inside of a stage are traced without calling trace().
+        # Autocommit keeps python from issuing its own BEGIN statements, which would be counted as well.
+        db_handle = sqlite3.connect(':memory:', isolation_level=None)
+        db_handle.execute('CREATE TABLE symbols(id INTEGER PRIMARY KEY, name TEXT)')
+        db_handle.execute('INSERT INTO symbols(name) VALUES("uint8")')
+
+    with profiler.stage('query'):
+        long_lived_handle.execute('SELECT 1')
+
+    # Statements outside of any stage are not counted.
+    db_handle.execute('SELECT * FROM symbols')
+    assert sqlite3.connect is connect
+
+    report_path = str(tmp_path / 'profile.json')
+    profiler.write_report(report_path)
+
+    with open(report_path) as report_file:
+        report = json.load(report_file)
+
+    assert report['format_version'] == stage_profiler.REPORT_FORMAT_VERSION
+    assert [stage['name'] for stage in report['stages']] == ['create', 'query']
+    assert report['stages'][0]['sql_statements'] == 2
+    assert report['stages'][1]['sql_statements'] == 1
+    assert report['total']['sql_statements'] == 3
+    for stage in report['stages']:
+        assert list(stage.keys()) == ['name'] + list(stage_profiler.STAGE_METRICS)
+        assert stage['wall_time_s'] >= 0
+
+
+def test_disabled_stage_profiler():
+    profiler = stage_profiler.StageProfiler(False)
+
+    with profiler.stage('create'):
+        sqlite3.connect(':memory:').execute('SELECT 1')
+
+    assert profiler.get_report()['stages'] == []
+
+
+def test_stage_profiler_peak_rss():
+    pytest.importorskip('resource')
+    profiler = stage_profiler.StageProfiler()
+
+    with profiler.stage('heavy'):
+        heavy = bytearray(64 * 1024 * 1024)
+        heavy[::4096] = b'x' * len(heavy[::4096])
+    del heavy
+
+    with profiler.stage('light'):
+        pass
+
+    heavy_stage, light_stage = profiler.get_report()['stages']
+    # The high-water mark of the process carries over to the stages after the heaviest one; its growth does not.
+    assert heavy_stage['peak_rss_growth_kb'] >= 32 * 1024
+    assert light_stage['peak_rss_growth_kb'] == 0
+    assert light_stage['process_peak_rss_kb'] == heavy_stage['process_peak_rss_kb']
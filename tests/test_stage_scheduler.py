@@ -0,0 +1,83 @@
+import os
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import pytest
+
+import stage_scheduler
+
+
+def get_stages(tmp_path, config: dict, runs: list):
+    elf = str(tmp_path / 'app.so')
+    database = str(tmp_path / 'db.sqlite')
+    xtce = {cpu_id: str(tmp_path / f'{cpu_id}.xml') for cpu_id in ['cpd', 'ppd']}
+
+    def run_database():
+        runs.append('database')
+        with open(database, 'w') as f:
+            f.write(open(elf).read() + str(config))
+
+    def get_run_xtce(cpu_id):
+        def run_xtce():
+            runs.append(cpu_id)
+            with open(xtce[cpu_id], 'w') as f:
+                f.write(open(database).read())
+        return run_xtce
+
+    return [stage_scheduler.Stage(f'xtce_{cpu_id}', get_run_xtce(cpu_id),
+                                  inputs=[stage_scheduler.FileInput(database)], outputs=[xtce[cpu_id]])
+            for cpu_id in xtce] + \
+           [stage_scheduler.Stage('database', run_database,
+                                  inputs=[stage_scheduler.FileInput(elf), stage_scheduler.DataInput('config', config)],
+                                  outputs=[database])]
+
+
+def test_stage_scheduler_up_to_date(tmp_path):
+    (tmp_path / 'app.so').write_text('version 1')
+    state_path = str(tmp_path / 'stages.json')
+
+    runs = []
+    results = stage_scheduler.StageScheduler(state_path).run(get_stages(tmp_path, {'cpu_id': 1}, runs))
+    assert results == {'database': True, 'xtce_cpd': True, 'xtce_ppd': True}
+    # The database stage is given last, but the xtce stages depend on it.
+    assert runs == ['database', 'cpd', 'ppd']
+
+    runs = []
+    results = stage_scheduler.StageScheduler(state_path).run(get_stages(tmp_path, {'cpu_id': 1}, runs))
+    assert results == {'database': False, 'xtce_cpd': False, 'xtce_ppd': False}
+    assert runs == []
+
+    # A change to the data of a stage runs it again, and the stages after it only if its outputs changed.
+    runs = []
+    stage_scheduler.StageScheduler(state_path).run(get_stages(tmp_path, {'cpu_id': 2}, runs))
+    assert runs == ['database', 'cpd', 'ppd']
+
+    # Outputs that are removed are written again.
+    os.remove(tmp_path / 'cpd.xml')
+    runs = []
+    stage_scheduler.StageScheduler(state_path).run(get_stages(tmp_path, {'cpu_id': 2}, runs))
+    assert runs == ['cpd']
+
+
+def test_stage_scheduler_failure(tmp_path):
+    state_path = str(tmp_path / 'stages.json')
+    runs = []
+
+    # The elf file does not exist, so the database stage fails and the xtce stages never run.
+    with pytest.raises(FileNotFoundError):
+        stage_scheduler.StageScheduler(state_path).run(get_stages(tmp_path, {}, runs))
+
+    assert runs == ['database']
+
+
+def test_stage_scheduler_without_state(tmp_path):
+    (tmp_path / 'app.so').write_text('version 1')
+
+    # Without a state file every stage runs every time, and nothing is written.
+    for _ in range(2):
+        runs = []
+        stage_scheduler.StageScheduler().run(get_stages(tmp_path, {'cpu_id': 1}, runs))
+        assert runs == ['database', 'cpd', 'ppd']
+    assert sorted(os.listdir(tmp_path)) == ['app.so', 'cpd.xml', 'db.sqlite', 'ppd.xml']
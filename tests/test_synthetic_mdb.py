@@ -0,0 +1,45 @@
+import csv
+import os
+import sqlite3
+import sys
+
+# There does not seem to be a cleaner way of doing this in python when working with git submodules
+sys.path.append(os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../src')))
+
+import log_parser
+import synthetic_mdb
+
+
+def test_generate_database(tmp_path):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    counts = synthetic_mdb.generate_database(database_path, 1000)
+
+    assert 1000 <= counts['fields'] < 1200
+    assert counts['telemetry'] > 0 and counts['commands'] > 0
+
+    db_handle = sqlite3.connect(database_path)
+    # Every message is packed, so its size is the end of its last field.
+    for symbol_name, byte_size, end in db_handle.execute(
+            'SELECT symbols.name, symbols.byte_size, MAX(fields.byte_offset + type.byte_size * '
+            'MAX(fields.multiplicity, 1)) FROM telemetry JOIN symbols ON symbols.id = telemetry.symbol '
+            'JOIN fields ON fields.symbol = symbols.id JOIN symbols AS type ON type.id = fields.type '
+            'GROUP BY symbols.id'):
+        assert byte_size == end, symbol_name
+
+
+def test_generate_ds_file(tmp_path, monkeypatch):
+    database_path = str(tmp_path / 'synthetic.sqlite')
+    ds_path = str(tmp_path / 'ds.bin')
+    synthetic_mdb.generate_database(database_path, 1000)
+    structures = synthetic_mdb.generate_ds_file(database_path, ds_path, 100)
+
+    monkeypatch.chdir(tmp_path)
+    log_parser.parse_file(ds_path, database_path, structures, log_parser.TimeFormat.CFE_SB_TIME_32_16_SUBS,
+                          log_parser.LengthSource.STREAM)
+
+    rows = 0
+    for csv_path in tmp_path.glob('*.csv'):
+        with open(csv_path, newline='') as csv_file:
+            rows += len(list(csv.reader(csv_file))) - 1
+
+    assert rows == 100